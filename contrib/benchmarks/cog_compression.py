@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+"""
+Measure COG compression throughput of ``datacube.utils.cog.to_cog`` for
+different codecs and thread counts.
+
+Example::
+
+    python cog_compression.py --size 8192 --threads 1,2,4,8,16 --codecs deflate,zstd
+"""
+import time
+import click
+import numpy as np
+import xarray as xr
+from affine import Affine
+
+from datacube.utils.cog import to_cog
+from datacube.utils.geometry import GeoBox, CRS
+
+
+def mk_image(size: int, dtype: str = 'uint16') -> xr.DataArray:
+    """ Smooth image with some noise, compresses roughly like real imagery.
+    """
+    yy, xx = np.meshgrid(np.linspace(0, 20, size), np.linspace(0, 20, size), indexing='ij')
+    pix = 1000 + 500*np.sin(yy)*np.cos(xx) + np.random.normal(0, 20, (size, size))
+    gbox = GeoBox(size, size, Affine(10, 0, 0, 0, -10, 0), CRS('EPSG:3577'))
+    return xr.DataArray(pix.astype(dtype),
+                        dims=('y', 'x'),
+                        coords=gbox.xr_coords(with_crs=True),
+                        attrs=dict(nodata=0, crs=gbox.crs))
+
+
+@click.command()
+@click.option('--size', type=int, default=4096, help='Image width and height in pixels')
+@click.option('--threads', default='1,2,4,8', help='Comma separated list of thread counts')
+@click.option('--codecs', default='deflate,zstd,lerc_zstd', help='Comma separated list of codecs')
+@click.option('--repeats', type=int, default=3, help='Report best of this many runs')
+def main(size, threads, codecs, repeats):
+    im = mk_image(size)
+    mpix = im.size/1e6
+
+    click.echo('{:>10} {:>8} {:>10} {:>10} {:>8}'.format('codec', 'threads', 'seconds', 'Mpix/s', 'ratio'))
+    for codec in codecs.split(','):
+        for n in (int(t) for t in threads.split(',')):
+            best = None
+            for _ in range(repeats):
+                t0 = time.perf_counter()
+                bb = to_cog(im, compress=codec, num_threads=n, overview_levels=[])
+                dt = time.perf_counter() - t0
+                best = dt if best is None else min(best, dt)
+
+            click.echo('{:>10} {:>8d} {:>10.3f} {:>10.1f} {:>8.2f}'.format(
+                codec, n, best, mpix/best, im.nbytes/len(bb)))
+
+
+if __name__ == '__main__':
+    main()  # pylint: disable=no-value-for-parameter
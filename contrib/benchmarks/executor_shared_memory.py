@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+"""
+Measure how long it takes to get loaded ``xarray`` data back from the workers of
+the multiprocessing executor, pickled through pipes or passed in shared memory.
+
+Example::
+
+    python executor_shared_memory.py --size 4096 --time 4 --tasks 8
+"""
+import time
+import click
+import numpy as np
+import xarray as xr
+
+from datacube.executor import get_executor
+
+
+def mk_result(size, ntime, value):
+    """ Stand-in for a task loading data: a few int16 bands
+    """
+    return xr.Dataset({name: (('time', 'y', 'x'), np.full((ntime, size, size), value, dtype='int16'))
+                       for name in ['red', 'green', 'blue']})
+
+
+def run(executor, size, ntime, ntasks):
+    t0 = time.perf_counter()
+    futures = [executor.submit(mk_result, size, ntime, value) for value in range(ntasks)]
+    nbytes = sum(executor.result(f).nbytes for f in futures)
+    return nbytes, time.perf_counter() - t0
+
+
+@click.command()
+@click.option('--size', type=int, default=2048, help='Image width and height in pixels')
+@click.option('--time', 'ntime', type=int, default=4, help='Number of time slices')
+@click.option('--tasks', 'ntasks', type=int, default=8, help='Number of tasks')
+@click.option('--workers', type=int, default=2, help='Number of worker processes')
+def main(size, ntime, ntasks, workers):
+    click.echo('{:>14} {:>10} {:>10}'.format('transport', 'MB', 'MB/s'))
+    for name, threshold in [('pickle', None), ('shared memory', 1 << 20)]:
+        executor = get_executor(None, workers, use_cloud_pickle=False, shared_memory_threshold=threshold)
+        run(executor, 64, 1, workers)  # start up the workers
+        nbytes, dt = run(executor, size, ntime, ntasks)
+        click.echo('{:>14} {:>10.0f} {:>10.0f}'.format(name, nbytes/1e6, nbytes/1e6/dt))
+
+
+if __name__ == '__main__':
+    main()  # pylint: disable=no-value-for-parameter
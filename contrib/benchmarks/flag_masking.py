@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+"""
+Measure the time to build a mask from bit flags of a pixel quality band with
+``datacube.utils.masking.make_mask``, when flags accept more than one value.
+
+Compares a single ``make_mask`` call with lists of flag values, evaluated
+through a lookup table for integer bands of up to 16 bits, to combining one
+``make_mask`` call per accepted value with ``|``.
+
+Example::
+
+    python flag_masking.py --size 4096 --time 4
+"""
+import functools
+import itertools
+import operator
+import time
+import click
+import numpy as np
+import xarray as xr
+
+from datacube.utils.masking import make_mask
+
+FLAGS_DEF = {
+    'nodata': {'bits': 0, 'values': {'0': False, '1': True}},
+    'cloud': {'bits': 3, 'values': {'0': 'not_high_confidence', '1': 'high_confidence'}},
+    'cloud_shadow': {'bits': 4, 'values': {'0': 'not_high_confidence', '1': 'high_confidence'}},
+    'snow': {'bits': 5, 'values': {'0': 'not_high_confidence', '1': 'high_confidence'}},
+    'water': {'bits': 7, 'values': {'0': 'land_or_cloud', '1': 'water'}},
+    'cloud_confidence': {'bits': [8, 9], 'values': {'0': 'none', '1': 'low', '2': 'medium', '3': 'high'}},
+}
+
+FLAGS = {
+    'two_of': dict(nodata=False, cloud_confidence=['none', 'low']),
+    'three_of': dict(nodata=False, cloud_confidence=['none', 'low', 'medium'], snow='not_high_confidence'),
+    'four_of': dict(cloud=['not_high_confidence'], cloud_shadow='not_high_confidence',
+                    cloud_confidence=['none', 'low'], water=['land_or_cloud', 'water']),
+}
+
+
+def mk_pq(size: int, ntime: int, dtype: str) -> xr.DataArray:
+    pix = np.random.RandomState(0).randint(0, 2**10, size=(ntime, size, size)).astype(dtype)
+    return xr.DataArray(pix, dims=('time', 'y', 'x'), name='pq',
+                        attrs={'flags_definition': FLAGS_DEF})
+
+
+def combined_masks(pq, **flags):
+    """ One `make_mask` call for each combination of accepted flag values. """
+    def as_list(value):
+        return value if isinstance(value, list) else [value]
+
+    names = list(flags)
+    combinations = itertools.product(*[as_list(flags[name]) for name in names])
+    return functools.reduce(operator.or_, [make_mask(pq, **dict(zip(names, values)))
+                                           for values in combinations])
+
+
+def best_of(repeats, func):
+    best = None
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        func()
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best
+
+
+@click.command()
+@click.option('--size', type=int, default=2048, help='Image width and height in pixels')
+@click.option('--time', 'ntime', type=int, default=4, help='Number of time slices')
+@click.option('--repeats', type=int, default=3, help='Report best of this many runs')
+def main(size, ntime, repeats):
+    mpix = ntime*size*size/1e6
+
+    click.echo('{:>10} {:>8} {:>10} {:>10}'.format('flags', 'dtype', 'combined', 'make_mask'))
+    for dtype in ['uint16', 'int16', 'int32']:
+        pq = mk_pq(size, ntime, dtype)
+        for name, flags in FLAGS.items():
+            combined = best_of(repeats, lambda: combined_masks(pq, **flags))
+            single = best_of(repeats, lambda: make_mask(pq, **flags))
+            click.echo('{:>10} {:>8} {:>10.1f} {:>10.1f}'.format(name, dtype, mpix/combined, mpix/single))
+
+    click.echo('(Mpix/s, higher is better)')
+
+
+if __name__ == '__main__':
+    main()  # pylint: disable=no-value-for-parameter
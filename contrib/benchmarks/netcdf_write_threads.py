@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+"""
+Measure throughput of writing NetCDF files from several threads at once.
+
+Every thread writes its own files with ``write_dataset_to_netcdf``, while one
+more thread keeps taking the HDF5 lock for short periods, like NetCDF reads
+done by ``dc.load`` would. Reports write throughput and how long the reader
+had to wait for the lock.
+
+Example::
+
+    python netcdf_write_threads.py --threads 4 --files 8 --size 2048 /tmp/nc-bench
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import click
+import numpy as np
+import xarray as xr
+from affine import Affine
+
+from datacube import Datacube
+from datacube.drivers.netcdf import write_dataset_to_netcdf
+from datacube.model import Measurement
+from datacube.storage._hdf5 import HDF5_LOCK
+from datacube.testutils import mk_time_coord
+from datacube.utils.geometry import GeoBox, CRS
+
+
+def mk_dataset(size: int, ntime: int) -> xr.Dataset:
+    rng = np.random.RandomState(0)
+    geobox = GeoBox(size, size, Affine(25, 0, 1500000, 0, -25, -3900000), CRS('EPSG:3577'))
+    times = ['2020-01-{:02d}'.format(day + 1) for day in range(ntime)]
+    measurements = [Measurement(name='band_{}'.format(i), dtype='int16', nodata=-999, units='1')
+                    for i in range(3)]
+    dataset = Datacube.create_storage({'time': mk_time_coord(times)}, geobox, measurements)
+
+    # smooth-ish data, compresses roughly like real imagery
+    for band in dataset.data_vars.values():
+        band.values[:] = rng.randint(0, 64, size=band.shape).cumsum(axis=-1) % 10000
+    return dataset
+
+
+def probe_lock(stop: threading.Event, waits: list, period: float = 0.005):
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        with HDF5_LOCK:
+            waits.append(time.perf_counter() - t0)
+        time.sleep(period)
+
+
+@click.command()
+@click.option('--size', type=int, default=2048, help='Image width and height in pixels')
+@click.option('--time', 'ntime', type=int, default=2, help='Number of time slices')
+@click.option('--files', type=int, default=8, help='Number of files to write')
+@click.option('--threads', type=int, default=4, help='Number of writer threads')
+@click.argument('output_dir', type=click.Path(file_okay=False))
+def main(size, ntime, files, threads, output_dir):
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    dataset = mk_dataset(size, ntime)
+    variable_params = {name: dict(zlib=True, complevel=4, chunksizes=(1, 256, 256))
+                       for name in dataset.data_vars}
+    mb = sum(var.nbytes for var in dataset.data_vars.values())*files/1e6
+
+    def write(idx):
+        fname = output_dir/'bench-{}.nc'.format(idx)
+        if fname.exists():
+            fname.unlink()
+        write_dataset_to_netcdf(dataset, fname, variable_params=variable_params)
+
+    stop, waits = threading.Event(), []
+    reader = threading.Thread(target=probe_lock, args=(stop, waits))
+    reader.start()
+
+    t0 = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(write, range(files)))
+    finally:
+        stop.set()
+        reader.join()
+    dt = time.perf_counter() - t0
+
+    click.echo('write: {:.1f} MB/s ({:.2f}s for {:.0f} MB, {} threads)'.format(mb/dt, dt, mb, threads))
+    click.echo('reader lock wait: median {:.1f} ms, max {:.1f} ms'.format(
+        1000*np.median(waits), 1000*max(waits)))
+
+
+if __name__ == '__main__':
+    main()  # pylint: disable=no-value-for-parameter
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+Measure evaluation time of typical band-math recipes with the ``expressions``
+virtual product transformation.
+
+Compares evaluation including formula parsing (as happens on first use of a
+formula) to evaluation of already compiled formulas, with and without
+``numexpr``.
+
+Example::
+
+    python virtual_expressions.py --size 4096 --time 4
+"""
+import time
+import click
+import numpy as np
+import xarray as xr
+
+from datacube.utils.geometry import CRS
+from datacube.virtual import transformations
+from datacube.virtual.transformations import Expressions, compile_formula
+
+RECIPES = {
+    'ndvi': {'ndvi': {'formula': '(nir - red) / (nir + red)', 'dtype': 'float32'}},
+    'evi': {'evi': {'formula': '2.5 * (nir - red) / (nir + 6 * red - 7.5 * blue + 1)', 'dtype': 'float32'}},
+    'sum_int': {'total': {'formula': 'nir + red + blue', 'nodata': -999}},
+    'threshold': {'bright': {'formula': '(nir > 3000) & (red > 2000)'}},
+}
+
+
+def mk_data(size: int, ntime: int, dtype: str) -> xr.Dataset:
+    rng = np.random.RandomState(0)
+
+    def band():
+        pix = rng.randint(-999, 10000, size=(ntime, size, size)).astype(dtype)
+        return xr.DataArray(pix, dims=('time', 'y', 'x'),
+                            attrs=dict(nodata=-999, units='1', crs=CRS('EPSG:3577')))
+
+    return xr.Dataset({name: band() for name in ['nir', 'red', 'blue']},
+                      attrs=dict(crs=CRS('EPSG:3577')))
+
+
+def best_of(repeats, func):
+    best = None
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        func()
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best
+
+
+@click.command()
+@click.option('--size', type=int, default=2048, help='Image width and height in pixels')
+@click.option('--time', 'ntime', type=int, default=4, help='Number of time slices')
+@click.option('--repeats', type=int, default=3, help='Report best of this many runs')
+def main(size, ntime, repeats):
+    data = {'int16': mk_data(size, ntime, 'int16'),
+            'float32': mk_data(size, ntime, 'float32')}
+    mpix = ntime*size*size/1e6
+
+    def parse_and_compute(output, dataset):
+        compile_formula.cache_clear()
+        Expressions(output).compute(dataset)
+
+    click.echo('{:>10} {:>8} {:>10} {:>10} {:>10}'.format('recipe', 'dtype', 'parse+eval', 'numpy', 'numexpr'))
+    for name, output in RECIPES.items():
+        for dtype, dataset in data.items():
+            compiled = Expressions(output)
+            cold = best_of(repeats, lambda: parse_and_compute(output, dataset))
+            plain = best_of(repeats, lambda: compiled.compute(dataset))
+
+            if transformations.numexpr is None:
+                fast = 'n/a'
+            else:
+                compiled = Expressions(output, use_numexpr=True)
+                fast = '{:.1f}'.format(mpix/best_of(repeats, lambda: compiled.compute(dataset)))
+
+            click.echo('{:>10} {:>8} {:>10.1f} {:>10.1f} {:>10}'.format(name, dtype, mpix/cold, mpix/plain, fast))
+
+    click.echo('(Mpix/s, higher is better)')
+
+
+if __name__ == '__main__':
+    main()  # pylint: disable=no-value-for-parameter
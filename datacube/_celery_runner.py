@@ -1,16 +1,29 @@
 
 import cloudpickle
-from celery import Celery
-from time import sleep
+from celery import Celery, states
+from celery.result import ResultSet
+from time import sleep, monotonic
 import redis
 import os
+import uuid
+import zlib
 import kombu.serialization
+import toolz
 
 from celery.backends import base as celery_base
 
 # This can be changed via environment variable `REDIS`
 REDIS_URL = 'redis://localhost:6379/0'
 
+# Packed results of at least this many bytes are written to `offload_dir` rather than redis
+OFFLOAD_THRESHOLD = 1 << 20
+
+# Number of task states fetched from redis per request
+_STATUS_BATCH_SIZE = 1000
+
+# Marks a packed result that has not been unpacked yet
+_NOT_UNPACKED = object()
+
 kombu.serialization.registry.register(
     'cloudpickle',
     cloudpickle.dumps, cloudpickle.loads,
@@ -60,6 +73,82 @@ def run_function(func, *args, **kwargs):
     return func(*args, **kwargs)
 
 
+class _PackedResult(object):
+    """
+    Pickled, optionally compressed, result of a task: either inline or in a file on a filesystem
+    shared between workers and the client. The file stays until :meth:`discard` is called, so the
+    result can be read more than once.
+    """
+
+    # the value, once unpacked in this process
+    _value = _NOT_UNPACKED
+
+    def __init__(self, data=None, path=None, compressed=False):
+        self.data = data
+        self.path = path
+        self.compressed = compressed
+
+    def unpack(self):
+        if self._value is _NOT_UNPACKED:
+            data = self.data
+            if self.path is not None:
+                with open(self.path, 'rb') as f:
+                    data = f.read()
+
+            if self.compressed:
+                data = zlib.decompress(data)
+
+            self._value = cloudpickle.loads(data)
+
+        return self._value
+
+    def discard(self):
+        """ Remove the file holding the result, if any. """
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+
+def _pack_result(result, compress=False, offload_dir=None, offload_threshold=OFFLOAD_THRESHOLD):
+    data = cloudpickle.dumps(result)
+    if compress:
+        data = zlib.compress(data, 1)
+
+    if offload_dir is not None and len(data) >= offload_threshold:
+        path = os.path.join(offload_dir, 'datacube-result-{}.pickle'.format(uuid.uuid4().hex))
+        with open(path, 'wb') as f:
+            f.write(data)
+        return _PackedResult(path=path, compressed=compress)
+
+    return _PackedResult(data=data, compressed=compress)
+
+
+def _unpack_result(value):
+    return value.unpack() if isinstance(value, _PackedResult) else value
+
+
+@app.task()
+def run_packed_function(options, func, *args, **kwargs):
+    return _pack_result(func(*args, **kwargs), **options)
+
+
+def _task_states(futures, batch_size=_STATUS_BATCH_SIZE):
+    """
+    States of tasks, in one request to redis per batch of futures rather than one per future.
+    """
+    for batch in toolz.partition_all(batch_size, futures):
+        backend = batch[0].backend
+        keys = [backend.get_key_for_task(future.id) for future in batch]
+        values = backend.mget(keys)
+        if hasattr(values, 'items'):
+            # some backends return a mapping rather than a list
+            values = [values.get(key) for key in keys]
+        for value in values:
+            yield states.PENDING if value is None else backend.decode_result(value)['status']
+
+
 def launch_worker(host, port=6379, password=None, nprocs=None):
     if password == '':
         password = get_redis_password(generate_if_missing=False)
@@ -90,9 +179,24 @@ def get_redis_password(generate_if_missing=False):
 
 
 class CeleryExecutor(object):
-    def __init__(self, host=None, port=None, password=None):
+    def __init__(self, host=None, port=None, password=None,
+                 compress_results=False, offload_dir=None, offload_threshold=OFFLOAD_THRESHOLD):
+        """
+        :param compress_results: Compress results of tasks (zlib) before storing them in redis
+        :param offload_dir: Directory on a filesystem shared by workers and this process, results of
+                            at least `offload_threshold` bytes (after compression) are passed through
+                            files in it instead of redis. Files are removed when tasks are released.
+        :param offload_threshold: Size in bytes of the smallest result to write to `offload_dir`
+        """
         # print('Celery: {}:{}'.format(host, port))
         self._shutdown = None
+        self._pubsub = None
+        self._subscribed = set()
+        self._packing = None
+        if compress_results or offload_dir is not None:
+            self._packing = dict(compress=compress_results,
+                                 offload_dir=offload_dir,
+                                 offload_threshold=offload_threshold)
 
         if port or host or password:
             if password == '':
@@ -112,6 +216,8 @@ class CeleryExecutor(object):
                 raise IOError("Can't connect to redis server @ {}:{}".format(host, port))
 
     def __del__(self):
+        if self._pubsub is not None:
+            self._pubsub.close()
         if self._shutdown:
             app.control.shutdown()
             sleep(1)
@@ -121,6 +227,8 @@ class CeleryExecutor(object):
         return 'CeleryRunner'
 
     def submit(self, func, *args, **kwargs):
+        if self._packing is not None:
+            return run_packed_function.delay(self._packing, func, *args, **kwargs)
         return run_function.delay(func, *args, **kwargs)
 
     def map(self, func, iterable):
@@ -131,9 +239,10 @@ class CeleryExecutor(object):
         completed = []
         failed = []
         pending = []
-        for f in futures:
-            if f.ready():
-                if f.failed():
+        futures = list(futures)
+        for f, state in zip(futures, _task_states(futures)):
+            if state in states.READY_STATES:
+                if state == states.FAILURE:
                     failed.append(f)
                 else:
                     completed.append(f)
@@ -141,44 +250,98 @@ class CeleryExecutor(object):
                 pending.append(f)
         return completed, failed, pending
 
-    @staticmethod
-    def as_completed(futures):
-        while len(futures) > 0:
-            pending = []
-
-            for promise in futures:
-                if promise.ready():
-                    yield promise
-                else:
-                    pending.append(promise)
-
-            if len(pending) == len(futures):
-                # If no change detected sleep for a bit
-                # TODO: this is sub-optimal, not sure what other options are
-                #       though?
-                sleep(0.1)
+    def _subscribe(self, futures):
+        """ Listen for the results of `futures` being stored, redis publishes them on their keys. """
+        new = [future for future in futures if future.id not in self._subscribed]
+        if not new:
+            return
+
+        backend = new[0].backend
+        if self._pubsub is None:
+            self._pubsub = backend.client.pubsub()
+        self._pubsub.subscribe(*[backend.get_key_for_task(future.id) for future in new])
+        self._subscribed.update(future.id for future in new)
+
+    def _unsubscribe(self, futures):
+        done = [future for future in futures if future.id in self._subscribed]
+        if not done:
+            return
+
+        backend = done[0].backend
+        self._pubsub.unsubscribe(*[backend.get_key_for_task(future.id) for future in done])
+        self._subscribed.difference_update(future.id for future in done)
+
+    def _wait_for_news(self, deadline=None):
+        """
+        Block until redis publishes a result or confirms a subscription, or `deadline` passes,
+        then take every other message already received.
+        """
+        while True:
+            timeout = None if deadline is None else max(deadline - monotonic(), 0)
+            message = self._pubsub.get_message(timeout=timeout)
+            if message is None:
+                return
+            if message['type'] in ('message', 'subscribe'):
+                break
+
+        while self._pubsub.get_message(timeout=0) is not None:
+            pass
+
+    def wait_ready(self, futures, timeout=None):
+        """
+        Block until at least one of `futures` is ready, or `timeout` seconds pass.
+
+        States are checked with one request to redis per batch of futures, again whenever redis
+        announces a stored result. Futures stay subscribed until they are ready, so waiting on
+        the same futures again does not subscribe to them again.
+        """
+        futures = list(futures)
+        deadline = None if timeout is None else monotonic() + timeout
+        # subscribe before checking states, so a result stored in between is not missed
+        self._subscribe(futures)
+        while True:
+            completed, failed, pending = self.get_ready(futures)
+            if completed or failed or not pending:
+                break
+            if deadline is not None and monotonic() >= deadline:
+                break
+            self._wait_for_news(deadline)
+
+        self._unsubscribe(completed + failed)
+        return completed, failed, pending
 
-            futures = pending
+    def as_completed(self, futures):
+        pending = list(futures)
+        while pending:
+            completed, failed, pending = self.wait_ready(pending)
+            yield from completed + failed
 
-    @classmethod
-    def next_completed(cls, futures, default):
+    def next_completed(self, futures, default):
         results = list(futures)
         if not results:
             return default, results
-        result = next(cls.as_completed(results), default)
+        result = next(self.as_completed(results), default)
         results.remove(result)
         return result, results
 
     @staticmethod
     def results(futures):
-        return [future.get() for future in futures]
+        futures = list(futures)
+        if not futures:
+            return []
+        return [_unpack_result(value) for value in ResultSet(futures).join_native()]
 
     @staticmethod
     def result(future):
-        return future.get()
-
-    @staticmethod
-    def release(future):
+        return _unpack_result(future.get())
+
+    def release(self, future):
+        # only results of at least offload_threshold bytes written to offload_dir leave files behind
+        offloads = self._packing is not None and self._packing['offload_dir'] is not None
+        if offloads and future.successful():
+            value = future.result
+            if isinstance(value, _PackedResult):
+                value.discard()
         future.forget()
 
 
@@ -1,5 +1,6 @@
 import uuid
 import collections
+import operator
 from itertools import groupby
 from typing import Union, Optional, Dict, Tuple
 import datetime
@@ -14,7 +15,7 @@ from datacube.utils import ignore_exceptions_if
 from datacube.utils import geometry
 from datacube.utils.dates import normalise_dt
 from datacube.utils.geometry import intersects, GeoBox
-from datacube.utils.geometry.gbox import GeoboxTiles
+from datacube.utils.geometry.gbox import geobox_tiles
 from datacube.model.utils import xr_apply
 
 from .query import Query, query_group_by, query_geopolygon
@@ -470,7 +471,7 @@ class Datacube(object):
     def _dask_load(sources, geobox, measurements, dask_chunks,
                    skip_broken_datasets=False):
         needed_irr_chunks, grid_chunks = _calculate_chunk_sizes(sources, geobox, dask_chunks)
-        gbt = GeoboxTiles(geobox, grid_chunks)
+        gbt = geobox_tiles(geobox, grid_chunks)
         dsk = {}
 
         def chunk_datasets(dss, gbt):
@@ -485,11 +486,17 @@ class Datacube(object):
                                 lambda _, dss: chunk_datasets(dss, gbt),
                                 dtype=object)
 
+        # measurements stored in the same files are read and warped together, chunk by chunk
+        all_datasets = list({ds.id: ds for dss in sources.values.ravel() for ds in dss}.values())
+        arrays = {}
+        for mm in _group_by_source_file(all_datasets, measurements):
+            arrays.update(zip([m.name for m in mm],
+                              _make_dask_arrays(chunked_srcs, dsk, gbt, mm,
+                                                chunks=needed_irr_chunks+grid_chunks,
+                                                skip_broken_datasets=skip_broken_datasets)))
+
         def data_func(measurement):
-            return _make_dask_array(chunked_srcs, dsk, gbt,
-                                    measurement,
-                                    chunks=needed_irr_chunks+grid_chunks,
-                                    skip_broken_datasets=skip_broken_datasets)
+            return arrays[measurement.name]
 
         return Datacube.create_storage(sources.coords, geobox, measurements, data_func)
 
@@ -514,13 +521,18 @@ class Datacube(object):
         _cbk = mk_cbk(progress_cbk)
 
         for index, datasets in numpy.ndenumerate(sources.values):
-            for m in measurements:
-                t_slice = data[m.name].values[index]
+            for mm in _group_by_source_file(datasets, measurements):
+                t_slices = [data[m.name].values[index] for m in mm]
 
                 try:
-                    _fuse_measurement(t_slice, datasets, geobox, m,
-                                      skip_broken_datasets=skip_broken_datasets,
-                                      progress_cbk=_cbk)
+                    if len(mm) == 1:
+                        _fuse_measurement(t_slices[0], datasets, geobox, mm[0],
+                                          skip_broken_datasets=skip_broken_datasets,
+                                          progress_cbk=_cbk)
+                    else:
+                        _fuse_measurements(t_slices, datasets, geobox, mm,
+                                           skip_broken_datasets=skip_broken_datasets,
+                                           progress_cbk=_cbk)
                 except (TerminateCurrentLoad, KeyboardInterrupt):
                     data.attrs['dc_partial_load'] = True
                     return data
@@ -690,6 +702,16 @@ def fuse_lazy(datasets, geobox, measurement, skip_broken_datasets=False, prepend
     return data.reshape(prepend_shape + geobox.shape)
 
 
+def fuse_lazy_stack(datasets, geobox, measurements, skip_broken_datasets=False, prepend_dims=0):
+    """ Like :func:`fuse_lazy` for several measurements stored in the same files, as a (band, ...) stack. """
+    prepend_shape = (1,) * prepend_dims
+    m = measurements[0]
+    data = numpy.full((len(measurements),) + geobox.shape, m.nodata, dtype=m.dtype)
+    _fuse_measurements(list(data), datasets, geobox, measurements,
+                       skip_broken_datasets=skip_broken_datasets)
+    return data.reshape((len(measurements),) + prepend_shape + geobox.shape)
+
+
 def _fuse_measurement(dest, datasets, geobox, measurement,
                       skip_broken_datasets=False,
                       progress_cbk=None):
@@ -715,6 +737,67 @@ def _fuse_measurement(dest, datasets, geobox, measurement,
                        progress_cbk=progress_cbk)
 
 
+def _group_by_source_file(datasets, measurements):
+    """ Split measurements into groups that can be read and warped as one
+    multi-band stack: same dtype, nodata and resampling, no custom fuser, and
+    stored in the same file for every dataset. Other measurements are returned
+    as groups of one.
+    """
+    from datacube.storage._rio import can_read_together
+
+    def stack_key(m):
+        if m.get('fuser', None) is not None:
+            return None
+        return (numpy.dtype(m.dtype).str, str(m.nodata), str(m.get('resampling_method', 'nearest')))
+
+    def shared_files(mm):
+        try:
+            return all(can_read_together([BandInfo(ds, m.name) for m in mm])
+                       for ds in datasets)
+        except ValueError:
+            return False
+
+    groups = collections.OrderedDict()
+    for m in measurements:
+        key = stack_key(m)
+        groups.setdefault(id(m) if key is None else key, []).append(m)
+
+    for mm in groups.values():
+        if len(mm) > 1 and len(datasets) > 0 and shared_files(mm):
+            yield mm
+        else:
+            yield from ([m] for m in mm)
+
+
+def _fuse_measurements(dests, datasets, geobox, measurements,
+                       skip_broken_datasets=False,
+                       progress_cbk=None):
+    """ Like :func:`_fuse_measurement` but for several measurements stored in
+    the same files, reads and warps all of them in one go.
+    """
+    from datacube.storage._rio import MultiBandDatasetDataSource
+
+    m = measurements[0]
+    srcs = [MultiBandDatasetDataSource([BandInfo(ds, m.name) for m in measurements])
+            for ds in datasets]
+    buffer_ = numpy.empty((len(measurements),) + geobox.shape, dtype=dests[0].dtype)
+
+    def _cbk(*args):
+        for _ in measurements:
+            progress_cbk(*args)
+
+    reproject_and_fuse(srcs,
+                       buffer_,
+                       geobox,
+                       buffer_.dtype.type(m.nodata),
+                       resampling=m.get('resampling_method', 'nearest'),
+                       skip_broken_datasets=skip_broken_datasets,
+                       progress_cbk=_cbk if progress_cbk else None)
+
+    for dest, band in zip(dests, buffer_):
+        dest[:] = band
+
+
 def get_bounds(datasets, crs):
     bbox = geometry.bbox_union(ds.extent.to_crs(crs).boundingbox for ds in datasets)
     return geometry.box(*bbox, crs=crs)
@@ -755,16 +838,20 @@ def _tokenize_dataset(dataset):
 
 
 # pylint: disable=too-many-locals
-def _make_dask_array(chunked_srcs,
-                     dsk,
-                     gbt,
-                     measurement,
-                     chunks,
-                     skip_broken_datasets=False):
+def _make_dask_arrays(chunked_srcs,
+                      dsk,
+                      gbt,
+                      measurements,
+                      chunks,
+                      skip_broken_datasets=False):
+    """ Dask arrays of `measurements`, several measurements (see :func:`_group_by_source_file`)
+    share one task per chunk that reads and warps all of them.
+    """
     dsk = dsk.copy()  # this contains mapping from dataset id to dataset object
 
     token = uuid.uuid4().hex
-    dsk_name = 'dc_load_{name}-{token}'.format(name=measurement.name, token=token)
+    dsk_names = ['dc_load_{name}-{token}'.format(name=m.name, token=token) for m in measurements]
+    stack_name = 'dc_load_stack-{token}'.format(token=token)
 
     needed_irr_chunks, grid_chunks = chunks[:-2], chunks[-2:]
     actual_irr_chunks = (1,) * len(needed_irr_chunks)
@@ -773,48 +860,62 @@ def _make_dask_array(chunked_srcs,
     # bottom right corner
     #  W R
     #  B BR
-    empties = {}  # type Dict[Tuple[int,int], str]
+    empties = {}  # type Dict[Tuple[Tuple[int,int], str], str]
 
-    def _mk_empty(shape: Tuple[int, int]) -> str:
-        name = empties.get(shape, None)
+    def _mk_empty(shape: Tuple[int, int], measurement) -> str:
+        name = empties.get((shape, measurement.name), None)
         if name is not None:
             return name
 
-        name = 'empty_{}x{}-{token}'.format(*shape, token=token)
+        name = 'empty_{}_{}x{}-{token}'.format(measurement.name, *shape, token=token)
         dsk[name] = (numpy.full, actual_irr_chunks + shape, measurement.nodata, measurement.dtype)
-        empties[shape] = name
+        empties[(shape, measurement.name)] = name
 
         return name
 
     for irr_index, tiled_dss in numpy.ndenumerate(chunked_srcs.values):
-        key_prefix = (dsk_name, *irr_index)
-
         # all spatial chunks
         for idx in numpy.ndindex(gbt.shape):
             dss = tiled_dss.get(idx, None)
-
-            if dss is None:
-                val = _mk_empty(gbt.chunk_shape(idx))
-            else:
-                val = (fuse_lazy,
-                       [_tokenize_dataset(ds) for ds in dss],
-                       gbt[idx],
-                       measurement,
-                       skip_broken_datasets,
-                       chunked_srcs.ndim)
-
-            dsk[key_prefix + idx] = val
+            tokens = None if dss is None else [_tokenize_dataset(ds) for ds in dss]
+
+            if tokens is not None and len(measurements) > 1:
+                stack_key = (stack_name, *irr_index, *idx)
+                dsk[stack_key] = (fuse_lazy_stack,
+                                  tokens,
+                                  gbt[idx],
+                                  measurements,
+                                  skip_broken_datasets,
+                                  chunked_srcs.ndim)
+
+            for band, (dsk_name, measurement) in enumerate(zip(dsk_names, measurements)):
+                if tokens is None:
+                    val = _mk_empty(gbt.chunk_shape(idx), measurement)
+                elif len(measurements) > 1:
+                    val = (operator.getitem, stack_key, band)
+                else:
+                    val = (fuse_lazy,
+                           tokens,
+                           gbt[idx],
+                           measurement,
+                           skip_broken_datasets,
+                           chunked_srcs.ndim)
+
+                dsk[(dsk_name, *irr_index, *idx)] = val
 
     y_shapes = [grid_chunks[0]]*gbt.shape[0]
     x_shapes = [grid_chunks[1]]*gbt.shape[1]
 
     y_shapes[-1], x_shapes[-1] = gbt.chunk_shape(tuple(n-1 for n in gbt.shape))
 
-    data = da.Array(dsk, dsk_name,
-                    chunks=actual_irr_chunks + (tuple(y_shapes), tuple(x_shapes)),
-                    dtype=measurement.dtype,
-                    shape=(chunked_srcs.shape + gbt.base.shape))
-
-    if needed_irr_chunks != actual_irr_chunks:
-        data = data.rechunk(chunks=chunks)
-    return data
+    arrays = []
+    for dsk_name, measurement in zip(dsk_names, measurements):
+        data = da.Array(dsk, dsk_name,
+                        chunks=actual_irr_chunks + (tuple(y_shapes), tuple(x_shapes)),
+                        dtype=measurement.dtype,
+                        shape=(chunked_srcs.shape + gbt.base.shape))
+
+        if needed_irr_chunks != actual_irr_chunks:
+            data = data.rechunk(chunks=chunks)
+        arrays.append(data)
+    return arrays
@@ -39,7 +39,7 @@ GroupBy = collections.namedtuple('GroupBy', ['dimension', 'group_by_func', 'unit
 SPATIAL_KEYS = ('latitude', 'lat', 'y', 'longitude', 'lon', 'long', 'x')
 CRS_KEYS = ('crs', 'coordinate_reference_system')
 OTHER_KEYS = ('measurements', 'group_by', 'output_crs', 'resolution', 'set_nan', 'product', 'geopolygon', 'like',
-              'source_filter')
+              'source_filter', 'not_derived_by')
 
 
 class Query(object):
@@ -70,6 +70,7 @@ class Query(object):
          * `latitude`, `lat`, `y`, `longitude`, `lon`, `long`, `x` - tuples (min, max) bounding spatial dimensions
          * `crs` - spatial coordinate reference system to interpret the spatial bounds
          * `group_by` - observation grouping method. One of `time`, `solar_day`. Default is `time`
+         * `not_derived_by` - name of a product, only match datasets not yet processed into it
         """
         self.product = product
         self.geopolygon = query_geopolygon(geopolygon=geopolygon, **search_terms)
@@ -77,6 +78,7 @@ class Query(object):
             self.source_filter = Query(**search_terms['source_filter'])
         else:
             self.source_filter = None
+        self.not_derived_by = search_terms.get('not_derived_by')
 
         remaining_keys = set(search_terms.keys()) - set(SPATIAL_KEYS + CRS_KEYS + OTHER_KEYS)
         if index:
@@ -125,6 +127,8 @@ class Query(object):
             kwargs['product'] = self.product
         if self.source_filter:
             kwargs['source_filter'] = self.source_filter.search_terms
+        if self.not_derived_by:
+            kwargs['not_derived_by'] = self.not_derived_by
         return kwargs
 
     def __repr__(self):
@@ -1,13 +1,37 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
+import itertools
 import logging
+import os
+import threading
+import zlib
+
+import dask
+import numpy
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
 
 from . import writer as netcdf_writer
 from datacube.utils import DatacubeException
+from datacube.utils.math import iter_slices
 from datacube.storage._hdf5 import HDF5_LOCK
 
 
 _LOG = logging.getLogger(__name__)
 
+# Dask blocks are computed together, in windows of about this many bytes
+_COMPUTE_WINDOW_BYTES = 64 * 2**20
+
+# Threads compressing chunks, shared by all files written by this process
+_ENCODE_THREADS = os.cpu_count() or 1
+_ENCODE_POOL = None
+_ENCODE_POOL_LOCK = threading.Lock()
+
 
 def create_netcdf_storage_unit(filename,
                                crs, coordinates, variables, variable_params, global_attributes=None,
@@ -61,13 +85,253 @@ def create_netcdf_storage_unit(filename,
     return nco
 
 
+def _block_bounds(chunks, nc_chunk):
+    """
+    Boundaries of blocks along one axis, given dask ``chunks`` and the NetCDF chunk size along it.
+
+    Every block is a whole number of dask chunks. It ends on the first NetCDF chunk boundary within
+    twice the larger of the two chunk sizes, or failing that, as soon as it spans a NetCDF chunk.
+    """
+    ends = numpy.cumsum(chunks).tolist()
+    total = ends[-1]
+    limit = 2 * max(nc_chunk, max(chunks))
+
+    bounds = [0]
+    while bounds[-1] < total:
+        start = bounds[-1]
+        ahead = [end for end in ends if end > start]
+        aligned = [end for end in ahead if (end % nc_chunk == 0 or end == total) and end - start <= limit]
+        if aligned:
+            bounds.append(aligned[0])
+        else:
+            bounds.append(next(end for end in ahead if end - start >= nc_chunk))
+    return bounds
+
+
+def _iter_dask_blocks(data, chunking, window_bytes=_COMPUTE_WINDOW_BYTES):
+    """
+    Compute dask array ``data`` one block at a time, yielding ``(roi, numpy array)`` pairs.
+
+    Blocks are made of whole dask chunks (see :func:`_block_bounds`), so that no chunk is computed twice.
+    Consecutive blocks are computed together, a window of about ``window_bytes`` at a time, so that they
+    share one graph execution and are computed concurrently.
+    """
+    if chunking == 'contiguous':
+        chunking = (1,)*data.ndim
+
+    axes = [list(zip(bounds[:-1], bounds[1:]))
+            for bounds in (_block_bounds(chunks, nc_chunk) for chunks, nc_chunk in zip(data.chunks, chunking))]
+    rois = [tuple(slice(*span) for span in spans) for spans in itertools.product(*axes)]
+
+    window, nbytes = [], 0
+    for i, roi in enumerate(rois):
+        window.append(roi)
+        nbytes += data.dtype.itemsize * numpy.prod([s.stop - s.start for s in roi])
+        if nbytes >= window_bytes or i == len(rois) - 1:
+            yield from zip(window, dask.compute(*[data[r] for r in window]))
+            window, nbytes = [], 0
+
+
+def _chunk_rows_shape(shape, chunking):
+    """
+    Shape of blocks to write an in-memory array in: one row of NetCDF chunks at a time,
+    spanning the full extent of the last dimension.
+    """
+    if chunking == 'contiguous':
+        return tuple(shape)
+
+    return tuple(min(n, nc_chunk) for n, nc_chunk in zip(shape[:-1], chunking[:-1])) + tuple(shape[-1:])
+
+
+def _iter_blocks(data, chunking):
+    """
+    Blocks of ``data`` (numpy or dask array) to write into a variable with NetCDF ``chunking``,
+    as ``(roi, numpy array)`` pairs.
+    """
+    if dask.is_dask_collection(data):
+        return _iter_dask_blocks(data, chunking)
+
+    return ((roi, data[roi])
+            for roi in iter_slices(data.shape, _chunk_rows_shape(data.shape, chunking)))
+
+
+def _write_blocks(write, blocks, write_behind=0):
+    """
+    Call ``write(roi, block)`` for every one of ``blocks``.
+
+    With ``write_behind > 0`` blocks are written from a background thread while the next ones
+    are computed, at most ``write_behind`` computed blocks are kept waiting to be written.
+    """
+    if write_behind <= 0:
+        for roi, block in blocks:
+            write(roi, block)
+        return
+
+    with ThreadPoolExecutor(max_workers=1) as writer:
+        pending = deque()
+        for roi, block in blocks:
+            pending.append(writer.submit(write, roi, block))
+            if len(pending) > write_behind:
+                pending.popleft().result()
+
+        while pending:
+            pending.popleft().result()
+
+
+def _write_variable(var, data, write_behind=0):
+    """
+    Write ``data`` (numpy or dask array) into NetCDF variable ``var`` one block at a time.
+
+    The HDF5 lock is only held while a block is written, rather than for the whole file, so that
+    other threads reading or writing NetCDF files can proceed between blocks. Dask blocks are
+    computed without holding the lock.
+    """
+    def write(roi, block):
+        with HDF5_LOCK:
+            var[roi] = block
+
+    with HDF5_LOCK:
+        chunking = var.chunking()
+
+    _write_blocks(write, _iter_blocks(data, chunking), write_behind)
+
+
+def _encode_pool():
+    """Thread pool shared by all direct chunk writes, created on first use."""
+    global _ENCODE_POOL  # pylint: disable=global-statement
+    with _ENCODE_POOL_LOCK:
+        if _ENCODE_POOL is None:
+            _ENCODE_POOL = ThreadPoolExecutor(max_workers=_ENCODE_THREADS)
+        return _ENCODE_POOL
+
+
+def _shuffle(data, itemsize):
+    """HDF5 shuffle filter: bytes of ``data`` regrouped by their position within each item"""
+    return b''.join(data[i::itemsize] for i in range(itemsize))
+
+
+def _chunk_filters(dset):
+    """
+    Filter pipeline of h5py dataset ``dset`` as a list of functions of chunk bytes,
+    or None when it uses filters other than shuffle and deflate.
+    """
+    plist = dset.id.get_create_plist()
+    filters = []
+    for i in range(plist.get_nfilters()):
+        code, _, values, _ = plist.get_filter(i)
+        if code == h5py.h5z.FILTER_SHUFFLE:
+            filters.append(partial(_shuffle, itemsize=dset.dtype.itemsize))
+        elif code == h5py.h5z.FILTER_DEFLATE:
+            filters.append(partial(zlib.compress, level=values[0]))
+        else:
+            return None
+    return filters
+
+
+class _ChunkWriter(object):
+    """
+    Write blocks of an array into chunked h5py dataset ``dset`` with HDF5 direct chunk writes.
+
+    Chunks are filtered (shuffled and compressed) on the threads of ``pool`` without holding any
+    lock, the HDF5 lock is only held while HDF5 copies the encoded bytes into the file. Chunks that
+    span several blocks are assembled in memory until their last part arrives, edge chunks are padded
+    with the fill value. Must be created while holding the HDF5 lock.
+    """
+    def __init__(self, dset, filters, pool):
+        self._dset = dset
+        self._filters = filters
+        self._pool = pool
+        self._chunks = dset.chunks
+        self._shape = dset.shape
+        self._dtype = dset.dtype
+        self._fill = dset.fillvalue
+        self._partial = {}
+
+    def write(self, roi, block):
+        ready = []
+        spans = [range(s.start - s.start % c, s.stop, c) for s, c in zip(roi, self._chunks)]
+        for offset in itertools.product(*spans):
+            extent = tuple(min(c, n - o) for c, n, o in zip(self._chunks, self._shape, offset))
+            lo = [max(o, s.start) for o, s in zip(offset, roi)]
+            hi = [min(o + e, s.stop) for o, e, s in zip(offset, extent, roi)]
+            part = block[tuple(slice(l - s.start, h - s.start) for l, h, s in zip(lo, hi, roi))]
+            if part.shape == extent:
+                ready.append((offset, part))
+                continue
+
+            buf, missing = self._partial.pop(offset, None) or (numpy.empty(extent, dtype=self._dtype),
+                                                               numpy.prod(extent))
+            buf[tuple(slice(l - o, h - o) for l, h, o in zip(lo, hi, offset))] = part
+            missing -= part.size
+            if missing > 0:
+                self._partial[offset] = (buf, missing)
+            else:
+                ready.append((offset, buf))
+
+        encoded = self._pool.map(self._encode, [data for _, data in ready])
+        for (offset, _), data in zip(ready, encoded):
+            with HDF5_LOCK:
+                self._dset.id.write_direct_chunk(offset, data)
+
+    def _encode(self, data):
+        if data.shape == self._chunks:
+            chunk = numpy.asarray(data, dtype=self._dtype)
+        else:
+            chunk = numpy.full(self._chunks, self._fill, dtype=self._dtype)
+            chunk[tuple(slice(0, n) for n in data.shape)] = data
+
+        encoded = chunk.tobytes()
+        for encode in self._filters:
+            encoded = encode(encoded)
+        return encoded
+
+
+def _writes_chunks(nco, var, data):
+    """
+    Whether ``data`` can be written into NetCDF variable ``var`` chunk by chunk with h5py,
+    rather than through netCDF4.
+    """
+    return (h5py is not None
+            and nco.data_model in ('NETCDF4', 'NETCDF4_CLASSIC')
+            and data.dtype.kind in 'biuf'
+            and var.chunking() != 'contiguous')
+
+
+def _write_chunks(dset, data, pool, write_behind=0):
+    """
+    Write ``data`` (numpy or dask array) into chunked h5py dataset ``dset``, compressing
+    chunks on the threads of ``pool``.
+    """
+    with HDF5_LOCK:
+        chunking = dset.chunks
+        filters = _chunk_filters(dset)
+        writer = None if filters is None else _ChunkWriter(dset, filters, pool)
+
+    if writer is not None:
+        write = writer.write
+    else:
+        def write(roi, block):
+            with HDF5_LOCK:
+                dset[roi] = block
+
+    _write_blocks(write, _iter_blocks(data, chunking), write_behind)
+
+
 def write_dataset_to_netcdf(dataset, filename, global_attributes=None, variable_params=None,
-                            netcdfparams=None):
+                            netcdfparams=None, write_behind=0):
     """
     Write a Data Cube style xarray Dataset to a NetCDF file
 
     Requires a spatial Dataset, with attached coordinates and global crs attribute.
 
+    Dask backed variables are computed and written a few blocks at a time, blocks are made of whole
+    dask chunks aligned to the NetCDF chunks of the variable where possible, so the whole dataset
+    never has to fit in memory.
+
+    When h5py is installed, numeric chunked variables of NETCDF4 files are written with HDF5 direct
+    chunk writes once the file is created: chunks are compressed in parallel, on threads shared by all
+    files, without holding the HDF5 lock, so other threads reading NetCDF files are not held up.
+
     :param `xarray.Dataset` dataset:
     :param filename: Output filename
     :param global_attributes: Global file attributes. dict of attr_name: attr_value
@@ -76,6 +340,9 @@ def write_dataset_to_netcdf(dataset, filename, global_attributes=None, variable_
                             See the `netCDF4.Dataset.createVariable` for available
                             parameters.
     :param netcdfparams: Optional params affecting netCDF file creation
+    :param write_behind: Number of computed blocks of dask backed variables allowed to wait
+                         for writing, while the following blocks are computed. With the
+                         default of 0 every block is written before the next one is computed.
     """
     global_attributes = global_attributes or {}
     variable_params = variable_params or {}
@@ -87,8 +354,7 @@ def write_dataset_to_netcdf(dataset, filename, global_attributes=None, variable_
     if dataset.geobox is None:
         raise DatacubeException('Dataset geobox property is None, cannot write to NetCDF file.')
 
-    try:
-        HDF5_LOCK.acquire(blocking=True)
+    with HDF5_LOCK:
         nco = create_netcdf_storage_unit(filename,
                                          dataset.geobox.crs,
                                          dataset.coords,
@@ -96,10 +362,37 @@ def write_dataset_to_netcdf(dataset, filename, global_attributes=None, variable_
                                          variable_params,
                                          global_attributes,
                                          netcdfparams)
+        nco.sync()
 
+    chunked = {}
+    try:
         for name, variable in dataset.data_vars.items():
-            nco[name][:] = netcdf_writer.netcdfy_data(variable.values)
+            if dask.is_dask_collection(variable.data) and variable.dtype.kind not in 'SUM':
+                data = variable.data
+            else:
+                data = netcdf_writer.netcdfy_data(variable.values)
 
-        nco.close()
+            with HDF5_LOCK:
+                writes_chunks = _writes_chunks(nco, nco[name], data)
+            if writes_chunks:
+                chunked[name] = data
+            else:
+                _write_variable(nco[name], data, write_behind=write_behind)
+    finally:
+        with HDF5_LOCK:
+            nco.close()
+
+    if not chunked:
+        return
+
+    # h5py may share one HDF5 library with netCDF4, every HDF5 call is made holding the lock
+    with HDF5_LOCK:
+        h5file = h5py.File(str(filename), 'r+')
+    try:
+        for name, data in chunked.items():
+            with HDF5_LOCK:
+                dset = h5file[name]
+            _write_chunks(dset, data, _encode_pool(), write_behind=write_behind)
     finally:
-        HDF5_LOCK.release()
+        with HDF5_LOCK:
+            h5file.close()
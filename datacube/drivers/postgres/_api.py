@@ -14,7 +14,7 @@ import logging
 import uuid  # noqa: F401
 from sqlalchemy import cast
 from sqlalchemy import delete
-from sqlalchemy import select, text, bindparam, and_, or_, func, literal, distinct
+from sqlalchemy import select, text, bindparam, and_, or_, func, literal, distinct, exists
 from sqlalchemy.dialects.postgresql import INTERVAL
 from sqlalchemy.dialects.postgresql import JSONB, insert
 from sqlalchemy.exc import IntegrityError
@@ -368,7 +368,10 @@ class PostgresDbAPI(object):
         ).fetchall()
 
     def get_dataset_sources(self, dataset_id):
-        # recursively build the list of (dataset_ref, source_dataset_ref) pairs starting from dataset_id
+        return self.get_multiple_dataset_sources([dataset_id])
+
+    def get_multiple_dataset_sources(self, dataset_ids):
+        # recursively build the list of (dataset_ref, source_dataset_ref) pairs starting from dataset_ids
         # include (dataset_ref, NULL) [hence the left join]
         sources = select(
             [DATASET.c.id.label('dataset_ref'),
@@ -379,10 +382,11 @@ class PostgresDbAPI(object):
                          DATASET.c.id == DATASET_SOURCE.c.dataset_ref,
                          isouter=True)
         ).where(
-            DATASET.c.id == dataset_id
+            DATASET.c.id.in_(dataset_ids)
         ).cte(name="sources", recursive=True)
 
-        sources = sources.union_all(
+        # lineage shared by several of the datasets is only visited once (union, not union all)
+        sources = sources.union(
             select(
                 [sources.c.source_dataset_ref.label('dataset_ref'),
                  DATASET_SOURCE.c.source_dataset_ref,
@@ -429,15 +433,35 @@ class PostgresDbAPI(object):
 
         return [raw_expr(expression) for expression in expressions]
 
+    @staticmethod
+    def _not_derived_by(product_id):
+        """
+        Condition for datasets with no active derived dataset of the given product (an anti-join)
+        """
+        derived = DATASET.alias('derived')
+        return ~exists(
+            select(
+                [literal(1)]
+            ).select_from(
+                DATASET_SOURCE.join(derived, derived.c.id == DATASET_SOURCE.c.dataset_ref)
+            ).where(
+                and_(DATASET_SOURCE.c.source_dataset_ref == DATASET.c.id,
+                     derived.c.dataset_type_ref == product_id,
+                     derived.c.archived == None)
+            )
+        )
+
     @staticmethod
     def search_datasets_query(expressions, source_exprs=None,
-                              select_fields=None, with_source_ids=False, limit=None):
+                              select_fields=None, with_source_ids=False, limit=None,
+                              not_derived_by=None):
         """
         :type expressions: Tuple[Expression]
         :type source_exprs: Tuple[Expression]
         :type select_fields: Iterable[PgField]
         :type with_source_ids: bool
         :type limit: int
+        :param int not_derived_by: only datasets with no derived dataset of this product id
         :rtype: sqlalchemy.Expression
         """
 
@@ -466,6 +490,8 @@ class PostgresDbAPI(object):
         raw_expressions = PostgresDbAPI._alchemify_expressions(expressions)
         from_expression = PostgresDbAPI._from_expression(DATASET, expressions, select_fields)
         where_expr = and_(DATASET.c.archived == None, *raw_expressions)
+        if not_derived_by is not None:
+            where_expr = and_(where_expr, PostgresDbAPI._not_derived_by(not_derived_by))
 
         if not source_exprs:
             return (
@@ -524,14 +550,16 @@ class PostgresDbAPI(object):
 
     def search_datasets(self, expressions,
                         source_exprs=None, select_fields=None,
-                        with_source_ids=False, limit=None):
+                        with_source_ids=False, limit=None, not_derived_by=None):
         """
         :type with_source_ids: bool
         :type select_fields: tuple[datacube.drivers.postgres._fields.PgField]
         :type expressions: tuple[datacube.drivers.postgres._fields.PgExpression]
+        :type not_derived_by: int
         """
         select_query = self.search_datasets_query(expressions, source_exprs,
-                                                  select_fields, with_source_ids, limit)
+                                                  select_fields, with_source_ids, limit,
+                                                  not_derived_by=not_derived_by)
         return self._connection.execute(select_query)
 
     @staticmethod
@@ -60,7 +60,7 @@ class PostgresDb(object):
         self._engine = engine
 
     @classmethod
-    def from_config(cls, config, application_name=None, validate_connection=True):
+    def from_config(cls, config, application_name=None, validate_connection=True, pool_size=None):
         app_name = cls._expand_app_name(application_name)
 
         return PostgresDb.create(
@@ -71,12 +71,13 @@ class PostgresDb(object):
             config.get('db_port', DEFAULT_DB_PORT),
             application_name=app_name,
             validate=validate_connection,
-            pool_timeout=int(config.get('db_connection_timeout', 60))
+            pool_timeout=int(config.get('db_connection_timeout', 60)),
+            pool_size=pool_size
         )
 
     @classmethod
     def create(cls, hostname, database, username=None, password=None, port=None,
-               application_name=None, validate=True, pool_timeout=60):
+               application_name=None, validate=True, pool_timeout=60, pool_size=None):
         engine = cls._create_engine(
             EngineUrl(
                 'postgresql',
@@ -84,7 +85,8 @@ class PostgresDb(object):
                 username=username, password=password,
             ),
             application_name=application_name,
-            pool_timeout=pool_timeout)
+            pool_timeout=pool_timeout,
+            pool_size=pool_size)
         if validate:
             if not _core.database_exists(engine):
                 raise IndexSetupError('\n\nNo DB schema exists. Have you run init?\n\t{init_command}'.format(
@@ -100,7 +102,11 @@ class PostgresDb(object):
         return PostgresDb(engine)
 
     @staticmethod
-    def _create_engine(url, application_name=None, pool_timeout=60):
+    def _create_engine(url, application_name=None, pool_timeout=60, pool_size=None):
+        # Number of connections kept open for re-use, more are opened (and closed after use) on demand.
+        # Should cover the number of threads using the database at once.
+        pool_args = {} if pool_size is None else {'pool_size': pool_size}
+
         return create_engine(
             url,
             echo=False,
@@ -115,7 +121,8 @@ class PostgresDb(object):
             # than assuming it's still open. Allows servers to close idle connections without clients
             # getting errors.
             pool_recycle=pool_timeout,
-            connect_args={'application_name': application_name}
+            connect_args={'application_name': application_name},
+            **pool_args
         )
 
     @property
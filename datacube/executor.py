@@ -10,10 +10,22 @@
 #    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
+import io
+import pickle
 import sys
 
+import numpy as np
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:  # Python < 3.8
+    resource_tracker = shared_memory = None
+
 _REMOTE_LOG_FORMAT_STRING = '%(asctime)s {} %(process)d %(name)s %(levelname)s %(message)s'
 
+#: Numpy arrays of at least this many bytes are passed to and from worker processes in shared memory
+SHARED_MEMORY_THRESHOLD = 1 << 20
+
 
 class SerialExecutor(object):
     def __repr__(self):
@@ -39,6 +51,12 @@ class SerialExecutor(object):
             exc_info = sys.exc_info()
             return [], [(reraise, exc_info, {})], futures[1:]
 
+    @staticmethod
+    def wait_ready(futures, timeout=None):
+        if not futures:
+            return [], [], []
+        return SerialExecutor.get_ready(futures)
+
     @staticmethod
     def as_completed(futures):
         for future in futures:
@@ -113,6 +131,15 @@ def _get_distributed_executor(scheduler):
                 groups.setdefault(f.status, []).append(f)
             return groups.get('finished', []), groups.get('error', []), groups.get('pending', [])
 
+        @classmethod
+        def wait_ready(cls, futures, timeout=None):
+            if futures:
+                try:
+                    distributed.wait(futures, timeout=timeout, return_when='FIRST_COMPLETED')
+                except distributed.TimeoutError:
+                    pass
+            return cls.get_ready(futures)
+
         @staticmethod
         def as_completed(futures):
             return distributed.as_completed(futures)
@@ -150,26 +177,128 @@ def _run_cloud_pickled_function(f_data, *args, **kwargs):
     return func(*args, **kwargs)
 
 
-def _get_concurrent_executor(workers, use_cloud_pickle=False):
+class _SharedArray(object):
+    """
+    Base object of numpy arrays viewing a block of shared memory, unmaps the block once
+    the last of them is gone.
+    """
+
+    def __init__(self, shm, shape, dtype):
+        self._shm = shm
+        view = np.ndarray(shape, dtype, buffer=shm.buf)
+        self.__array_interface__ = view.__array_interface__
+
+    def __del__(self):
+        self._shm.close()
+
+
+class _SharedMemoryPickler(pickle.Pickler):
+    """
+    Copies large numpy arrays into new blocks of shared memory, pickling only their names.
+    """
+
+    def __init__(self, file, threshold):
+        super(_SharedMemoryPickler, self).__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.threshold = max(threshold, 1)
+        self.blocks = {}
+
+    def persistent_id(self, obj):
+        # pylint: disable=unidiomatic-typecheck
+        if type(obj) is not np.ndarray or obj.dtype.hasobject or obj.nbytes < self.threshold:
+            return None
+
+        if id(obj) not in self.blocks:
+            shm = shared_memory.SharedMemory(create=True, size=obj.nbytes)
+            self.blocks[id(obj)] = (shm.name, obj.shape, obj.dtype)
+            try:
+                np.ndarray(obj.shape, obj.dtype, buffer=shm.buf)[...] = obj
+            finally:
+                shm.close()
+
+        return self.blocks[id(obj)]
+
+
+class _SharedMemoryUnpickler(pickle.Unpickler):
+    """
+    Maps arrays pickled by :class:`_SharedMemoryPickler` without copying, and unlinks their
+    blocks: they are freed once the arrays are garbage collected.
+    """
+
+    def __init__(self, file):
+        super(_SharedMemoryUnpickler, self).__init__(file)
+        self.arrays = {}
+
+    def persistent_load(self, pid):
+        name, shape, dtype = pid
+        if name not in self.arrays:
+            shm = shared_memory.SharedMemory(name=name)
+            shm.unlink()
+            self.arrays[name] = np.asarray(_SharedArray(shm, shape, dtype))
+        return self.arrays[name]
+
+
+def _shm_dumps(obj, threshold):
+    buf = io.BytesIO()
+    pickler = _SharedMemoryPickler(buf, threshold)
     try:
-        from concurrent.futures import ProcessPoolExecutor, as_completed
+        pickler.dump(obj)
+    except Exception:
+        for name, _, _ in pickler.blocks.values():
+            shared_memory.SharedMemory(name=name).unlink()
+        raise
+    return buf.getvalue()
+
+
+def _shm_loads(data):
+    return _SharedMemoryUnpickler(io.BytesIO(data)).load()
+
+
+class _SharedMemoryPayload(object):
+    """
+    Pickles to large numpy arrays of ``obj`` in shared memory and the rest of it inline,
+    unpickles to a copy of ``obj`` viewing those arrays in place.
+    """
+
+    def __init__(self, obj, threshold):
+        self.obj = obj
+        self.threshold = threshold
+
+    def __reduce__(self):
+        return _shm_loads, (_shm_dumps(self.obj, self.threshold),)
+
+
+def _run_with_shared_memory(threshold, func, payload):
+    args, kwargs = payload
+    return _SharedMemoryPayload(func(*args, **kwargs), threshold)
+
+
+def _get_concurrent_executor(workers, use_cloud_pickle=False, use_threads=False,
+                             shared_memory_threshold=SHARED_MEMORY_THRESHOLD):
+    try:
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
     except ImportError:
         return None
 
-    def mk_submitter(pool, use_cloud_pickle):
+    def mk_submitter(pool, use_cloud_pickle, shm_threshold):
         def submit_direct(func, *args, **kwargs):
             return pool.submit(func, *args, **kwargs)
 
+        def submit_shared_memory(func, *args, **kwargs):
+            return pool.submit(_run_with_shared_memory, shm_threshold, func,
+                               _SharedMemoryPayload((args, kwargs), shm_threshold))
+
+        submit = submit_direct if shm_threshold is None else submit_shared_memory
+
         def submit_cloud_pickle(func, *args, **kwargs):
             from cloudpickle import dumps
-            return pool.submit(_run_cloud_pickled_function, dumps(func), *args, **kwargs)
+            return submit(_run_cloud_pickled_function, dumps(func), *args, **kwargs)
 
-        return submit_cloud_pickle if use_cloud_pickle else submit_direct
+        return submit_cloud_pickle if use_cloud_pickle else submit
 
     class MultiprocessingExecutor(object):
-        def __init__(self, pool, use_cloud_pickle):
+        def __init__(self, pool, use_cloud_pickle, shm_threshold=None):
             self._pool = pool
-            self._submitter = mk_submitter(pool, use_cloud_pickle)
+            self._submitter = mk_submitter(pool, use_cloud_pickle, shm_threshold)
 
         def __repr__(self):
             max_workers = self._pool.__dict__.get('_max_workers', '??')
@@ -196,6 +325,12 @@ def _get_concurrent_executor(workers, use_cloud_pickle=False):
                     pending.append(f)
             return completed, failed, pending
 
+        @classmethod
+        def wait_ready(cls, futures, timeout=None):
+            if futures:
+                wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+            return cls.get_ready(futures)
+
         @staticmethod
         def as_completed(futures):
             return as_completed(futures)
@@ -221,19 +356,50 @@ def _get_concurrent_executor(workers, use_cloud_pickle=False):
         def release(future):
             pass
 
+    class ThreadExecutor(MultiprocessingExecutor):
+        """
+        Runs tasks in threads of this process: nothing is pickled, and tasks can share objects,
+        like an index and its connection pool, with the caller. Suits I/O bound tasks.
+        """
+
+        def __init__(self, pool):
+            super(ThreadExecutor, self).__init__(pool, use_cloud_pickle=False)
+
+        def __repr__(self):
+            max_workers = self._pool.__dict__.get('_max_workers', '??')
+            return 'Threads ({})'.format(max_workers)
+
     if workers <= 0:
         return None
 
-    return MultiprocessingExecutor(ProcessPoolExecutor(workers), use_cloud_pickle)
+    if use_threads:
+        return ThreadExecutor(ThreadPoolExecutor(workers))
+
+    if shared_memory is None:
+        shared_memory_threshold = None
+    elif shared_memory_threshold is not None:
+        # workers have to share the tracker of shared memory blocks with this process,
+        # otherwise theirs would unlink blocks they created on exit
+        resource_tracker.ensure_running()
+
+    return MultiprocessingExecutor(ProcessPoolExecutor(workers), use_cloud_pickle,
+                                   shm_threshold=shared_memory_threshold)
 
 
-def get_executor(scheduler, workers, use_cloud_pickle=True):
+def get_executor(scheduler, workers, use_cloud_pickle=True, use_threads=False,
+                 shared_memory_threshold=SHARED_MEMORY_THRESHOLD):
     """
     Return a task executor based on input parameters. Falling back as required.
 
     :param scheduler: IP address and port of a distributed.Scheduler, or a Scheduler instance
-    :param workers: Number of processes to start for process based parallel execution
+    :param workers: Number of processes (or threads) to start for local parallel execution
     :param use_cloud_pickle: Only applies when scheduler is None and workers > 0, default is True
+    :param use_threads: Run tasks in a pool of threads rather than processes,
+                        only applies when scheduler is None and workers > 0
+    :param shared_memory_threshold: Numpy arrays (also inside ``xarray`` objects) of at least this
+                        many bytes are passed to and from worker processes in shared memory rather
+                        than pickled, and results view it without a copy. Needs Python 3.8,
+                        ``None`` to always pickle. Only applies to a pool of processes.
     """
     if not workers:
         return SerialExecutor()
@@ -243,20 +409,23 @@ def get_executor(scheduler, workers, use_cloud_pickle=True):
         if distributed_exec:
             return distributed_exec
 
-    concurrent_exec = _get_concurrent_executor(workers, use_cloud_pickle=use_cloud_pickle)
+    concurrent_exec = _get_concurrent_executor(workers, use_cloud_pickle=use_cloud_pickle, use_threads=use_threads,
+                                               shared_memory_threshold=shared_memory_threshold)
     if concurrent_exec:
         return concurrent_exec
 
     return SerialExecutor()
 
 
-def mk_celery_executor(host, port, password=''):
+def mk_celery_executor(host, port, password='', **kwargs):
     """
     :param host: Address of the redis database server
     :param port: Port of the redis database server
     :password: Authentication for redis or None or ''
                '' -- load from home folder, or generate if missing,
                None -- no authentication
+    :param kwargs: Result handling options of :class:`datacube._celery_runner.CeleryExecutor`:
+                   ``compress_results``, ``offload_dir`` and ``offload_threshold``
     """
     from ._celery_runner import CeleryExecutor
-    return CeleryExecutor(host, port, password=password)
+    return CeleryExecutor(host, port, password=password, **kwargs)
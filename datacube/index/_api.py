@@ -14,7 +14,8 @@ _LOG = logging.getLogger(__name__)
 
 def index_connect(local_config: LocalConfig = None,
                   application_name: str = None,
-                  validate_connection: bool = True) -> Index:
+                  validate_connection: bool = True,
+                  pool_size: int = None) -> Index:
     """
     Create a Data Cube Index that can connect to a PostgreSQL server
 
@@ -24,6 +25,8 @@ def index_connect(local_config: LocalConfig = None,
     :param application_name: A short, alphanumeric name to identify this application.
     :param local_config: Config object to use. (optional)
     :param validate_connection: Validate database connection and schema immediately
+    :param pool_size: Number of database connections kept open for re-use, should cover the number
+                      of threads using the index at once. Driver default if not given.
     :raises datacube.index.Exceptions.IndexSetupError:
     """
     if local_config is None:
@@ -38,6 +41,10 @@ def index_connect(local_config: LocalConfig = None,
             )
         )
 
+    # only passed on when set, index drivers are not required to support it
+    extra_args = {} if pool_size is None else {'pool_size': pool_size}
+
     return index_driver.connect_to_index(local_config,
                                          application_name=application_name,
-                                         validate_connection=validate_connection)
+                                         validate_connection=validate_connection,
+                                         **extra_args)
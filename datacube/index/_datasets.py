@@ -80,12 +80,44 @@ class DatasetResource(object):
                 dataset = connection.get_dataset(id_)
                 return self._make(dataset, full_info=True) if dataset else None
 
-            datasets = {result['id']: (self._make(result, full_info=True), result)
-                        for result in connection.get_dataset_sources(id_)}
+            datasets = self._make_with_sources(connection.get_dataset_sources(id_))
 
-        if not datasets:
-            # No dataset found
-            return None
+        # None if no dataset found
+        return datasets.get(id_)
+
+    def bulk_get(self, ids, include_sources=False):
+        """
+        Get datasets by ids, in a single query
+
+        :param ids: iterable of dataset ids (UUID or str)
+        :param bool include_sources: get the full provenance graph of every dataset?
+            Lineage is fetched with one recursive query for all datasets, datasets shared by
+            several provenance graphs are the same object in all of them.
+        :return: Datasets found, missing ids are skipped
+        :rtype: list[Dataset]
+        """
+        def to_uuid(x):
+            return x if isinstance(x, UUID) else UUID(x)
+
+        ids = [to_uuid(i) for i in ids]
+
+        with self._db.connect() as connection:
+            if not include_sources:
+                rows = connection.get_datasets(ids)
+                return [self._make(r, full_info=True) for r in rows]
+
+            datasets = self._make_with_sources(connection.get_multiple_dataset_sources(ids))
+
+        return [datasets[id_] for id_ in ids if id_ in datasets]
+
+    def _make_with_sources(self, results):
+        """
+        Make datasets from rows of the lineage query, with their sources linked up
+
+        :return: dict of dataset id to Dataset
+        """
+        datasets = {result['id']: (self._make(result, full_info=True), result)
+                    for result in results}
 
         for dataset, result in datasets.values():
             dataset.metadata.sources = {
@@ -96,17 +128,7 @@ class DatasetResource(object):
                 classifier: datasets[source][0]
                 for source, classifier in zip(result['sources'], result['classes']) if source
             }
-        return datasets[id_][0]
-
-    def bulk_get(self, ids):
-        def to_uuid(x):
-            return x if isinstance(x, UUID) else UUID(x)
-
-        ids = [to_uuid(i) for i in ids]
-
-        with self._db.connect() as connection:
-            rows = connection.get_datasets(ids)
-            return [self._make(r, full_info=True) for r in rows]
+        return {id_: dataset for id_, (dataset, _) in datasets.items()}
 
     def get_derived(self, id_):
         """
@@ -209,6 +231,39 @@ class DatasetResource(object):
 
         return dataset
 
+    def bulk_add(self, datasets):
+        """
+        Add many datasets to the index in a single transaction, without adding their lineage.
+
+        Datasets already present are skipped. Sources of the datasets must be indexed already,
+        links to them are recorded, as with ``add(dataset, with_lineage=False)``.
+
+        :param Iterable[Dataset] datasets: datasets to add
+        :return: number of datasets added
+        :rtype: int
+        """
+        datasets = list(datasets)
+        present = self.bulk_has([ds.id for ds in datasets])
+
+        added = 0
+        with self._db.begin() as transaction:
+            for ds, is_present in zip(datasets, present):
+                if is_present:
+                    _LOG.warning('Dataset %s is already in the database', ds.id)
+                    continue
+
+                if not transaction.insert_dataset(ds.metadata_doc_without_lineage(), ds.id, ds.type.id):
+                    continue
+                added += 1
+
+                for classifier, source in ds.sources.items():
+                    transaction.insert_dataset_source(classifier, ds.id, source.id)
+
+                if ds.uris is not None:
+                    self._ensure_new_locations(ds, transaction=transaction)
+
+        return added
+
     def search_product_duplicates(self, product: DatasetType, *args):
         """
         Find dataset ids who have duplicates of the given set of field names.
@@ -491,13 +546,19 @@ class DatasetResource(object):
         """
         Perform a search, returning results as Dataset objects.
 
+        Datasets can be restricted to those not yet processed into another product with
+        ``not_derived_by=<product name>``: only datasets with no (active) derived dataset of
+        that product are returned.
+
         :param Union[str,float,Range,list] query:
         :param int limit: Limit number of datasets
         :rtype: __generator[Dataset]
         """
         source_filter = query.pop('source_filter', None)
+        not_derived_by = query.pop('not_derived_by', None)
         for product, datasets in self._do_search_by_product(query,
                                                             source_filter=source_filter,
+                                                            not_derived_by=not_derived_by,
                                                             limit=limit):
             yield from self._make_many(datasets, product)
 
@@ -604,7 +665,7 @@ class DatasetResource(object):
     # pylint: disable=too-many-locals
     def _do_search_by_product(self, query, return_fields=False, select_field_names=None,
                               with_source_ids=False, source_filter=None,
-                              limit=None):
+                              limit=None, not_derived_by=None):
         if source_filter:
             product_queries = list(self._get_product_queries(source_filter))
             if not product_queries:
@@ -619,6 +680,12 @@ class DatasetResource(object):
         else:
             source_exprs = None
 
+        if not_derived_by is not None:
+            derived_product = self.types.get_by_name(not_derived_by)
+            if derived_product is None:
+                raise ValueError('Unknown product: %r' % not_derived_by)
+            not_derived_by = derived_product.id
+
         product_queries = list(self._get_product_queries(query))
         if not product_queries:
             raise ValueError('No products match search terms: %r' % query)
@@ -642,7 +709,8 @@ class DatasetResource(object):
                            source_exprs,
                            select_fields=select_fields,
                            limit=limit,
-                           with_source_ids=with_source_ids
+                           with_source_ids=with_source_ids,
+                           not_derived_by=not_derived_by
                        ))
 
     def _do_count_by_product(self, query):
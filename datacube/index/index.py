@@ -47,9 +47,10 @@ class Index(object):
         return self._db.url
 
     @classmethod
-    def from_config(cls, config, application_name=None, validate_connection=True):
+    def from_config(cls, config, application_name=None, validate_connection=True, pool_size=None):
         db = PostgresDb.from_config(config, application_name=application_name,
-                                    validate_connection=validate_connection)
+                                    validate_connection=validate_connection,
+                                    pool_size=pool_size)
         return cls(db)
 
     @classmethod
@@ -89,8 +90,8 @@ class Index(object):
 
 class DefaultIndexDriver(object):
     @staticmethod
-    def connect_to_index(config, application_name=None, validate_connection=True):
-        return Index.from_config(config, application_name, validate_connection)
+    def connect_to_index(config, application_name=None, validate_connection=True, pool_size=None):
+        return Index.from_config(config, application_name, validate_connection, pool_size=pool_size)
 
     @staticmethod
     def metadata_type_from_doc(definition: dict) -> MetadataType:
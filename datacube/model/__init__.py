@@ -4,12 +4,14 @@ Core classes used across modules.
 """
 import logging
 import math
+import threading
 import warnings
 from collections import OrderedDict
 from datetime import datetime
 from pathlib import Path
 from uuid import UUID
 
+import cachetools
 from affine import Affine
 from typing import Optional, List, Mapping, Any, Dict, Tuple, Iterator
 
@@ -25,6 +27,9 @@ DEFAULT_SPATIAL_DIMS = ('y', 'x')  # Used when product lacks grid_spec
 
 SCHEMA_PATH = Path(__file__).parent / 'schema'
 
+_TILE_GEOBOX_CACHE = cachetools.LRUCache(maxsize=4096)  # type: cachetools.LRUCache
+_TILE_GEOBOX_LOCK = threading.Lock()
+
 
 class Dataset:
     """
@@ -562,6 +567,8 @@ class GridSpec:
     :param [float,float] resolution: (Y, X) size of each data point in the grid, in CRS units. Y will
                                    usually be negative.
     :param [float,float] origin: (Y, X) coordinates of a corner of the (0,0) tile in CRS units. default is (0.0, 0.0)
+
+    GridSpec is immutable and hashable, so it can be used as a cache key.
     """
 
     def __init__(self,
@@ -569,10 +576,20 @@ class GridSpec:
                  tile_size: Tuple[float, float],
                  resolution: Tuple[float, float],
                  origin: Optional[Tuple[float, float]] = None):
-        self.crs = crs
-        self.tile_size = tile_size
-        self.resolution = resolution
-        self.origin = origin or (0.0, 0.0)
+        def as_tuple(point):
+            return None if point is None else tuple(point)
+
+        _set = super().__setattr__
+        _set('crs', crs)
+        _set('tile_size', as_tuple(tile_size))
+        _set('resolution', as_tuple(resolution))
+        _set('origin', tuple(origin or (0.0, 0.0)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("GridSpec is immutable, can't set '{}'".format(name))
+
+    def __delattr__(self, name):
+        raise AttributeError("GridSpec is immutable, can't delete '{}'".format(name))
 
     def __eq__(self, other):
         if not isinstance(other, GridSpec):
@@ -583,6 +600,10 @@ class GridSpec:
                 and self.resolution == other.resolution
                 and self.origin == other.origin)
 
+    def __hash__(self):
+        # CRS hash is expensive and not needed to tell grids apart in practice
+        return hash((self.tile_size, self.resolution, self.origin))
+
     @property
     def dimensions(self) -> Tuple[str, str]:
         """
@@ -628,12 +649,23 @@ class GridSpec:
         """
         Tile geobox.
 
+        Tile geoboxes are kept in a process-wide LRU cache shared by all grids.
+
         :param (int,int) tile_index:
         """
+        key = (self, tuple(tile_index))
+        with _TILE_GEOBOX_LOCK:
+            geobox = _TILE_GEOBOX_CACHE.get(key)
+        if geobox is not None:
+            return geobox
+
         res_y, res_x = self.resolution
         y, x = self.tile_coords(tile_index)
         h, w = self.tile_resolution
         geobox = geometry.GeoBox(crs=self.crs, affine=Affine(res_x, 0.0, x, 0.0, res_y, y), width=w, height=h)
+
+        with _TILE_GEOBOX_LOCK:
+            _TILE_GEOBOX_CACHE[key] = geobox
         return geobox
 
     def tiles(self, bounds: geometry.BoundingBox,
@@ -1,13 +1,15 @@
 import time
 import logging
 import click
-import cachetools
 import itertools
+import queue
 import sys
+import threading
+import toolz
 from copy import deepcopy
 from pathlib import Path
 from pandas import to_datetime
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Tuple
 
 import datacube
@@ -19,6 +21,7 @@ from datacube.model.utils import make_dataset, xr_apply, datasets_to_doc
 from datacube.ui import click as ui
 from datacube.utils import read_documents
 from datacube.utils.documents import InvalidDocException
+from datacube.utils.generic import qmap, it2q
 from datacube.utils.uris import normalise_path
 from datacube.ui.task_app import check_existing_files, load_tasks as load_tasks_, save_tasks as save_tasks_
 from datacube.drivers import storage_writer_by_name
@@ -37,11 +40,30 @@ def polygon_from_sources_extents(sources, geobox):
     return valid_data.simplify(tolerance=resolution * 0.01)
 
 
-def find_diff(input_type, output_type, index, **query):
+def find_diff(input_type, output_type, index, incremental=False, **query):
+    """
+    Tiles of ``input_type`` missing from ``output_type``, as ingest tasks.
+
+    By default all tiles of both products are compared. With ``incremental``, only source datasets
+    with no derived dataset of ``output_type`` at all (found by the index) are tiled, and output tiles
+    are only listed over the time span of those datasets, so that the work scales with the new data
+    rather than with the products. A source dataset counts as ingested as soon as any one of its
+    tiles is, so the remaining tiles of datasets partly ingested by an interrupted run are only
+    found by the full comparison.
+    """
     from datacube.api.grid_workflow import GridWorkflow
     workflow = GridWorkflow(index, output_type.grid_spec)
 
-    tiles_in = workflow.list_tiles(product=input_type.name, **query)
+    if incremental:
+        tiles_in = workflow.list_tiles(product=input_type.name, not_derived_by=output_type.name, **query)
+        if not tiles_in:
+            return []
+
+        times = [to_datetime(tile_index[2]).to_pydatetime() for tile_index in tiles_in]
+        query = dict(query, time=Range(min(times), max(times) + timedelta(milliseconds=1)))
+    else:
+        tiles_in = workflow.list_tiles(product=input_type.name, **query)
+
     tiles_out = workflow.list_tiles(product=output_type.name, **query)
 
     tasks = [{'tile': tile, 'tile_index': key} for key, tile in tiles_in.items() if key not in tiles_out]
@@ -178,9 +200,36 @@ def ensure_output_type(index: Index,
     return source_type, output_type
 
 
-@cachetools.cached(cache={}, key=lambda index, id_: id_)
-def get_full_lineage(index, id_):
-    return index.datasets.get(id_, include_sources=True)
+def with_full_lineage(index, tasks, batch_size=1000):
+    """
+    Replace source datasets of task tiles with datasets carrying their full lineage.
+
+    Lineage is fetched in bulk, with one query for the sources of every ``batch_size`` tasks,
+    datasets fetched for one batch are re-used by the next one. Sources missing from the index
+    are kept as they are.
+    """
+    lineage = {}
+    for batch in toolz.partition_all(batch_size, tasks):
+        ids = {dataset.id
+               for task in batch
+               for sources in task['tile'].sources.values
+               for dataset in sources}
+        # only datasets of the current batch are kept, so memory use does not grow with the task list
+        lineage = {id_: lineage[id_] for id_ in ids if id_ in lineage}
+        missing = [id_ for id_ in ids if id_ not in lineage]
+        if missing:
+            lineage.update((dataset.id, dataset)
+                           for dataset in index.datasets.bulk_get(missing, include_sources=True))
+            not_found = [id_ for id_ in missing if id_ not in lineage]
+            if not_found:
+                _LOG.warning('%d source datasets not found in the index, ingesting them without full lineage: %s',
+                             len(not_found), ', '.join(str(id_) for id_ in not_found))
+
+        for task in batch:
+            tile = task['tile']
+            for i in range(tile.sources.size):
+                tile.sources.values[i] = tuple(lineage.get(dataset.id, dataset) for dataset in tile.sources.values[i])
+            yield task
 
 
 def load_config_from_file(path):
@@ -192,7 +241,7 @@ def load_config_from_file(path):
     return config
 
 
-def create_task_list(index, output_type, year, source_type, config):
+def create_task_list(index, output_type, year, source_type, config, incremental=False):
     config['taskfile_utctime'] = int(time.time())
 
     query = {}
@@ -203,7 +252,7 @@ def create_task_list(index, output_type, year, source_type, config):
         query['x'] = Range(bounds['left'], bounds['right'])
         query['y'] = Range(bounds['bottom'], bounds['top'])
 
-    tasks = find_diff(source_type, output_type, index, **query)
+    tasks = find_diff(source_type, output_type, index, incremental=incremental, **query)
     _LOG.info('%s tasks discovered', len(tasks))
 
     def check_valid(tile, tile_index):
@@ -216,34 +265,26 @@ def create_task_list(index, output_type, year, source_type, config):
 
         return not require_fusing
 
-    def update_sources(sources):
-        return tuple(get_full_lineage(index, dataset.id) for dataset in sources)
-
-    def update_task(task):
-        tile = task['tile']
-        for i in range(tile.sources.size):
-            tile.sources.values[i] = update_sources(tile.sources.values[i])
-        return task
-
-    tasks = (update_task(task) for task in tasks if check_valid(**task))
-    return tasks
+    return with_full_lineage(index, (task for task in tasks if check_valid(**task)))
 
 
-def ingest_work(config, source_type, output_type, tile, tile_index):
-    # pylint: disable=too-many-locals
-    _LOG.info('Starting task %s', tile_index)
+def _get_driver(config):
     driver = storage_writer_by_name(config['storage']['driver'])
 
     if driver is None:
         _LOG.error('Failed to load storage driver %s', config['storage']['driver'])
         raise ValueError('Something went wrong: no longer can find driver pointed by storage.driver option')
 
-    namemap = get_namemap(config)
+    return driver
+
+
+def _load_tile(config, source_type, tile, tile_index):
+    """ Read stage of ingestion: load source data of a tile """
+    _LOG.info('Starting task %s', tile_index)
+
     # TODO: get_measurements possibly changes dtype, not sure load_data would like that
     measurements = get_measurements(source_type, config)
     resampling = get_resampling(config)
-    variable_params = get_variable_params(config)
-    global_attributes = config['global_attributes']
 
     fuse_func = {'copy': None}[config.get(FUSER_KEY, 'copy')]
 
@@ -252,10 +293,16 @@ def ingest_work(config, source_type, output_type, tile, tile_index):
         if not dataset.uris:
             _LOG.error('Locationless dataset found in the database: %r', dataset)
 
-    data = Datacube.load_data(tile.sources, tile.geobox, measurements,
+    return Datacube.load_data(tile.sources, tile.geobox, measurements,
                               resampling=resampling,
                               fuse_func=fuse_func)
 
+
+def _prepare_tile(config, output_type, driver, data, tile, tile_index):
+    """ Compute stage of ingestion: output variables and dataset documents of a loaded tile """
+    namemap = get_namemap(config)
+    variable_params = get_variable_params(config)
+
     nudata = data.rename(namemap)
     file_path = get_filename(config, tile_index, tile.sources)
     file_uri = driver.mk_uri(file_path, config['storage'])
@@ -278,8 +325,13 @@ def ingest_work(config, source_type, output_type, tile, tile_index):
         'complevel': 9,
     }
 
+    return nudata, datasets, file_uri, variable_params
+
+
+def _write_tile(config, driver, tile_index, nudata, datasets, file_uri, variable_params):
+    """ Write stage of ingestion: write a prepared tile to storage """
     driver_data = driver.write_dataset_to_storage(nudata, file_uri,
-                                                  global_attributes=global_attributes,
+                                                  global_attributes=config['global_attributes'],
                                                   variable_params=variable_params,
                                                   storage_config=config['storage'])
 
@@ -291,78 +343,241 @@ def ingest_work(config, source_type, output_type, tile, tile_index):
     return datasets
 
 
-def _index_datasets(index, results):
-    n = 0
-    for datasets in results:
-        extra_args = {}
-        # datasets is an xarray.DataArray
-        if 'driver_data' in datasets.attrs:
-            extra_args['driver_data'] = datasets.attrs['driver_data']
+def ingest_work(config, source_type, output_type, tile, tile_index):
+    driver = _get_driver(config)
 
-        for dataset in datasets.values:
-            if 'driver_data' in extra_args:
-                dataset.metadata_doc['driver_data'] = extra_args['driver_data']
-            index.datasets.add(dataset, with_lineage=False, **extra_args)
-            n += 1
-    return n
+    data = _load_tile(config, source_type, tile, tile_index)
+    prepared = _prepare_tile(config, output_type, driver, data, tile, tile_index)
+    return _write_tile(config, driver, tile_index, *prepared)
 
 
-def process_tasks(index, config, source_type, output_type, tasks, queue_size, executor):
-    # pylint: disable=too-many-locals
-    def submit_task(task):
-        _LOG.info('Submitting task: %s', task['tile_index'])
-        return executor.submit(ingest_work,
-                               config=config,
-                               source_type=source_type,
-                               output_type=output_type,
-                               **task)
+def ingest_tiles(config, source_type, output_type, tasks, read_ahead=1):
+    """
+    Ingest a number of tiles, reading the next tiles while writing the current one.
 
-    pending = []
+    Reading, preparing dataset documents and writing run in three threads connected by
+    queues of at most `read_ahead` tiles each, which bounds the number of tiles in memory.
+    With `read_ahead` of 0, or a single tile to ingest, the stages run one after the other
+    for each tile instead.
 
-    # Count of storage unit/s creation successful/failed
-    nc_successful = nc_failed = 0
+    Failure to ingest a tile does not stop ingestion of the others. Anything else raised in a
+    stage thread (e.g. ``KeyboardInterrupt``) ends the pipeline and is raised here.
 
-    # Count of storage unit/s indexed successfully or failed to index
-    index_successful = index_failed = 0
+    :return: list of ``(tile_index, datasets)`` for each task, where ``datasets`` is
+             the exception raised instead for failed tiles
+    """
+    driver = _get_driver(config)
 
-    tasks = iter(tasks)
+    def stage(func):
+        def run(item):
+            task, value = item
+            if isinstance(value, Exception):
+                return item
+            try:
+                return task, func(task, value)
+            except Exception as err:  # pylint: disable=broad-except
+                return task, err
+        return run
 
-    while True:
-        pending += [submit_task(task) for task in itertools.islice(tasks, queue_size)]
-        if len(pending) == 0:
-            break
+    def load(task, _):
+        return _load_tile(config, source_type, **task)
 
-        nc_completed, failed, pending = executor.get_ready(pending)
-        nc_successful += len(nc_completed)
+    def prepare(task, data):
+        return _prepare_tile(config, output_type, driver, data, **task)
 
-        for future in failed:
-            try:
-                executor.result(future)
-            except Exception as err:  # pylint: disable=broad-except
-                _LOG.exception('Failed to create storage unit file (Exception: %s) ', str(err), exc_info=True)
-                nc_failed += 1
+    def write(task, prepared):
+        return _write_tile(config, driver, task['tile_index'], *prepared)
+
+    tasks = list(tasks)
+    items = ((task, None) for task in tasks)
+
+    if read_ahead <= 0 or len(tasks) < 2:
+        # nothing to overlap
+        return [(task['tile_index'], value)
+                for task, value in map(stage(write), map(stage(prepare), map(stage(load), items)))]
+
+    errors = []
+
+    def feed(values, out):
+        try:
+            # puts the end marker in a `finally`, so the next stage stops whatever happens here
+            it2q(values, out)
+        except BaseException as err:  # pylint: disable=broad-except
+            errors.append(err)
+
+    loaded = queue.Queue(maxsize=read_ahead)
+    prepared = queue.Queue(maxsize=read_ahead)
+    stages = [threading.Thread(target=feed, args=(map(stage(load), items), loaded), daemon=True),
+              threading.Thread(target=feed, args=(qmap(stage(prepare), loaded), prepared), daemon=True)]
+    for thread in stages:
+        thread.start()
+
+    outcomes = [(task['tile_index'], value) for task, value in qmap(stage(write), prepared)]
+
+    for thread in stages:
+        thread.join()
 
-        _LOG.info('Storage unit file creation status (Created_Count: %s, Failed_Count: %s)',
-                  nc_successful,
-                  nc_failed)
+    if errors:
+        # tiles after the failure were never written
+        raise errors[0]
 
-        if not nc_completed:
-            time.sleep(1)
-            continue
+    return outcomes
 
+
+def _datasets_to_index(datasets):
+    # datasets is an xarray.DataArray
+    driver_data = datasets.attrs.get('driver_data')
+    for dataset in datasets.values:
+        if driver_data is not None:
+            dataset.metadata_doc['driver_data'] = driver_data
+        yield dataset
+
+
+class _BackgroundIndexer(object):
+    """
+    Index the datasets of written tiles from a background thread, several tiles per transaction.
+
+    At most ``backlog`` tiles wait to be indexed, :meth:`put` blocks while the backlog is full.
+    If the background thread fails, :meth:`put` and :meth:`close` raise its error.
+    """
+
+    def __init__(self, index, backlog=100, batch_size=100):
+        self.successful = self.failed = 0
+        self._index = index
+        self._batch_size = batch_size
+        self._queue = queue.Queue(maxsize=backlog)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name='ingest-indexer', daemon=True)
+        self._thread.start()
+
+    def put(self, datasets):
+        # a stopped thread would never make room in the queue
+        while True:
+            self._raise_error()
+            if not self._thread.is_alive():
+                raise RuntimeError('Background indexing thread has stopped')
+            try:
+                self._queue.put(datasets, timeout=1)
+                return
+            except queue.Full:
+                pass
+
+    def close(self):
+        """ Index the backlog and stop the background thread """
+        self.put(None)
+        self._thread.join()
+        self._raise_error()
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
+
+    def _run(self):
         try:
-            # TODO: ideally we wouldn't block here indefinitely
-            # maybe limit gather to 50-100 results and put the rest into a index backlog
-            # this will also keep the queue full
-            results = executor.results(nc_completed)
-            index_successful += _index_datasets(index, results)
+            done = False
+            while not done:
+                batch = []
+                while len(batch) < self._batch_size:
+                    try:
+                        # wait for the first tile of a batch, then take whatever else is ready
+                        datasets = self._queue.get(block=not batch)
+                    except queue.Empty:
+                        break
+                    if datasets is None:
+                        done = True
+                        break
+                    batch.extend(_datasets_to_index(datasets))
+
+                if batch:
+                    self._index_batch(batch)
         except Exception as err:  # pylint: disable=broad-except
-            _LOG.exception('Failed to index storage unit file (Exception: %s)', str(err), exc_info=True)
-            index_failed += 1
+            _LOG.exception('Background indexing failed (Exception: %s)', str(err))
+            self._error = err
 
-        _LOG.info('Storage unit files indexed (Successful: %s, Failed: %s)', index_successful, index_failed)
+    def _index_batch(self, batch):
+        try:
+            self._index.datasets.bulk_add(batch)
+            self.successful += len(batch)
+            return
+        except Exception as err:  # pylint: disable=broad-except
+            _LOG.warning('Failed to index %d datasets at once, indexing one by one (Exception: %s)',
+                         len(batch), str(err))
 
-    return index_successful, index_failed
+        for dataset in batch:
+            try:
+                self._index.datasets.add(dataset, with_lineage=False)
+                self.successful += 1
+            except Exception as err:  # pylint: disable=broad-except
+                _LOG.exception('Failed to index storage unit file (Exception: %s)', str(err), exc_info=True)
+                self.failed += 1
+
+
+def process_tasks(index, config, source_type, output_type, tasks, queue_size, executor,
+                  tiles_per_task=1, read_ahead=1, index_backlog=100):
+    # pylint: disable=too-many-locals
+    def submit_task(batch):
+        _LOG.info('Submitting task: %s', ', '.join(str(task['tile_index']) for task in batch))
+        return executor.submit(ingest_tiles,
+                               config=config,
+                               source_type=source_type,
+                               output_type=output_type,
+                               tasks=batch,
+                               read_ahead=read_ahead)
+
+    pending = []
+
+    # Count of storage unit/s creation successful/failed
+    nc_successful = nc_failed = 0
+
+    tasks = iter(tasks)
+    batches = iter(lambda: list(itertools.islice(tasks, tiles_per_task)), [])
+    batches_per_queue = max(1, queue_size // tiles_per_task)
+
+    indexer = _BackgroundIndexer(index, backlog=index_backlog)
+    start_time = time.monotonic()
+
+    try:
+        while True:
+            pending += [submit_task(batch)
+                        for batch in itertools.islice(batches, batches_per_queue - len(pending))]
+            if len(pending) == 0:
+                break
+
+            completed, failed, pending = executor.wait_ready(pending)
+
+            for future in failed:
+                try:
+                    executor.result(future)
+                except Exception as err:  # pylint: disable=broad-except
+                    _LOG.exception('Failed to create storage unit file (Exception: %s) ', str(err), exc_info=True)
+                    nc_failed += 1
+
+            for tile_index, outcome in itertools.chain.from_iterable(executor.results(completed)):
+                if isinstance(outcome, Exception):
+                    _LOG.error('Failed to create storage unit file for %s (Exception: %s)', tile_index, str(outcome),
+                               exc_info=outcome)
+                    nc_failed += 1
+                else:
+                    nc_successful += 1
+                    # blocks only once indexing falls behind by more than the backlog
+                    indexer.put(outcome)
+
+            for future in failed + completed:
+                executor.release(future)
+
+            elapsed = max(time.monotonic() - start_time, 1e-6)
+            _LOG.info('Storage unit file creation status (Created_Count: %s, Failed_Count: %s, %.2f tiles/s)',
+                      nc_successful, nc_failed, nc_successful / elapsed)
+            _LOG.info('Storage unit files indexed (Successful: %s, Failed: %s, %.2f datasets/s)',
+                      indexer.successful, indexer.failed, indexer.successful / elapsed)
+    finally:
+        indexer.close()
+
+    elapsed = max(time.monotonic() - start_time, 1e-6)
+    _LOG.info('Wrote %s tiles (%.2f tiles/s), indexed %s datasets (%.2f datasets/s) in %.1fs',
+              nc_successful, nc_successful / elapsed, indexer.successful, indexer.successful / elapsed, elapsed)
+
+    return indexer.successful, indexer.failed
 
 
 def _validate_year(ctx, param, value):
@@ -393,11 +608,22 @@ def get_driver_from_config(config):
               help='Ingest configuration file')
 @click.option('--year', callback=_validate_year, help='Limit the process to a particular year')
 @click.option('--queue-size', type=click.IntRange(1, 100000), default=3200, help='Task queue size')
+@click.option('--tiles-per-task', type=click.IntRange(1, 100000), default=1,
+              help='Number of tiles ingested one after the other by each executor task, '
+                   'at least 2 for --read-ahead to take effect')
+@click.option('--read-ahead', type=click.IntRange(0, 1000), default=None,
+              help='Number of tiles each executor task reads ahead of the one it writes (default 1), '
+                   '0 to read and write in turn. Needs --tiles-per-task of 2 or more, '
+                   'a task of a single tile has nothing to read ahead')
 @click.option('--save-tasks', help='Save tasks to the specified file',
               type=click.Path(exists=False))
 @click.option('--load-tasks', help='Load tasks from the specified file',
               type=click.Path(exists=True, readable=True, writable=False, dir_okay=False))
 @click.option('--dry-run', '-d', is_flag=True, default=False, help='Check if everything is ok')
+@click.option('--incremental', is_flag=True, default=False,
+              help='Only tile source datasets with no tiles ingested yet, rather than comparing all tiles of the '
+                   'source and output products. Misses the remaining tiles of datasets partly ingested by an '
+                   'interrupted run.')
 @click.option('--allow-product-changes', is_flag=True, default=False,
               help='Allow the output product definition to be updated if it differs.')
 @ui.executor_cli_options
@@ -406,13 +632,21 @@ def ingest_cmd(index,
                config_file,
                year,
                queue_size,
+               tiles_per_task,
+               read_ahead,
                save_tasks,
                load_tasks,
                dry_run,
+               incremental,
                allow_product_changes,
                executor):
     # pylint: disable=too-many-locals
 
+    if read_ahead is None:
+        read_ahead = 1
+    elif read_ahead > 0 and tiles_per_task < 2:
+        _LOG.warning('--read-ahead has no effect with a single tile per task, use --tiles-per-task of 2 or more')
+
     try:
         if config_file:
             config, tasks = load_config_from_file(config_file), None
@@ -437,14 +671,15 @@ def ingest_cmd(index,
         sys.exit(-1)
 
     if tasks is None:
-        tasks = create_task_list(index, output_type, year, source_type, config)
+        tasks = create_task_list(index, output_type, year, source_type, config, incremental=incremental)
 
     if dry_run:
         check_existing_files(get_filename(config, task['tile_index'], task['tile'].sources) for task in tasks)
     elif save_tasks:
         save_tasks_(config, tasks, save_tasks)
     else:
-        successful, failed = process_tasks(index, config, source_type, output_type, tasks, queue_size, executor)
+        successful, failed = process_tasks(index, config, source_type, output_type, tasks, queue_size, executor,
+                                           tiles_per_task=tiles_per_task, read_ahead=read_ahead)
         click.echo('%d successful, %d failed' % (successful, failed))
 
         sys.exit(failed)
@@ -47,6 +47,10 @@ def reproject_and_fuse(datasources: List[DataSource],
     """
     Reproject and fuse `sources` into a 2D numpy array `destination`.
 
+    When data sources read several bands at once (see
+    :class:`datacube.storage._rio.MultiBandDatasetDataSource`) `destination` is a 3D
+    (band, y, x) array and all bands are read, warped and fused together.
+
     :param datasources: Data sources to open and read from
     :param destination: ndarray of appropriate size to read data into
     :param dst_gbox: GeoBox defining destination region
@@ -56,7 +60,8 @@ def reproject_and_fuse(datasources: List[DataSource],
     """
     # pylint: disable=too-many-locals
     from ._read import read_time_slice
-    assert len(destination.shape) == 2
+    assert len(destination.shape) in (2, 3)
+    assert destination.shape[-2:] == dst_gbox.shape
 
     def copyto_fuser(dest: np.ndarray, src: np.ndarray) -> None:
         _default_fuser(dest, src, dst_nodata)
@@ -84,6 +89,7 @@ def reproject_and_fuse(datasources: List[DataSource],
                     roi = read_time_slice(rdr, buffer_, dst_gbox, resampling, dst_nodata)
 
                 if not roi_is_empty(roi):
+                    roi = (..., *roi)
                     fuse_func(destination[roi], buffer_[roi])
                     buffer_[roi] = dst_nodata  # clean up for next read
 
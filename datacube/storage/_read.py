@@ -14,10 +14,9 @@ from ..utils.geometry import (
     GeoBox,
     w_,
     warp_affine,
-    rio_reproject,
     compute_reproject_roi)
 
-from ..utils.geometry._warp import is_resampling_nn, Resampling, Nodata
+from ..utils.geometry._warp import is_resampling_nn, reproject_array, Resampling, Nodata
 from ..utils.geometry import gbox as gbx
 
 
@@ -112,9 +111,12 @@ def read_time_slice(rdr,
                     dst_nodata: Nodata) -> Tuple[slice, slice]:
     """ From opened reader object read into `dst`
 
+    ``dst`` can be a 3D (band, y, x) array when reader returns several bands
+    at once, all bands are then read and warped in one go.
+
     :returns: affected destination region
     """
-    assert dst.shape == dst_gbox.shape
+    assert dst.shape[-2:] == dst_gbox.shape
     src_gbox = rdr_geobox(rdr)
 
     rr = compute_reproject_roi(src_gbox, dst_gbox)
@@ -140,13 +142,13 @@ def read_time_slice(rdr,
         A = rr.transform.linear
         sx, sy = A.a, A.e
 
-        dst = dst[rr.roi_dst]
-        pix = rdr.read(*norm_read_args(rr.roi_src, dst.shape))
+        dst = dst[(..., *rr.roi_dst)]
+        pix = rdr.read(*norm_read_args(rr.roi_src, dst.shape[-2:]))
 
         if sx < 0:
-            pix = pix[:, ::-1]
+            pix = pix[..., :, ::-1]
         if sy < 0:
-            pix = pix[::-1, :]
+            pix = pix[..., ::-1, :]
 
         if rdr.nodata is None:
             np.copyto(dst, pix)
@@ -159,7 +161,7 @@ def read_time_slice(rdr,
             rr.roi_dst = roi_pad(rr.roi_dst, 1, dst_gbox.shape)
             rr.roi_src = roi_pad(rr.roi_src, 1, src_gbox.shape)
 
-        dst = dst[rr.roi_dst]
+        dst = dst[(..., *rr.roi_dst)]
         dst_gbox = dst_gbox[rr.roi_dst]
         src_gbox = src_gbox[rr.roi_src]
         if scale > 1:
@@ -172,8 +174,8 @@ def read_time_slice(rdr,
             warp_affine(pix, dst, A, resampling,
                         src_nodata=rdr.nodata, dst_nodata=dst_nodata)
         else:
-            rio_reproject(pix, dst, src_gbox, dst_gbox, resampling,
-                          src_nodata=rdr.nodata, dst_nodata=dst_nodata)
+            reproject_array(pix, dst, src_gbox, dst_gbox, resampling,
+                            src_nodata=rdr.nodata, dst_nodata=dst_nodata)
 
     return rr.roi_dst
 
@@ -246,7 +248,7 @@ def read_time_slice_v2(rdr,
             warp_affine(pix, dst, A, resampling,
                         src_nodata=rdr.nodata, dst_nodata=dst_nodata)
         else:
-            rio_reproject(pix, dst, src_gbox, dst_gbox, resampling,
-                          src_nodata=rdr.nodata, dst_nodata=dst_nodata)
+            reproject_array(pix, dst, src_gbox, dst_gbox, resampling,
+                            src_nodata=rdr.nodata, dst_nodata=dst_nodata)
 
     return dst, rr.roi_dst
@@ -11,7 +11,7 @@ import numpy as np
 from affine import Affine
 import rasterio
 from urllib.parse import urlparse
-from typing import Optional, Iterator
+from typing import Optional, Iterator, List, Sequence, Tuple
 
 from datacube.utils import geometry
 from datacube.utils.math import num2numpy
@@ -129,6 +129,68 @@ class OverrideBandDataSource(GeoRasterReader):
             return self.source.ds.read(indexes=self.source.bidx, window=window, out_shape=out_shape)
 
 
+class MultiBandDataSource(GeoRasterReader):
+    """
+    Reader for several bands of the same file, :meth:`read` returns a 3D
+    (band, y, x) array with nodata of every band normalised to that of the
+    first band.
+    """
+
+    def __init__(self,
+                 ds: rasterio.DatasetReader,
+                 bidxs: Sequence[int],
+                 nodata,
+                 crs: geometry.CRS,
+                 transform: Affine,
+                 lock: Optional[RLock] = None):
+        self._ds = ds
+        self._bidxs = list(bidxs)
+        self._dtype = np.dtype(ds.dtypes[self._bidxs[0]-1])
+        self._nodatas = [ds.nodatavals[bidx-1] for bidx in self._bidxs]
+        self._nodata = num2numpy(nodata, self._dtype)
+        self._crs = crs
+        self._transform = transform
+        self._lock = lock
+
+    @property
+    def crs(self) -> geometry.CRS:
+        return self._crs
+
+    @property
+    def transform(self) -> Affine:
+        return self._transform
+
+    @property
+    def nodata(self):
+        return self._nodata
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._dtype
+
+    @property
+    def shape(self) -> RasterShape:
+        return self._ds.shape
+
+    def read(self, window: Optional[RasterWindow] = None,
+             out_shape: Optional[RasterShape] = None) -> Optional[np.ndarray]:
+        """Read all bands in the native format, returning a (band, y, x) array
+        """
+        if out_shape is not None:
+            out_shape = (len(self._bidxs), *out_shape)
+
+        with maybe_lock(self._lock):
+            pix = self._ds.read(indexes=self._bidxs, window=window, out_shape=out_shape)
+
+        pix = pix.astype(self._dtype, copy=False)
+        if self._nodata is not None:
+            for band, nodata in zip(pix, self._nodatas):
+                if nodata is not None and nodata != self._nodata:
+                    band[band == nodata] = self._nodata
+
+        return pix
+
+
 class RasterioDataSource(DataSource):
     """
     Abstract class used by fuse_sources and :func:`read_from_source`
@@ -149,6 +211,34 @@ class RasterioDataSource(DataSource):
     def get_crs(self):
         raise NotImplementedError()
 
+    def _geo_metadata(self, src) -> Tuple[Affine, geometry.CRS, bool]:
+        """ Extract transform and CRS from an opened file, falling back to
+        approximate metadata if missing.
+
+        :returns: (transform, crs, override)
+        """
+        override = False
+
+        transform = src.transform
+        if transform.is_identity:
+            override = True
+            transform = self.get_transform(src.shape)
+
+        try:
+            crs = _rasterio_crs(src)
+        except ValueError:
+            override = True
+            crs = self.get_crs()
+
+        if override:
+            warnings.warn(f"""Broken/missing geospatial data was found in file:
+"{self.filename}"
+Will use approximate metadata for backwards compatibility reasons (#673).
+This behaviour is deprecated. Future versions will raise an error.""",
+                          category=DeprecationWarning)
+
+        return transform, crs, override
+
     @contextmanager
     def open(self) -> Iterator[GeoRasterReader]:
         """Context manager which returns a :class:`BandDataSource`"""
@@ -161,18 +251,7 @@ class RasterioDataSource(DataSource):
         try:
             _LOG.debug("opening %s", self.filename)
             with rasterio.open(self.filename, sharing=False) as src:
-                override = False
-
-                transform = src.transform
-                if transform.is_identity:
-                    override = True
-                    transform = self.get_transform(src.shape)
-
-                try:
-                    crs = _rasterio_crs(src)
-                except ValueError:
-                    override = True
-                    crs = self.get_crs()
+                transform, crs, override = self._geo_metadata(src)
 
                 bandnumber = self.get_bandnumber(src)
                 band = rasterio.band(src, bandnumber)
@@ -184,11 +263,6 @@ class RasterioDataSource(DataSource):
                     lock.release()
 
                 if override:
-                    warnings.warn(f"""Broken/missing geospatial data was found in file:
-"{self.filename}"
-Will use approximate metadata for backwards compatibility reasons (#673).
-This behaviour is deprecated. Future versions will raise an error.""",
-                                  category=DeprecationWarning)
                     yield OverrideBandDataSource(band, nodata=nodata, crs=crs, transform=transform, lock=lock)
                 else:
                     yield BandDataSource(band, nodata=nodata, lock=lock)
@@ -295,3 +369,66 @@ def _url2rasterio(url_str: str, fmt: str, layer: Optional[str]) -> str:
         return str(uri_to_local_path(url_str))
 
     return url_str
+
+
+class MultiBandDatasetDataSource(RasterDatasetDataSource):
+    """
+    Data source for reading several bands of a Data Cube Dataset that are
+    stored in the same file, all bands are read and warped as one stack.
+
+    Only non-HDF formats are supported, bands must share ``uri`` and ``layer``.
+    """
+
+    def __init__(self, bands: List[BandInfo]):
+        assert len(bands) > 0
+        assert not any(_is_hdf(b.format) for b in bands)
+        assert len(set((b.uri, b.layer) for b in bands)) == 1
+
+        super(MultiBandDatasetDataSource, self).__init__(bands[0])
+        self._bands = bands
+
+    def get_bandnumbers(self) -> List[int]:
+        return [1 if b.band is None else b.band for b in self._bands]
+
+    @contextmanager
+    def open(self) -> Iterator[GeoRasterReader]:
+        """Context manager which returns a :class:`MultiBandDataSource`"""
+
+        activate_from_config()  # check if settings changed and apply new
+
+        try:
+            _LOG.debug("opening %s", self.filename)
+            with rasterio.open(self.filename, sharing=False) as src:
+                transform, crs, _ = self._geo_metadata(src)
+                bidxs = self.get_bandnumbers()
+                nodata = src.nodatavals[bidxs[0]-1]
+                if nodata is None:
+                    nodata = self.nodata
+
+                yield MultiBandDataSource(src, bidxs, nodata=nodata, crs=crs, transform=transform)
+
+        except Exception as e:
+            _LOG.error("Error opening source dataset: %s", self.filename)
+            raise e
+
+
+def can_read_together(bands: List[BandInfo]) -> bool:
+    """ Check if bands can be read as one stack with :class:`MultiBandDatasetDataSource`.
+
+    Bands must be stored in the same file and layer, at distinct band indexes,
+    in a non-HDF format handled by the default data source.
+    """
+    from datacube.drivers.readers import choose_datasource
+
+    if len(bands) < 2:
+        return False
+
+    if any(_is_hdf(b.format) or choose_datasource(b) is not RasterDatasetDataSource
+           for b in bands):
+        return False
+
+    if len(set((b.uri, b.layer) for b in bands)) != 1:
+        return False
+
+    bidxs = [1 if b.band is None else b.band for b in bands]
+    return len(set(bidxs)) == len(bidxs)
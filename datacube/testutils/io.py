@@ -6,7 +6,7 @@ from ..storage import reproject_and_fuse, BandInfo
 from ..storage._rio import RasterioDataSource, RasterDatasetDataSource
 from ..utils.geometry._warp import resampling_s2rio
 from ..storage._read import rdr_geobox
-from ..utils.geometry import GeoBox
+from ..utils.geometry import GeoBox, geobox_union_conservative
 from ..utils.geometry import gbox as gbx
 from ..index.eo3 import is_doc_eo3, _norm_grid
 from types import SimpleNamespace
@@ -55,22 +55,25 @@ def get_raster_info(ds: Dataset, measurements=None):
             for n in measurements}
 
 
-def eo3_geobox(ds: Dataset, band: str) -> GeoBox:
+def _eo3_grid(ds: Dataset, band: str):
     mm = ds.measurements.get(band, None)
     if mm is None:
         raise ValueError(f"No such band: {band}")
 
-    crs = ds.crs
     doc_path = ('grids', mm.get('grid', 'default'))
 
     grid = toolz.get_in(doc_path, ds.metadata_doc)
-    if crs is None or grid is None:
+    if ds.crs is None or grid is None:
         raise ValueError('Not a valid EO3 dataset')
 
-    grid = _norm_grid(grid)
+    return _norm_grid(grid)
+
+
+def eo3_geobox(ds: Dataset, band: str) -> GeoBox:
+    grid = _eo3_grid(ds, band)
     h, w = grid.shape
 
-    return GeoBox(w, h, grid.transform, crs)
+    return GeoBox(w, h, grid.transform, ds.crs)
 
 
 def native_geobox(ds, measurements=None, basis=None):
@@ -114,6 +117,55 @@ def native_geobox(ds, measurements=None, basis=None):
     return geobox
 
 
+def _native_grid_key(ds, measurements=None, basis=None):
+    """Hashable key identifying the native pixel grid of a dataset (see :py:func:`native_geobox`),
+    computed from metadata alone. ``None`` when the grid can only be found by reading files.
+
+    For EO3 datasets the key holds the CRS, shape and transform of every band considered, so
+    datasets with the same key have the same native GeoBox. Fails like :py:func:`native_geobox`
+    for bands or grids missing from the dataset.
+    """
+    gs = ds.type.grid_spec
+    if gs is not None:
+        return ('tile', ds.type.name, ds.bounds)
+
+    if not is_doc_eo3(ds.metadata_doc):
+        return None
+
+    if basis is not None:
+        bands = [basis]
+    else:
+        bands = list(ds.type.measurements) if measurements is None else list(measurements)
+
+    grids = [_eo3_grid(ds, band) for band in bands]
+    return ('eo3', ds.crs, tuple((tuple(grid.shape), grid.transform) for grid in grids))
+
+
+def native_geobox_union(datasets, measurements=None, basis=None):
+    """Union of the native GeoBoxes of a number of datasets
+
+    Native GeoBox is only computed once for datasets that share the same CRS, shape and
+    transform of their bands according to their metadata, so this is cheap for many datasets
+    on a few grids. Metadata of every dataset is still checked.
+
+    :param datasets: Iterable of Datasets, duplicates are allowed
+    :param measurements: List of band names to consider
+    :param basis: Name of the band to use for computing reference frame
+
+    :return: GeoBox covering all datasets, fails if their grids are not compatible
+    """
+    geoboxes = {}
+    for ds in datasets:
+        key = _native_grid_key(ds, measurements, basis)
+        if key is None:
+            key = ('dataset', ds.id)
+        if key not in geoboxes:
+            geoboxes[key] = native_geobox(ds, measurements, basis)
+
+    # GeoBox is hashable, keep only distinct grids (in order)
+    return geobox_union_conservative(list(dict.fromkeys(geoboxes.values())))
+
+
 def native_load(ds, measurements=None, basis=None, **kw):
     """Load single dataset in native resolution.
 
@@ -215,11 +215,12 @@ def pass_index(app_name=None, expect_initialised=True):
         def with_index(local_config: config.LocalConfig,
                        *args,
                        **kwargs):
-            command_path = click.get_current_context().command_path
+            ctx = click.get_current_context()
             try:
                 index = index_connect(local_config,
-                                      application_name=app_name or command_path,
-                                      validate_connection=expect_initialised)
+                                      application_name=app_name or ctx.command_path,
+                                      validate_connection=expect_initialised,
+                                      pool_size=ctx.meta.get(_INDEX_POOL_SIZE))
                 _LOG.debug("Connected to datacube index: %s", index)
             except (OperationalError, ProgrammingError) as e:
                 handle_exception('Error Connecting to database: %s', e)
@@ -263,29 +264,63 @@ def parse_endpoint(value):
     return ip, int(port)
 
 
+def _mk_celery_executor(value):
+    """
+    Celery executor from ``HOST:PORT`` optionally followed by comma separated result handling options:
+    ``compress``, ``offload_dir=DIR`` and ``offload_threshold=BYTES``
+    """
+    addr, *options = value.split(',')
+    kwargs = {}
+    for option in options:
+        name, _, arg = option.partition('=')
+        if name == 'compress':
+            kwargs['compress_results'] = True
+        elif name == 'offload_dir' and arg:
+            kwargs['offload_dir'] = arg
+        elif name == 'offload_threshold' and arg:
+            kwargs['offload_threshold'] = int(arg)
+        else:
+            raise ValueError('Unknown celery executor option: {}'.format(option))
+
+    return mk_celery_executor(*parse_endpoint(addr), **kwargs)
+
+
 EXECUTOR_TYPES = {
     'serial': lambda _: get_executor(None, None),
     'multiproc': lambda workers: get_executor(None, int(workers)),
+    'threads': lambda workers: get_executor(None, int(workers), use_threads=True),
     'distributed': lambda addr: get_executor(parse_endpoint(addr), True),
-    'celery': lambda addr: mk_celery_executor(*parse_endpoint(addr))
+    'celery': _mk_celery_executor
 }
 
 EXECUTOR_TYPES['dask'] = EXECUTOR_TYPES['distributed']  # Add alias "dask" for distributed
 
 
+# Key of the click context meta data holding the size of the index connection pool to create
+_INDEX_POOL_SIZE = 'datacube.index_pool_size'
+
+
 def _setup_executor(ctx, param, value):
     try:
-        return EXECUTOR_TYPES[value[0]](value[1])
+        executor = EXECUTOR_TYPES[value[0]](value[1])
     except ValueError:
         ctx.fail("Failed to create '%s' executor with '%s'" % value)
 
+    if value[0] == 'threads':
+        # worker threads share the index of the app, keep a connection open for each of them
+        ctx.meta[_INDEX_POOL_SIZE] = int(value[1]) + 1
+
+    return executor
+
 
 executor_cli_options = click.option('--executor',  # type: ignore
                                     type=(click.Choice(list(EXECUTOR_TYPES)), str),
                                     default=('serial', None),
                                     help="Run parallelized, either locally or distributed. eg:\n"
                                          "--executor multiproc 4 (OR)\n"
-                                         "--executor distributed 10.0.0.8:8888",
+                                         "--executor threads 16 (OR)\n"
+                                         "--executor distributed 10.0.0.8:8888 (OR)\n"
+                                         "--executor celery 10.0.0.8:6379,compress,offload_dir=/shared/tmp",
                                     callback=_setup_executor)
 
 
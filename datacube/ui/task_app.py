@@ -50,18 +50,30 @@ def unpickle_stream(filename):
 def save_tasks(config, tasks, taskfile):
     """Saves the config
 
+    Tasks are streamed to the file as they are generated, the file only appears under its
+    name once all of them are saved.
+
     :param config: dict of configuration options common to all tasks
     :param tasks:
     :param str taskfile: Name of output file
     :return: Number of tasks saved to the file
     """
-    i = pickle_stream(itertools.chain([config], tasks), taskfile)
+    start_time = time.monotonic()
+    partial_file = '{}.partial'.format(taskfile)
+    try:
+        i = pickle_stream(itertools.chain([config], tasks), partial_file)
+    except BaseException:
+        os.remove(partial_file)
+        raise
+
     if i <= 1:
         # Only saved the config, no tasks!
-        os.remove(taskfile)
+        os.remove(partial_file)
         return 0
-    else:
-        _LOG.info('Saved config and %d tasks to %s', i - 1, taskfile)
+
+    os.replace(partial_file, taskfile)
+    elapsed = max(time.monotonic() - start_time, 1e-6)
+    _LOG.info('Saved config and %d tasks to %s (%.2f tasks/s)', i - 1, taskfile, (i - 1) / elapsed)
     return i - 1
 
 
@@ -71,6 +83,52 @@ def load_tasks(taskfile):
     return config, stream
 
 
+class TaskJournal(object):
+    """
+    Append-only log of the ids of completed tasks, so that an interrupted run can be resumed
+    without repeating them (see :func:`run_tasks`).
+
+    Ids are compared as strings, one per line. A line only counts once it is complete, so
+    a task that was being recorded during a crash runs again.
+    """
+
+    def __init__(self, filename):
+        self.filename = str(filename)
+        self.completed = set()
+
+        with open(self.filename, 'a+b') as stream:
+            stream.seek(0)
+            data = stream.read()
+            end = data.rfind(b'\n') + 1
+            stream.truncate(end)
+
+        self.completed.update(data[:end].decode('utf-8').splitlines())
+        self._stream = open(self.filename, 'a', encoding='utf-8')
+
+    def __contains__(self, task_id):
+        return str(task_id) in self.completed
+
+    def __len__(self):
+        return len(self.completed)
+
+    def record(self, task_id):
+        key = str(task_id)
+        if '\n' in key:
+            raise ValueError('Task id {!r} spans more than one line'.format(key))
+        self._stream.write(key + '\n')
+        self._stream.flush()
+        self.completed.add(key)
+
+    def close(self):
+        self._stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
 # This is a function, so it's valid to be lowercase.
 #: pylint: disable=invalid-name
 app_config_option = click.option('--app-config', help='App configuration file',
@@ -82,6 +140,10 @@ load_tasks_option = click.option('--load-tasks', 'input_tasks_file', help='Load
 save_tasks_option = click.option('--save-tasks', 'output_tasks_file', help='Save tasks to the specified file',
                                  type=click.Path(exists=False))
 #: pylint: disable=invalid-name
+journal_option = click.option('--journal', 'journal_file',
+                              help='Record completed tasks in the specified file, and skip tasks already recorded in it',
+                              type=click.Path(dir_okay=False))
+#: pylint: disable=invalid-name
 queue_size_option = click.option('--queue-size', help='Number of tasks to queue at the start',
                                  type=click.IntRange(1, 100000), default=3200)
 
@@ -90,6 +152,7 @@ task_app_options = dc_ui.compose(
     app_config_option,
     load_tasks_option,
     save_tasks_option,
+    journal_option,
 
     dc_ui.config_option,
     dc_ui.verbose_option,
@@ -181,21 +244,31 @@ year_option = click.option('--year', 'time', help='Limit the process to a partic
                            callback=validate_year)
 
 
-def task_app(make_config, make_tasks):
+def task_app(make_config, make_tasks, task_id=None):
     """
     Create a `Task App` from a function
 
     Decorates a function
+    With ``--journal``, the function is also passed a :class:`TaskJournal` as ``journal``, to hand
+    on to :func:`run_tasks`. Tasks made from an app config are only identified reliably by the app
+    itself, so ``--journal`` needs ``--load-tasks`` unless the app gives a `task_id`.
+
     :param make_config: callable(index, config, **query)
     :param make_tasks: callable(index, config, **kwargs)
+    :param task_id: callable(task), a stable id for tasks of the app, as passed to :func:`run_tasks`
     :return:
     """
     def decorate(app_func):
-        def with_app_args(index, app_config=None, input_tasks_file=None, output_tasks_file=None, *args, **kwargs):
+        def with_app_args(index, app_config=None, input_tasks_file=None, output_tasks_file=None, journal_file=None,
+                          *args, **kwargs):
             if (app_config is None) == (input_tasks_file is None):
                 click.echo('Must specify exactly one of --app-config, --load-tasks')
                 click.get_current_context().exit(1)
 
+            if journal_file and input_tasks_file is None and task_id is None:
+                click.echo('--journal requires --load-tasks, this app does not identify its tasks')
+                click.get_current_context().exit(1)
+
             if app_config is not None:
                 config, tasks = load_config(index, app_config, make_config, make_tasks, *args, **kwargs)
 
@@ -206,6 +279,10 @@ def task_app(make_config, make_tasks):
                 num_tasks_saved = save_tasks(config, tasks, output_tasks_file)
                 return num_tasks_saved != 0
 
+            if journal_file:
+                with TaskJournal(journal_file) as journal:
+                    return app_func(index, config, tasks, *args, journal=journal, **kwargs)
+
             return app_func(index, config, tasks, *args, **kwargs)
 
         return functools.update_wrapper(with_app_args, app_func)
@@ -259,7 +336,7 @@ def wrap_task(f, *args, **kwargs):
     return functools.partial(_wrap_impl, f, args, kwargs)
 
 
-def run_tasks(tasks, executor, run_task, process_result=None, queue_size=50):
+def run_tasks(tasks, executor, run_task, process_result=None, queue_size=50, journal=None, task_id=None):
     """
     :param tasks: iterable of tasks. Usually a generator to create them as required.
     :param executor: a datacube executor, similar to `distributed.Client` or `concurrent.futures`
@@ -268,38 +345,66 @@ def run_tasks(tasks, executor, run_task, process_result=None, queue_size=50):
                            takes a single argument, the return value from `run_task(task)`
     :param queue_size: How large the queue of tasks should be. Will depend on how fast tasks are
                        processed, and how much memory is available to buffer them.
+    :param TaskJournal journal: Tasks recorded in it are skipped, tasks that complete successfully
+                                are recorded in it
+    :param task_id: a function returning the id of a task in the `journal`. Defaults to the position of
+                    the task in `tasks`, which is only stable for tasks loaded from a task file.
     """
     click.echo('Starting processing...')
     process_result = process_result or do_nothing
-    results = []
-    task_queue = itertools.islice(tasks, queue_size)
-    for task in task_queue:
+    skipped = 0
+
+    def tasks_to_run():
+        nonlocal skipped
+        for position, task in enumerate(tasks):
+            key = position if task_id is None else task_id(task)
+            if journal is not None and key in journal:
+                skipped += 1
+                continue
+            yield key, task
+
+    task_keys = {}
+
+    def submit(key, task):
         _LOG.info('Running task: %s', task.get('tile_index', str(task)))
-        results.append(executor.submit(run_task, task=task))
+        future = executor.submit(run_task, task=task)
+        task_keys[id(future)] = key
+        return future
+
+    todo = tasks_to_run()
+    results = [submit(key, task) for key, task in itertools.islice(todo, queue_size)]
 
     click.echo('Task queue filled, waiting for first result...')
 
     successful = failed = 0
+    start_time = time.monotonic()
     while results:
         result, results = executor.next_completed(results, None)
+        key = task_keys.pop(id(result))
 
         # submit a new _task to replace the one we just finished
-        task = next(tasks, None)
-        if task:
-            _LOG.info('Running task: %s', task.get('tile_index', str(task)))
-            results.append(executor.submit(run_task, task=task))
+        for next_key, task in itertools.islice(todo, 1):
+            results.append(submit(next_key, task))
 
         # Process the result
         try:
             actual_result = executor.result(result)
             process_result(actual_result)
-            successful += 1
         except Exception as err:  # pylint: disable=broad-except
             _LOG.exception('Task failed: %s', err)
             failed += 1
-            continue
+        else:
+            successful += 1
+            if journal is not None:
+                journal.record(key)
         finally:
             # Release the _task to free memory so there is no leak in executor/scheduler/worker process
             executor.release(result)
 
-    click.echo('%d successful, %d failed' % (successful, failed))
+        elapsed = max(time.monotonic() - start_time, 1e-6)
+        _LOG.info('Task status (successful: %d, failed: %d, skipped: %d, %.2f tasks/s)',
+                  successful, failed, skipped, successful / elapsed)
+
+    elapsed = max(time.monotonic() - start_time, 1e-6)
+    click.echo('%d successful, %d failed, %d skipped (%.2f tasks/s)' % (successful, failed, skipped,
+                                                                        successful / elapsed))
@@ -1,17 +1,27 @@
+import itertools
+import math
+import tempfile
 import warnings
+from xml.sax.saxutils import escape as xml_escape
 import rasterio
+import rasterio.dtypes
 from rasterio.shutil import copy as rio_copy
+from rasterio.windows import Window
 import numpy as np
 import xarray as xr
 import dask
+from affine import Affine
 from dask.delayed import Delayed
 from pathlib import Path
-from typing import Union, Optional, List, Any
+from typing import Union, Optional, List, Any, Iterable, Iterator, Tuple
 
 from .io import check_write_path
+from .math import valid_mask
 from .geometry import GeoBox
 from .geometry.tools import align_up
 
+Roi = Tuple[slice, slice]  # pylint: disable=invalid-name
+
 __all__ = ("write_cog", "to_cog")
 
 
@@ -21,6 +31,71 @@ def _adjust_blocksize(block, dim):
     return align_up(block, 16)
 
 
+def _cog_rio_opts(geobox: GeoBox,
+                  nbands: int,
+                  dtype: np.dtype,
+                  blocksize: int,
+                  nodata: Optional[float] = None,
+                  compress: str = "DEFLATE",
+                  level: Optional[int] = None,
+                  num_threads: Optional[Union[int, str]] = None,
+                  **extra_rio_opts) -> dict:
+    """ Creation options for the final COG.
+
+    :param compress: DEFLATE|ZSTD|LZW|LERC|LERC_DEFLATE|LERC_ZSTD or any other GDAL GTiff codec
+    :param level: Compression level for DEFLATE (``zlevel``) or ZSTD (``zstd_level``) codecs
+    :param num_threads: Number of threads GDAL uses to compress tiles, ``"all"`` to use all cores
+    """
+    h, w = geobox.shape
+    compress = compress.upper()
+    rio_opts = dict(
+        width=w,
+        height=h,
+        count=nbands,
+        dtype=dtype.name,
+        crs=str(geobox.crs),
+        transform=geobox.transform,
+        tiled=True,
+        blockxsize=_adjust_blocksize(blocksize, w),
+        blockysize=_adjust_blocksize(blocksize, h),
+        compress=compress,
+    )
+
+    if compress in ("DEFLATE", "ZSTD", "LZW"):
+        rio_opts.update(predictor=3 if dtype.kind == "f" else 2)
+
+    if compress.endswith("DEFLATE"):
+        rio_opts.update(zlevel=6 if level is None else level)
+    elif compress.endswith("ZSTD"):
+        rio_opts.update(zstd_level=9 if level is None else level)
+
+    if num_threads is not None:
+        rio_opts.update(num_threads="ALL_CPUS" if num_threads == "all" else str(num_threads))
+
+    if nodata is not None:
+        rio_opts.update(nodata=nodata)
+
+    rio_opts.update(extra_rio_opts)
+    return rio_opts
+
+
+def _tmp_rio_opts(rio_opts: dict) -> dict:
+    """ Options for uncompressed temporary image: copy re-compresses anyway.
+    """
+    return {k: v for k, v in rio_opts.items()
+            if k not in ("compress", "predictor", "zlevel", "zstd_level", "max_z_error", "num_threads")}
+
+
+def _gdal_env(ovr_blocksize: int, rio_opts: dict) -> rasterio.Env:
+    """ GDAL settings for writing COG, overviews use the same number of threads as compression.
+    """
+    num_threads = rio_opts.get("num_threads", None)
+    if num_threads is None:
+        return rasterio.Env(GDAL_TIFF_OVR_BLOCKSIZE=ovr_blocksize)
+    return rasterio.Env(GDAL_TIFF_OVR_BLOCKSIZE=ovr_blocksize,
+                        GDAL_NUM_THREADS=num_threads)
+
+
 def _write_cog(pix: np.ndarray,
                geobox: GeoBox,
                fname: Union[Path, str],
@@ -42,7 +117,8 @@ def _write_cog(pix: np.ndarray,
     :param overview_resampling: Use this resampling when computing overviews
     :param overview_levels: List of shrink factors to compute overiews for: [2,4,8,16,32]
                             to disable overviews supply empty list ``[]``
-    :param extra_rio_opts: Any other option is passed to ``rasterio.open``
+    :param extra_rio_opts: Any other option is passed to ``rasterio.open``, see
+                           :py:func:`_cog_rio_opts` for ``compress``, ``level`` and ``num_threads``
 
     When fname=":mem:" write COG to memory rather than to a file and return it
     as memoryview object.
@@ -95,25 +171,7 @@ def _write_cog(pix: np.ndarray,
     if (blocksize % 16) != 0:
         warnings.warn(f"Block size must be a multiple of 16, will be adjusted")
 
-    rio_opts = dict(
-        width=w,
-        height=h,
-        count=nbands,
-        dtype=pix.dtype.name,
-        crs=str(geobox.crs),
-        transform=geobox.transform,
-        tiled=True,
-        blockxsize=_adjust_blocksize(blocksize, w),
-        blockysize=_adjust_blocksize(blocksize, h),
-        zlevel=6,
-        predictor=3 if pix.dtype.kind == "f" else 2,
-        compress="DEFLATE",
-    )
-
-    if nodata is not None:
-        rio_opts.update(nodata=nodata)
-
-    rio_opts.update(extra_rio_opts)
+    rio_opts = _cog_rio_opts(geobox, nbands, pix.dtype, blocksize, nodata, **extra_rio_opts)
 
     # Deal efficiently with "no overviews needed case"
     if len(overview_levels) == 0:
@@ -128,12 +186,9 @@ def _write_cog(pix: np.ndarray,
             return path
 
     # copy re-compresses anyway so skip compression for temp image
-    tmp_opts = rio_opts.copy()
-    tmp_opts.pop("compress")
-    tmp_opts.pop("predictor")
-    tmp_opts.pop("zlevel")
+    tmp_opts = _tmp_rio_opts(rio_opts)
 
-    with rasterio.Env(GDAL_TIFF_OVR_BLOCKSIZE=ovr_blocksize):
+    with _gdal_env(ovr_blocksize, rio_opts):
         with rasterio.MemoryFile() as mem:
             with mem.open(driver="GTiff", **tmp_opts) as tmp:
                 tmp.write(pix, band)
@@ -157,6 +212,261 @@ def _write_cog(pix: np.ndarray,
     return path
 
 
+def _decimate(pix: np.ndarray, factor: int, resampling: str, nodata: Optional[float]) -> np.ndarray:
+    """ Shrink (band, y, x) block by an integer factor.
+
+    ``nearest`` picks top-left pixel of every ``factor x factor`` window,
+    ``average`` computes mean of valid pixels in the window.
+    """
+    if resampling == "nearest":
+        return pix[:, ::factor, ::factor]
+
+    nb, h, w = pix.shape
+    H, W = (int(math.ceil(n/factor)) for n in (h, w))
+    pad = ((0, 0), (0, H*factor - h), (0, W*factor - w))
+
+    valid = np.pad(valid_mask(pix, nodata), pad)
+    data = np.pad(pix.astype('float64'), pad)
+    data[~valid] = 0
+
+    total = data.reshape(nb, H, factor, W, factor).sum(axis=(2, 4))
+    count = valid.reshape(nb, H, factor, W, factor).sum(axis=(2, 4))
+
+    out = total/np.maximum(count, 1)
+    if pix.dtype.kind in "iu":
+        out = np.rint(out)
+    out[count == 0] = np.nan if nodata is None else nodata
+    return out.astype(pix.dtype)
+
+
+def _window_bounds(chunks: Tuple[int, ...], block: int) -> List[int]:
+    """ Boundaries of windows along one axis of a Dask array with ``chunks``, to be
+    computed at once and written ``block`` pixels at a time.
+
+    Windows are made of whole Dask chunks and end on a multiple of ``block`` (or
+    the end of the axis) where such a boundary is within reach, so that no chunk
+    is computed twice. Otherwise a window ends on the first multiple of ``block``
+    past a chunk boundary, and the chunk across it is computed by both windows.
+    """
+    ends = np.cumsum(chunks).tolist()
+    total = ends[-1]
+    limit = 2*max(block, max(chunks))
+
+    bounds = [0]
+    while bounds[-1] < total:
+        start = bounds[-1]
+        ahead = [end for end in ends if end > start]
+        aligned = [end for end in ahead
+                   if (end % block == 0 or end == total) and end - start <= limit]
+        bounds.append(aligned[0] if aligned else min(align_up(ahead[0], block), total))
+    return bounds
+
+
+def _iter_blocks(pix: Any, block_shape: Tuple[int, int]) -> Iterator[Tuple[Roi, np.ndarray]]:
+    """ Iterate over (band, y, x) array one spatial block at a time.
+
+    Dask arrays are computed one window of blocks at a time, windows are made of
+    whole Dask chunks where possible (see :py:func:`_window_bounds`), so that
+    chunks spanning several blocks are not computed again for every block.
+    """
+    _, h, w = pix.shape
+    by, bx = block_shape
+
+    if dask.is_dask_collection(pix):
+        ys, xs = (_window_bounds(chunks, n) for chunks, n in zip(pix.chunks[1:], block_shape))
+        windows = itertools.product(zip(ys[:-1], ys[1:]), zip(xs[:-1], xs[1:]))
+    else:
+        windows = iter([((0, h), (0, w))])
+
+    for (y0, y1), (x0, x1) in windows:
+        window = pix[:, y0:y1, x0:x1]
+        if dask.is_dask_collection(window):
+            window = window.compute()
+
+        for y in range(y0, y1, by):
+            for x in range(x0, x1, bx):
+                roi = np.s_[y:min(y + by, y1), x:min(x + bx, x1)]
+                yield roi, np.asarray(window[:, roi[0].start - y0:roi[0].stop - y0,
+                                             roi[1].start - x0:roi[1].stop - x0])
+
+
+def _vrt_with_overviews(geobox: GeoBox,
+                        nbands: int,
+                        dtype: np.dtype,
+                        nodata: Optional[float],
+                        base: str,
+                        overviews: List[str]) -> str:
+    """ Generate VRT document exposing ``base`` image with ``overviews`` as its overview levels.
+    """
+    h, w = geobox.shape
+    gdal_dtype = rasterio.dtypes._gdal_typename(dtype.name)  # pylint: disable=protected-access
+    A = geobox.transform
+    srs = geobox.crs.to_wkt() if geobox.crs is not None else ''
+
+    def band_xml(b: int) -> str:
+        ovrs = "".join('<Overview><SourceFilename relativeToVRT="1">{}</SourceFilename>'
+                       '<SourceBand>{}</SourceBand></Overview>'.format(xml_escape(fname), b)
+                       for fname in overviews)
+        nodata_xml = '' if nodata is None else '<NoDataValue>{!r}</NoDataValue>'.format(nodata)
+
+        return ('<VRTRasterBand dataType="{dt}" band="{b}">{nodata}'
+                '<SimpleSource><SourceFilename relativeToVRT="1">{base}</SourceFilename>'
+                '<SourceBand>{b}</SourceBand></SimpleSource>{ovrs}</VRTRasterBand>').format(
+                    dt=gdal_dtype, b=b, nodata=nodata_xml, base=xml_escape(base), ovrs=ovrs)
+
+    return ('<VRTDataset rasterXSize="{w}" rasterYSize="{h}">'
+            '<SRS>{srs}</SRS>'
+            '<GeoTransform>{A.c!r}, {A.a!r}, {A.b!r}, {A.f!r}, {A.d!r}, {A.e!r}</GeoTransform>'
+            '{bands}</VRTDataset>').format(w=w, h=h, srs=xml_escape(srs), A=A,
+                                           bands="".join(band_xml(b) for b in range(1, nbands + 1)))
+
+
+def _write_cog_blocks(blocks: Iterable[Tuple[Roi, np.ndarray]],
+                      geobox: GeoBox,
+                      fname: Union[Path, str],
+                      dtype: Any,
+                      nbands: int = 1,
+                      nodata: Optional[float] = None,
+                      overwrite: bool = False,
+                      blocksize: Optional[int] = None,
+                      overview_resampling: Optional[str] = None,
+                      overview_levels: Optional[List[int]] = None,
+                      ovr_blocksize: Optional[int] = None,
+                      temp_dir: Optional[Union[Path, str]] = None,
+                      **extra_rio_opts) -> Union[Path, bytes]:
+    """Write COG from a stream of image blocks, never holding the whole image in memory.
+
+    Every block is written into an uncompressed temporary image on disk and
+    decimated into every overview level as it arrives. Once all blocks are
+    written temporary images are assembled into a COG with requested
+    compression settings, GDAL does that copy one tile at a time.
+
+    :param blocks: Iterable of ``(roi, pix)`` tuples, ``pix`` is a (band, y, x) array
+                   covering ``roi=(slice, slice)`` of the image, blocks must cover
+                   the whole image and (apart from the last row/column) be aligned
+                   to the largest overview level.
+    :param geobox: GeoBox of the whole image
+    :param fname: Output file or ":mem:"
+    :param dtype: Pixel type of the image
+    :param nbands: Number of bands in the image
+    :param temp_dir: Where to place temporary images, defaults to output directory
+                     for file output and system temp directory for ":mem:"
+
+    Other parameters are the same as for :py:func:`_write_cog`, only ``nearest``
+    and ``average`` overview resampling is supported.
+
+    NOTE: about resource requirements
+
+    Memory use is bounded by the size of one block plus GDAL block cache, but
+    temporary images need as much disk space as the uncompressed image plus a
+    third of that for overviews.
+    """
+    # pylint: disable=too-many-locals
+    if blocksize is None:
+        blocksize = 512
+    if ovr_blocksize is None:
+        ovr_blocksize = blocksize
+    if overview_levels is None:
+        overview_levels = [2 ** i for i in range(1, 6)]
+    if overview_resampling is None:
+        overview_resampling = "nearest"
+    if overview_resampling not in ("nearest", "average"):
+        raise ValueError("Streaming COG writer only supports nearest|average overview resampling")
+
+    dtype = np.dtype(dtype)
+    h, w = geobox.shape
+
+    if fname != ":mem:":
+        path = check_write_path(fname, overwrite)
+        if temp_dir is None:
+            temp_dir = path.parent
+
+    rio_opts = _cog_rio_opts(geobox, nbands, dtype, blocksize, nodata, **extra_rio_opts)
+    tmp_opts = _tmp_rio_opts(rio_opts)
+
+    with tempfile.TemporaryDirectory(prefix="cog-", dir=None if temp_dir is None else str(temp_dir)) as tmp:
+        tmp = Path(tmp)
+        fnames = ["level-{}.tif".format(lvl) for lvl in [1] + overview_levels]
+        outputs = []
+        for lvl, fn in zip([1] + overview_levels, fnames):
+            o_h, o_w = (int(math.ceil(n/lvl)) for n in (h, w))
+            opts = dict(tmp_opts,
+                        width=o_w,
+                        height=o_h,
+                        transform=geobox.transform*Affine.scale(lvl, lvl),
+                        blockxsize=_adjust_blocksize(ovr_blocksize if lvl > 1 else blocksize, o_w),
+                        blockysize=_adjust_blocksize(ovr_blocksize if lvl > 1 else blocksize, o_h))
+            outputs.append(rasterio.open(str(tmp/fn), "w", driver="GTiff", **opts))
+
+        try:
+            for roi, pix in blocks:
+                if pix.ndim == 2:
+                    pix = pix[np.newaxis]
+                ys, xs = roi
+                for lvl, dst in zip([1] + overview_levels, outputs):
+                    if ys.start % lvl != 0 or xs.start % lvl != 0:
+                        raise ValueError("Block at {} is not aligned to overview level {}".format(roi, lvl))
+                    o_pix = pix if lvl == 1 else _decimate(pix, lvl, overview_resampling, nodata)
+                    dst.write(o_pix, window=Window(xs.start//lvl, ys.start//lvl,
+                                                   o_pix.shape[2], o_pix.shape[1]))
+        finally:
+            for dst in outputs:
+                dst.close()
+
+        (tmp/"cog.vrt").write_text(_vrt_with_overviews(geobox, nbands, dtype, nodata, fnames[0], fnames[1:]))
+
+        with _gdal_env(ovr_blocksize, rio_opts):
+            with rasterio.open(str(tmp/"cog.vrt")) as src:
+                if fname == ":mem:":
+                    with rasterio.MemoryFile() as mem:
+                        rio_copy(src, mem.name, driver="GTiff",
+                                 copy_src_overviews=len(overview_levels) > 0, **rio_opts)
+                        return bytes(mem.getbuffer())
+
+                rio_copy(src, path, driver="GTiff",
+                         copy_src_overviews=len(overview_levels) > 0, **rio_opts)
+
+    return path
+
+
+def _write_cog_streaming(pix: Any,
+                         geobox: GeoBox,
+                         fname: Union[Path, str],
+                         nodata: Optional[float] = None,
+                         blocksize: Optional[int] = None,
+                         overview_levels: Optional[List[int]] = None,
+                         stream_block: int = 2048,
+                         **kw) -> Union[Path, bytes]:
+    """ Write numpy or Dask array to COG with :py:func:`_write_cog_blocks`,
+    processing ``stream_block x stream_block`` pixels at a time.
+    """
+    if pix.ndim == 2:
+        pix = pix[np.newaxis]
+    elif pix.ndim == 3:
+        if pix.shape[:2] == geobox.shape:
+            pix = pix.transpose([2, 0, 1])
+        elif pix.shape[-2:] != geobox.shape:
+            raise ValueError('GeoBox shape does not match image shape')
+    else:
+        raise ValueError("Need 2d or 3d array on input")
+
+    if overview_levels is None:
+        overview_levels = [2 ** i for i in range(1, 6)]
+
+    # blocks must align to every overview level and preferably to tiff tiles
+    align = int(np.lcm.reduce([1, blocksize or 512, *overview_levels]))
+    block = align_up(stream_block, align)
+
+    return _write_cog_blocks(_iter_blocks(pix, (block, block)),
+                             geobox, fname,
+                             dtype=pix.dtype,
+                             nbands=pix.shape[0],
+                             nodata=nodata,
+                             blocksize=blocksize,
+                             overview_levels=overview_levels,
+                             **kw)
+
+
 _delayed_write_cog_to_mem = dask.delayed(  # pylint: disable=invalid-name
     _write_cog,
     name="compress-cog", pure=True, nout=1
@@ -174,6 +484,10 @@ def write_cog(geo_im: xr.DataArray,
               ovr_blocksize: Optional[int] = None,
               overview_resampling: Optional[str] = None,
               overview_levels: Optional[List[int]] = None,
+              streaming: bool = False,
+              compress: str = "DEFLATE",
+              level: Optional[int] = None,
+              num_threads: Optional[Union[int, str]] = None,
               **extra_rio_opts) -> Union[Path, bytes, Delayed]:
     """
     Save ``xarray.DataArray`` to a file in Cloud Optimized GeoTiff format.
@@ -202,11 +516,17 @@ def write_cog(geo_im: xr.DataArray,
     :param overview_resampling: Use this resampling when computing overviews
     :param overview_levels: List of shrink factors to compute overiews for: [2,4,8,16,32],
                             to disable overviews supply empty list ``[]``
+    :param streaming: Write image one block at a time with bounded memory, see note below
+    :param compress: Compression codec: ``DEFLATE`` (default), ``ZSTD``, ``LERC``, ``LERC_DEFLATE``,
+                     ``LERC_ZSTD`` or any other GDAL GeoTiff codec. Use ``max_z_error=`` to
+                     configure lossy ``LERC*`` codecs.
+    :param level: Compression level for ``DEFLATE`` (1-9, default 6) and ``ZSTD`` (1-22, default 9) codecs
+    :param num_threads: Compress tiles using this many threads, ``"all"`` to use all cores
     :param extra_rio_opts: Any other option is passed to ``rasterio.open``
 
     :returns: Path to which output was written
     :returns: Bytes if ``fname=":mem:"``
-    :returns: ``dask.Delayed`` object if input is a Dask array
+    :returns: ``dask.Delayed`` object if input is a Dask array (unless ``streaming=True``)
 
     .. note ::
 
@@ -220,6 +540,15 @@ def write_cog(geo_im: xr.DataArray,
        pass is the only way to achieve this currently.
 
        This means that this function will use about 1.5 to 2 times memory taken by ``geo_im``.
+
+       With ``streaming=True`` image is instead computed and written one block
+       at a time into temporary files on disk, overviews are computed from
+       those blocks as they arrive (only ``nearest`` and ``average`` resampling
+       is supported). Memory use is then bounded by block size (or by a few Dask
+       chunks when those are larger), but temporary disk space of about 1.3
+       times uncompressed image size is needed. Dask inputs are computed a few
+       whole chunks at a time immediately rather than returning a ``Delayed``
+       object.
     """
     pix = geo_im.data
     geobox = getattr(geo_im, 'geobox', None)
@@ -230,6 +559,21 @@ def write_cog(geo_im: xr.DataArray,
     if geobox is None:
         raise ValueError("Need geo-registered array on input")
 
+    if streaming:
+        return _write_cog_streaming(
+            pix,
+            geobox,
+            fname,
+            nodata=nodata,
+            blocksize=blocksize,
+            ovr_blocksize=ovr_blocksize,
+            overview_resampling=overview_resampling,
+            overview_levels=overview_levels,
+            compress=compress,
+            level=level,
+            num_threads=num_threads,
+            **extra_rio_opts)
+
     if dask.is_dask_collection(pix):
         real_op = _delayed_write_cog_to_mem if fname == ":mem:" else _delayed_write_cog_to_file
     else:
@@ -244,6 +588,9 @@ def write_cog(geo_im: xr.DataArray,
         ovr_blocksize=ovr_blocksize,
         overview_resampling=overview_resampling,
         overview_levels=overview_levels,
+        compress=compress,
+        level=level,
+        num_threads=num_threads,
         **extra_rio_opts)
 
 
@@ -252,6 +599,10 @@ def to_cog(geo_im: xr.DataArray,
            ovr_blocksize: Optional[int] = None,
            overview_resampling: Optional[str] = None,
            overview_levels: Optional[List[int]] = None,
+           streaming: bool = False,
+           compress: str = "DEFLATE",
+           level: Optional[int] = None,
+           num_threads: Optional[Union[int, str]] = None,
            **extra_rio_opts) -> Union[bytes, Delayed]:
     """
     Compress ``xarray.DataArray`` into Cloud Optimized GeoTiff bytes in memory.
@@ -271,6 +622,11 @@ def to_cog(geo_im: xr.DataArray,
     :param ovr_blocksize: Size of internal tiles in overview images (defaults to blocksize)
     :param overview_resampling: Use this resampling when computing overviews
     :param overview_levels: List of shrink factors to compute overiews for: [2,4,8,16,32]
+    :param streaming: Compute and compress image one block at a time with bounded memory,
+                      see :py:meth:`~datacube.utils.cog.write_cog`
+    :param compress: Compression codec, see :py:meth:`~datacube.utils.cog.write_cog`
+    :param level: Compression level for ``DEFLATE`` and ``ZSTD`` codecs
+    :param num_threads: Compress tiles using this many threads, ``"all"`` to use all cores
     :param extra_rio_opts: Any other option is passed to ``rasterio.open``
 
     :returns: In-memory GeoTiff file as bytes
@@ -285,6 +641,10 @@ def to_cog(geo_im: xr.DataArray,
                    ovr_blocksize=ovr_blocksize,
                    overview_resampling=overview_resampling,
                    overview_levels=overview_levels,
+                   streaming=streaming,
+                   compress=compress,
+                   level=level,
+                   num_threads=num_threads,
                    **extra_rio_opts)
 
     assert isinstance(bb, (bytes, Delayed))  # for mypy sake for :mem: output it bytes or delayed bytes
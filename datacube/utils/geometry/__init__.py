@@ -68,6 +68,11 @@ from ._warp import (
     rio_reproject,
 )
 
+from ._reproject import (
+    dask_reproject,
+    xr_reproject,
+)
+
 __all__ = [
     "Coordinate",
     "BoundingBox",
@@ -126,5 +131,7 @@ __all__ = [
     "split_translation",
     "warp_affine",
     "rio_reproject",
+    "dask_reproject",
+    "xr_reproject",
     "w_",
 ]
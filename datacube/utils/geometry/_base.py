@@ -973,16 +973,27 @@ class GeoBox:
     Defines the location and resolution of a rectangular grid of data,
     including it's :py:class:`CRS`.
 
+    GeoBox is immutable and hashable, so it can be used as a cache key.
+
     :param crs: Coordinate Reference System
     :param affine: Affine transformation defining the location of the geobox
     """
 
     def __init__(self, width: int, height: int, affine: Affine, crs: MaybeCRS):
         assert is_affine_st(affine), "Only axis-aligned geoboxes are currently supported"
-        self.width = width
-        self.height = height
-        self.affine = affine
-        self.extent = polygon_from_transform(width, height, affine, crs=crs)
+        _set = super().__setattr__
+        _set('width', width)
+        _set('height', height)
+        _set('affine', affine)
+        _set('extent', polygon_from_transform(width, height, affine, crs=crs))
+        # CRS hash is expensive, equal geoboxes have equal shape and transform anyway
+        _set('_hash', hash((height, width, tuple(affine))))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("GeoBox is immutable, can't set '{}'".format(name))
+
+    def __delattr__(self, name):
+        raise AttributeError("GeoBox is immutable, can't delete '{}'".format(name))
 
     @classmethod
     def from_geopolygon(cls,
@@ -1169,10 +1180,17 @@ class GeoBox:
         if not isinstance(other, GeoBox):
             return False
 
-        return (self.shape == other.shape
+        if self is other:
+            return True
+
+        return (self._hash == other._hash
+                and self.shape == other.shape
                 and self.transform == other.transform
                 and self.crs == other.crs)
 
+    def __hash__(self):
+        return self._hash
+
 
 def bounding_box_in_pixel_domain(geobox: GeoBox, reference: GeoBox) -> BoundingBox:
     """
@@ -0,0 +1,158 @@
+""" Reprojection of xarray and dask arrays
+"""
+from typing import Optional, Tuple, Union
+import uuid
+import numpy as np
+import xarray as xr
+import dask.array as da
+from dask.highlevelgraph import HighLevelGraph
+
+from . import GeoBox
+from .gbox import geobox_tiles
+from .tools import compute_reproject_roi, roi_is_empty
+from ._warp import reproject_array, resampling_s2rio, Nodata
+
+
+def _default_nodata(dtype) -> Union[float, int]:
+    return np.nan if np.dtype(dtype).kind == 'f' else 0
+
+
+def _chunk_bounds(chunks: Tuple[int, ...]) -> np.ndarray:
+    return np.cumsum((0,) + tuple(chunks))
+
+
+def _chunk_range(bounds: np.ndarray, roi: slice) -> Tuple[int, int]:
+    """ Indexes of the chunks [first, last) intersecting ``roi``, given chunk boundaries.
+    """
+    first = int(np.searchsorted(bounds, roi.start, side='right')) - 1
+    last = int(np.searchsorted(bounds, roi.stop, side='left'))
+    return first, last
+
+
+def _reproject_block(blocks, roi, s_gbox: GeoBox, d_gbox: GeoBox,
+                     resampling: str, src_nodata: Nodata, dst_nodata: Nodata) -> np.ndarray:
+    """ Stitch source ``blocks`` (2d list of arrays), crop to ``roi`` and reproject onto ``d_gbox``.
+    """
+    src = np.block(blocks)[(..., *roi)]
+    prefix = src.shape[:-2]
+
+    dst = np.full(prefix + d_gbox.shape, dst_nodata, dtype=src.dtype)
+    reproject_array(src.reshape((-1,) + src.shape[-2:]),
+                    dst.reshape((-1,) + d_gbox.shape),
+                    s_gbox, d_gbox, resampling_s2rio(resampling),
+                    src_nodata=src_nodata, dst_nodata=dst_nodata)
+    return dst
+
+
+def dask_reproject(src: da.Array,
+                   src_geobox: GeoBox,
+                   dst_geobox: GeoBox,
+                   resampling: str = "nearest",
+                   chunks: Optional[Tuple[int, int]] = None,
+                   src_nodata: Nodata = None,
+                   dst_nodata: Nodata = None) -> da.Array:
+    """
+    Reproject dask array to a new geobox.
+
+    Every output chunk only depends on the source chunks it overlaps (after padding),
+    source data is never re-chunked. The last two dimensions of ``src`` are spatial,
+    other dimensions keep their chunking.
+
+    :param src: Dask array, last two dimensions are ``y, x``
+    :param src_geobox: GeoBox of the source array
+    :param dst_geobox: GeoBox of the output
+    :param resampling: Resampling method name, e.g. ``"nearest"``, ``"bilinear"``
+    :param chunks: Spatial chunk shape of the output, defaults to the first chunk of the source
+    :param src_nodata: Nodata value of the source
+    :param dst_nodata: Nodata value of the output, defaults to ``src_nodata``
+    """
+    if chunks is None:
+        chunks = (src.chunks[-2][0], src.chunks[-1][0])
+    if dst_nodata is None:
+        dst_nodata = _default_nodata(src.dtype) if src_nodata is None else src_nodata
+
+    name = "reproject-{}".format(uuid.uuid4().hex)
+    # tile geoboxes are cached by tile shape, which must be hashable
+    tiles = geobox_tiles(dst_geobox, tuple(chunks))
+    ybounds, xbounds = (_chunk_bounds(c) for c in src.chunks[-2:])
+    prefix_chunks = src.chunks[:-2]
+
+    dsk = {}
+    for tile_idx in np.ndindex(tiles.shape):
+        d_gbox = tiles[tile_idx]
+        roi_src = compute_reproject_roi(src_geobox, d_gbox, padding=1).roi_src
+
+        for prefix_idx in np.ndindex(tuple(len(c) for c in prefix_chunks)):
+            key = (name, *prefix_idx, *tile_idx)
+
+            if roi_is_empty(roi_src):
+                shape = tuple(c[i] for c, i in zip(prefix_chunks, prefix_idx)) + d_gbox.shape
+                dsk[key] = (np.full, shape, dst_nodata, src.dtype)
+                continue
+
+            (y0, y1), (x0, x1) = (_chunk_range(ybounds, roi_src[0]),
+                                  _chunk_range(xbounds, roi_src[1]))
+            blocks = [[(src.name, *prefix_idx, iy, ix) for ix in range(x0, x1)]
+                      for iy in range(y0, y1)]
+            roi = (slice(roi_src[0].start - ybounds[y0], roi_src[0].stop - ybounds[y0]),
+                   slice(roi_src[1].start - xbounds[x0], roi_src[1].stop - xbounds[x0]))
+
+            dsk[key] = (_reproject_block, blocks, roi, src_geobox[roi_src], d_gbox,
+                        resampling, src_nodata, dst_nodata)
+
+    ny, nx = tiles.shape
+    dst_chunks = (tuple(tiles.chunk_shape((iy, 0))[0] for iy in range(ny)),
+                  tuple(tiles.chunk_shape((0, ix))[1] for ix in range(nx)))
+
+    graph = HighLevelGraph.from_collections(name, dsk, dependencies=[src])
+    return da.Array(graph, name, chunks=prefix_chunks + dst_chunks, dtype=src.dtype)
+
+
+def xr_reproject(src: xr.DataArray,
+                 geobox: GeoBox,
+                 resampling: str = "nearest",
+                 chunks: Optional[Tuple[int, int]] = None,
+                 dst_nodata: Nodata = None) -> xr.DataArray:
+    """
+    Reproject raster to a new geobox.
+
+    Works for both dask and numpy backed arrays: dask arrays are reprojected lazily with
+    :py:func:`dask_reproject`, other arrays in one go. Non-spatial dimensions and attributes
+    are preserved, source nodata is taken from ``src.attrs['nodata']``.
+
+    :param src: Raster with a ``.geobox``, last two dimensions are spatial
+    :param geobox: GeoBox of the output
+    :param resampling: Resampling method name, e.g. ``"nearest"``, ``"bilinear"``
+    :param chunks: Spatial chunk shape of the output (dask only)
+    :param dst_nodata: Nodata value of the output, defaults to source nodata
+    """
+    src_geobox = src.geobox
+    if src_geobox is None:
+        raise ValueError("Source raster has no geobox")
+
+    src_nodata = src.attrs.get('nodata', None)
+    attrs = dict(src.attrs, crs=geobox.crs)
+
+    if dst_nodata is not None:
+        attrs['nodata'] = dst_nodata
+    else:
+        dst_nodata = _default_nodata(src.dtype) if src_nodata is None else src_nodata
+
+    if isinstance(src.data, da.Array):
+        data = dask_reproject(src.data, src_geobox, geobox,
+                              resampling=resampling, chunks=chunks,
+                              src_nodata=src_nodata, dst_nodata=dst_nodata)
+    else:
+        data = np.full(src.shape[:-2] + geobox.shape, dst_nodata, dtype=src.dtype)
+        pix = src.values
+        reproject_array(pix.reshape((-1,) + pix.shape[-2:]),
+                        data.reshape((-1,) + geobox.shape),
+                        src_geobox, geobox, resampling_s2rio(resampling),
+                        src_nodata=src_nodata, dst_nodata=dst_nodata)
+
+    dims = src.dims[:-2] + geobox.dims
+    coords = {name: coord for name, coord in src.coords.items()
+              if not set(coord.dims) & set(src.dims[-2:])}
+    coords.update(geobox.xr_coords(with_crs=True))
+
+    return xr.DataArray(data, dims=dims, coords=coords, attrs=attrs)
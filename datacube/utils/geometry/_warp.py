@@ -1,13 +1,19 @@
-from typing import Union, Optional
+import threading
+from typing import Union, Optional, Tuple, Any
+import cachetools
 import rasterio.warp
 import rasterio.crs
 import numpy as np
 from affine import Affine
 from . import GeoBox
+from .tools import apply_affine
 
 Resampling = Union[str, int, rasterio.warp.Resampling]  # pylint: disable=invalid-name
 Nodata = Optional[Union[int, float]]  # pylint: disable=invalid-name
 _WRP_CRS = rasterio.crs.CRS.from_epsg(3857)
+_WARP_PLAN_CACHE_BYTES = 256*(1 << 20)
+# Largest interpolation error, in source pixels, of a usable WarpPlan (same as GDAL's approximate transformer)
+_WARP_PLAN_MAX_ERROR = 0.125
 
 
 def resampling_s2rio(name: str) -> rasterio.warp.Resampling:
@@ -30,6 +36,15 @@ def is_resampling_nn(resampling: Resampling) -> bool:
     return resampling == rasterio.warp.Resampling.nearest
 
 
+def _needs_per_band_warp(src: np.ndarray, resampling: Resampling, src_nodata: Nodata) -> bool:
+    """
+    GDAL handles source nodata of a multi-band stack differently from that of a
+    single band when resampling mixes several source pixels, so in that case
+    warp one band at a time to get the same output as a single band warp.
+    """
+    return src.ndim == 3 and src_nodata is not None and not is_resampling_nn(resampling)
+
+
 def warp_affine_rio(src: np.ndarray,
                     dst: np.ndarray,
                     A: Affine,
@@ -40,8 +55,8 @@ def warp_affine_rio(src: np.ndarray,
     """
     Perform Affine warp using rasterio as backend library.
 
-    :param        src: image as ndarray
-    :param        dst: image as ndarray
+    :param        src: image as ndarray, either 2D or 3D (band, y, x)
+    :param        dst: image as ndarray, same number of dimensions as ``src``
     :param          A: Affine transformm, maps from dst_coords to src_coords
     :param resampling: str|rasterio.warp.Resampling resampling strategy
     :param src_nodata: Value representing "no data" in the source image
@@ -51,6 +66,12 @@ def warp_affine_rio(src: np.ndarray,
 
     :returns: dst
     """
+    if _needs_per_band_warp(src, resampling, src_nodata):
+        for s, d in zip(src, dst):
+            warp_affine_rio(s, d, A, resampling,
+                            src_nodata=src_nodata, dst_nodata=dst_nodata, **kwargs)
+        return dst
+
     crs = _WRP_CRS
     src_transform = Affine.identity()
     dst_transform = A
@@ -123,8 +144,8 @@ def rio_reproject(src: np.ndarray,
     """
     Perform reproject from ndarray->ndarray using rasterio as backend library.
 
-    :param        src: image as ndarray
-    :param        dst: image as ndarray
+    :param        src: image as ndarray, either 2D or 3D (band, y, x)
+    :param        dst: image as ndarray, same number of dimensions as ``src``
     :param     s_gbox: GeoBox of source image
     :param     d_gbox: GeoBox of destination image
     :param resampling: str|rasterio.warp.Resampling resampling strategy
@@ -135,6 +156,12 @@ def rio_reproject(src: np.ndarray,
 
     :returns: dst
     """
+    if _needs_per_band_warp(src, resampling, src_nodata):
+        for s, d in zip(src, dst):
+            rio_reproject(s, d, s_gbox, d_gbox, resampling,
+                          src_nodata=src_nodata, dst_nodata=dst_nodata, **kwargs)
+        return dst
+
     if isinstance(resampling, str):
         resampling = resampling_s2rio(resampling)
 
@@ -163,3 +190,225 @@ def rio_reproject(src: np.ndarray,
         np.copyto(dst, _dst, casting='unsafe')
 
     return dst
+
+
+def _lerp_axis(grid: np.ndarray, pts: np.ndarray, n: int, axis: int) -> np.ndarray:
+    """
+    Linearly interpolate ``grid`` sampled at pixel centres ``pts`` along ``axis``
+    onto every pixel centre ``0.5, 1.5, ..., n - 0.5``.
+    """
+    x = np.arange(n) + 0.5
+    i0 = np.clip(np.searchsorted(pts, x, side='right') - 1, 0, len(pts) - 1)
+    i1 = np.minimum(i0 + 1, len(pts) - 1)
+    span = pts[i1] - pts[i0]
+    t = np.where(span > 0, (x - pts[i0])/np.where(span > 0, span, 1), 0)
+
+    if axis == 0:
+        t = t.reshape(-1, 1)
+        return grid[i0, :]*(1 - t) + grid[i1, :]*t
+    return grid[:, i0]*(1 - t) + grid[:, i1]*t
+
+
+class WarpPlan:
+    """
+    Pre-computed mapping from destination pixels to source pixel coordinates.
+
+    Mapping is computed once for a pair of geoboxes and can then be applied to
+    any number of source images on the same grid (bands, time slices). Like GDAL's
+    approximate transformer, only every ``step``-th pixel is projected exactly,
+    the rest are linearly interpolated. The error of the interpolation, measured at
+    the midpoints of the exactly projected points, is kept in ``max_error``.
+
+    :param s_gbox: GeoBox of source image
+    :param d_gbox: GeoBox of destination image
+    :param   step: Spacing in destination pixels between exactly projected points
+    """
+
+    def __init__(self, s_gbox: GeoBox, d_gbox: GeoBox, step: int = 16):
+        h, w = d_gbox.shape
+        xx = np.unique(np.r_[np.arange(0, w, step), w - 1]) + 0.5
+        yy = np.unique(np.r_[np.arange(0, h, step), h - 1]) + 0.5
+
+        x, y = apply_affine(d_gbox.transform, *np.meshgrid(xx, yy))
+        x, y = d_gbox.crs.transformer_to_crs(s_gbox.crs)(x, y)
+        x, y = apply_affine(~s_gbox.transform, x, y)
+
+        self.src_shape = s_gbox.shape
+        self.dst_shape = d_gbox.shape
+        self.max_error = _interpolation_error(s_gbox, d_gbox, xx, yy, x, y)
+        self.xx, self.yy = (_lerp_axis(_lerp_axis(g, yy, h, 0), xx, w, 1).astype('float32')
+                            for g in (x, y))
+
+    @property
+    def nbytes(self) -> int:
+        return self.xx.nbytes + self.yy.nbytes
+
+    @staticmethod
+    def supports(resampling: Resampling) -> bool:
+        """
+        :returns: True if ``resampling`` can be done by :py:meth:`apply`
+        """
+        if isinstance(resampling, str):
+            resampling = resampling_s2rio(resampling)
+        return resampling in (rasterio.warp.Resampling.nearest,
+                              rasterio.warp.Resampling.bilinear)
+
+    def _nearest(self, src, dst, src_nodata, dst_nodata):
+        ny, nx = self.src_shape
+        x, y = np.floor(self.xx), np.floor(self.yy)
+        # checked before casting to int, non-finite and far away coordinates would overflow
+        inside = (x >= 0) & (x < nx) & (y >= 0) & (y < ny)
+        ix, iy = (np.where(inside, a, 0).astype('int32') for a in (x, y))
+        # all bands of a stack are sampled at once
+        pix = src[..., iy, ix]
+        valid = np.broadcast_to(inside, pix.shape)
+        if src_nodata is not None:
+            valid = valid & ~_nodata_mask(pix, src_nodata)
+
+        dst[valid] = pix[valid]
+        if dst_nodata is not None:
+            dst[~valid] = dst_nodata
+
+    def _bilinear(self, src, dst, src_nodata, dst_nodata):
+        ny, nx = self.src_shape
+        x, y = self.xx - 0.5, self.yy - 0.5
+        x0, y0 = np.floor(x), np.floor(y)
+        near = (x0 >= -1) & (x0 < nx) & (y0 >= -1) & (y0 < ny)
+        with np.errstate(invalid='ignore'):
+            tx, ty = np.where(near, x - x0, 0), np.where(near, y - y0, 0)
+        # checked before casting to int, non-finite and far away coordinates would overflow
+        x0, y0 = (np.where(near, a, -2).astype('int32') for a in (x0, y0))
+
+        acc = np.zeros(dst.shape, dtype='float64')
+        wsum = np.zeros(dst.shape, dtype='float64')
+        for dy, wy in ((0, 1 - ty), (1, ty)):
+            for dx, wx in ((0, 1 - tx), (1, tx)):
+                ix, iy = x0 + dx, y0 + dy
+                inside = (ix >= 0) & (ix < nx) & (iy >= 0) & (iy < ny)
+                pix = src[..., np.where(inside, iy, 0), np.where(inside, ix, 0)]
+                ok = np.broadcast_to(inside, pix.shape)
+                if src_nodata is not None:
+                    ok = ok & ~_nodata_mask(pix, src_nodata)
+                wgt = np.where(ok, wx*wy, 0)
+                acc += wgt*np.where(ok, pix, 0)
+                wsum += wgt
+
+        valid = wsum > 0
+        out = acc[valid]/wsum[valid]
+        if dst.dtype.kind in 'iu':
+            out = np.rint(out)
+        dst[valid] = out
+        if dst_nodata is not None:
+            dst[~valid] = dst_nodata
+
+    def apply(self,
+              src: np.ndarray,
+              dst: np.ndarray,
+              resampling: Resampling,
+              src_nodata: Nodata = None,
+              dst_nodata: Nodata = None) -> np.ndarray:
+        """
+        Warp ``src`` into ``dst`` using pre-computed pixel mapping. All bands of a 3D
+        stack are warped together, sharing the source pixel lookup.
+
+        :param        src: image as ndarray, must match source geobox shape, can be a 3D (band, y, x) stack
+        :param        dst: image as ndarray, must match destination geobox shape, 3D if ``src`` is 3D
+        :param resampling: str|rasterio.warp.Resampling, only nearest and bilinear are supported
+        :param src_nodata: Value representing "no data" in the source image
+        :param dst_nodata: Value to represent "no data" in the destination image
+
+        :returns: dst
+        """
+        assert src.shape[-2:] == self.src_shape
+        assert dst.shape[-2:] == self.dst_shape
+        assert src.ndim == dst.ndim
+
+        if isinstance(resampling, str):
+            resampling = resampling_s2rio(resampling)
+
+        if resampling == rasterio.warp.Resampling.nearest:
+            self._nearest(src, dst, src_nodata, dst_nodata)
+        elif resampling == rasterio.warp.Resampling.bilinear:
+            self._bilinear(src, dst, src_nodata, dst_nodata)
+        else:
+            raise ValueError('Unsupported resampling for WarpPlan: {}'.format(resampling))
+
+        return dst
+
+
+def _interpolation_error(s_gbox: GeoBox, d_gbox: GeoBox,
+                         xx: np.ndarray, yy: np.ndarray, x: np.ndarray, y: np.ndarray) -> float:
+    """
+    Largest difference, in source pixels, between exactly projected and linearly interpolated
+    source coordinates ``x, y`` sampled at destination pixels ``xx, yy``, at the centres of
+    the cells of the sampling grid. Infinite when any coordinate is not finite.
+    """
+    if len(xx) < 2 or len(yy) < 2:
+        return 0.0
+
+    xm, ym = apply_affine(d_gbox.transform, *np.meshgrid((xx[:-1] + xx[1:])/2, (yy[:-1] + yy[1:])/2))
+    xm, ym = d_gbox.crs.transformer_to_crs(s_gbox.crs)(xm, ym)
+    xm, ym = apply_affine(~s_gbox.transform, xm, ym)
+
+    def centres(g):
+        return (g[:-1, :-1] + g[1:, :-1] + g[:-1, 1:] + g[1:, 1:])/4
+
+    with np.errstate(invalid='ignore'):
+        error = np.maximum(np.abs(xm - centres(x)), np.abs(ym - centres(y)))
+    if not np.isfinite(error).all():
+        return float('inf')
+    return float(error.max())
+
+
+def _nodata_mask(pix: np.ndarray, nodata) -> np.ndarray:
+    if np.isnan(nodata):
+        return np.isnan(pix)
+    return pix == nodata
+
+
+def _gbox_key(gbox: GeoBox) -> Tuple[Any, ...]:
+    return (gbox.shape, tuple(gbox.transform), str(gbox.crs))
+
+
+def _warp_plan_key(s_gbox: GeoBox, d_gbox: GeoBox) -> Tuple[Any, ...]:
+    return (_gbox_key(s_gbox), _gbox_key(d_gbox))
+
+
+@cachetools.cached(cachetools.LRUCache(maxsize=_WARP_PLAN_CACHE_BYTES, getsizeof=lambda p: p.nbytes),
+                   key=_warp_plan_key,
+                   lock=threading.Lock())
+def warp_plan(s_gbox: GeoBox, d_gbox: GeoBox) -> WarpPlan:
+    """
+    Get :py:class:`WarpPlan` for a pair of geoboxes, plans are kept in a process-wide
+    LRU cache bounded by memory used, so that loading many bands or time slices
+    with the same source and destination grids only computes pixel mapping once.
+    """
+    return WarpPlan(s_gbox, d_gbox)
+
+
+def reproject_array(src: np.ndarray,
+                    dst: np.ndarray,
+                    s_gbox: GeoBox,
+                    d_gbox: GeoBox,
+                    resampling: Resampling,
+                    src_nodata: Nodata = None,
+                    dst_nodata: Nodata = None) -> np.ndarray:
+    """
+    Reproject ndarray->ndarray re-using cached :py:class:`WarpPlan` when resampling
+    allows it, falling back to :py:func:`rio_reproject` otherwise. Destinations too large
+    for their plan to fit into the cache also go through GDAL, as such plans would be
+    computed again for every band and time slice, and so do projections too curved for
+    the plan's linear interpolation to stay within 0.125 source pixels.
+
+    :returns: dst
+    """
+    plan_nbytes = 2*4*d_gbox.shape[0]*d_gbox.shape[1]  # float32 source x and y per destination pixel
+    plan = None
+    if WarpPlan.supports(resampling) and plan_nbytes <= _WARP_PLAN_CACHE_BYTES:
+        plan = warp_plan(s_gbox, d_gbox)
+
+    if plan is None or plan.max_error > _WARP_PLAN_MAX_ERROR:
+        return rio_reproject(src, dst, s_gbox, d_gbox, resampling,
+                             src_nodata=src_nodata, dst_nodata=dst_nodata)
+
+    return plan.apply(src, dst, resampling, src_nodata=src_nodata, dst_nodata=dst_nodata)
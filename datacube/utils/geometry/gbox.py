@@ -1,9 +1,11 @@
 """ Geometric operations on GeoBox class
 """
 
-from typing import Optional, Tuple, Dict, Iterable
+from typing import Optional, Tuple, Iterable
 import itertools
 import math
+import threading
+import cachetools
 from affine import Affine
 
 from . import Geometry, GeoBox, BoundingBox
@@ -14,6 +16,9 @@ from datacube.utils.math import clamp
 MaybeInt = Optional[int]
 MaybeFloat = Optional[float]
 
+# Number of tile geoboxes kept by each GeoboxTiles instance
+_TILE_CACHE_SIZE = 1024
+
 
 def flipy(gbox: GeoBox) -> GeoBox:
     """
@@ -147,7 +152,9 @@ class GeoboxTiles():
         self._tile_shape = tile_shape
         self._shape = tuple(math.ceil(float(N)/n)
                             for N, n in zip(box.shape, tile_shape))
-        self._cache = {}  # type: Dict[Tuple[int, int], GeoBox]
+        # instances are shared between loads (see geobox_tiles), so only recently used tiles are kept
+        self._cache = cachetools.LRUCache(maxsize=_TILE_CACHE_SIZE)  # type: cachetools.LRUCache
+        self._lock = threading.Lock()
 
     @property
     def base(self) -> GeoBox:
@@ -196,12 +203,16 @@ class GeoboxTiles():
             :returns: GeoBox of a tile
             :raises: IndexError when index is outside of [(0,0) -> .shape)
         """
-        sub_gbox = self._cache.get(idx, None)
+        with self._lock:
+            sub_gbox = self._cache.get(idx, None)
         if sub_gbox is not None:
             return sub_gbox
 
         roi = self._idx_to_slice(idx)
-        return self._cache.setdefault(idx, self._gbox[roi])
+        sub_gbox = self._gbox[roi]
+        with self._lock:
+            self._cache[idx] = sub_gbox
+        return sub_gbox
 
     def range_from_bbox(self, bbox: BoundingBox) -> Tuple[range, range]:
         """ Compute rows and columns overlapping with a given ``BoundingBox``
@@ -230,3 +241,13 @@ class GeoboxTiles():
             gbox = self[idx]
             if gbox.extent.intersects(poly):
                 yield idx
+
+
+@cachetools.cached(cachetools.LRUCache(maxsize=64), lock=threading.Lock())
+def geobox_tiles(box: GeoBox, tile_shape: Tuple[int, int]) -> GeoboxTiles:
+    """ Get :class:`GeoboxTiles` for a given ``GeoBox`` and tile shape.
+
+    Instances are kept in a process-wide LRU cache, so that repeated loads of the
+    same region with the same chunking re-use tile geoboxes computed previously.
+    """
+    return GeoboxTiles(box, tuple(tile_shape))
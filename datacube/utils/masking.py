@@ -5,6 +5,9 @@ The main functions are `make_mask(variable)` `describe_flags(variable)`
 """
 
 import collections
+import functools
+import itertools
+import operator
 
 import pandas
 import numpy
@@ -16,6 +19,11 @@ from datacube.utils.math import valid_mask
 
 FLAGS_ATTR_NAME = 'flags_definition'
 
+# masks accepting at least LUT_MIN_VALUES bit patterns of integer variables of up to
+# LUT_MAX_BITS bits are evaluated through a lookup table, fewer are faster to compare
+LUT_MAX_BITS = 16
+LUT_MIN_VALUES = 3
+
 
 def list_flag_names(variable):
     """
@@ -91,6 +99,13 @@ def make_mask(variable, **flags):
 
     where `GOOD_PIXEL_FLAGS` is a dict of flag_name to True/False
 
+    A flag can also be given a list of values, to keep pixels with any of them:
+
+    >>> make_mask(pqa, cloud_confidence=['none', 'low'], nodata=False) # doctest: +SKIP
+
+    Masks accepting several combinations of flag values are computed in a single pass
+    through a lookup table over all possible values, for integer variables of up to 16 bits.
+
     :param variable:
     :type variable: xarray.Dataset or xarray.DataArray
     :param flags: list of boolean flags
@@ -98,9 +113,71 @@ def make_mask(variable, **flags):
     """
     flags_def = get_flags_def(variable)
 
-    mask, mask_value = create_mask_value(flags_def, **flags)
+    mask, mask_values = create_mask_values(flags_def, **flags)
+
+    if isinstance(variable, DataArray) and len(mask_values) >= LUT_MIN_VALUES:
+        lut = flags_lookup_table(variable.dtype, mask, mask_values)
+        if lut is not None:
+            return xarray.apply_ufunc(_lookup, variable, kwargs=dict(lut=lut),
+                                      dask='parallelized',
+                                      output_dtypes=[numpy.bool])
+
+    masked = variable & mask
+    return functools.reduce(operator.or_, [masked == mask_value for mask_value in mask_values])
+
+
+def create_mask_values(bits_def, **flags):
+    """
+    Like :py:func:`create_mask_value`, but flags can be given a list of values to accept any of
+
+    :return: the mask, and the sorted tuple of the accepted values of the masked bits
+    """
+    def as_list(flag_name, flag_ref):
+        flag_refs = flag_ref if isinstance(flag_ref, (list, tuple, set, frozenset)) else [flag_ref]
+        if len(flag_refs) == 0:
+            raise ValueError('No values specified for flag %s' % flag_name)
+        return [(flag_name, ref) for ref in flag_refs]
+
+    choices = [as_list(flag_name, flag_ref) for flag_name, flag_ref in flags.items()]
+
+    mask = 0
+    mask_values = set()
+    for combination in itertools.product(*choices):
+        mask, mask_value = create_mask_value(bits_def, **dict(combination))
+        mask_values.add(mask_value)
+
+    return mask, tuple(sorted(mask_values))
 
-    return variable & mask == mask_value
+
+def flags_lookup_table(dtype, mask, mask_values):
+    """
+    Boolean lookup table of whether ``value & mask`` is one of `mask_values`, for all values of `dtype`
+
+    The table is indexed by bit pattern, that is, by values viewed as unsigned integers.
+    Tables are cached, as the same flags are typically applied to many arrays.
+
+    :return: read-only table of ``2**bits`` elements, or ``None`` if `dtype` is not an integer
+             type of up to ``LUT_MAX_BITS`` bits or `mask` does not fit in it
+    """
+    dtype = numpy.dtype(dtype)
+    nbits = dtype.itemsize * 8
+    if dtype.kind not in 'ui' or nbits > LUT_MAX_BITS or mask >> nbits:
+        return None
+
+    return _flags_lookup_table(nbits, mask, tuple(sorted(mask_values)))
+
+
+@functools.lru_cache(maxsize=64)
+def _flags_lookup_table(nbits, mask, mask_values):
+    values = numpy.arange(2 ** nbits, dtype='uint{}'.format(nbits))
+    lut = numpy.isin(values & mask, mask_values)
+    lut.setflags(write=False)
+    return lut
+
+
+def _lookup(array, lut):
+    # index by bit pattern, so that negative values of signed types work too
+    return lut[array.view('uint{}'.format(array.dtype.itemsize * 8))]
 
 
 def valid_data_mask(data):
@@ -118,7 +195,8 @@ def valid_data_mask(data):
 
     nodata = data.attrs.get('nodata', None)
 
-    return xarray.apply_ufunc(valid_mask, data, nodata,
+    # nodata is passed as a keyword so that dask does not wrap it into an array
+    return xarray.apply_ufunc(valid_mask, data, kwargs=dict(nodata=nodata),
                               dask='parallelized',
                               output_dtypes=[numpy.bool])
 
@@ -150,6 +228,145 @@ def mask_invalid_data(data, keep_attrs=True):
     raise TypeError('mask_invalid_data not supported for type {}'.format(type(data)))
 
 
+def mask_with_nodata(data, mask, nodata=None, inplace=False):
+    """
+    Sets values where `mask` is ``False`` to `nodata`, keeping the ``dtype`` of `data`.
+
+    Unlike ``data.where(mask, nodata)`` this never promotes integer data to a larger type.
+
+    :param DataArray data: data to mask
+    :param DataArray mask: boolean mask of values to keep, broadcastable to `data`
+    :param nodata: fill value, defaults to ``data.nodata``, must be representable in ``data.dtype``
+    :param bool inplace: modify (and return) `data` instead of allocating a new array,
+                         only possible for numpy backed data
+    :return: DataArray with the attributes of `data`
+    """
+    if nodata is None:
+        nodata = data.attrs.get('nodata', None)
+        if nodata is None:
+            raise ValueError('No nodata value to fill masked data with')
+
+    dtype = numpy.dtype(data.dtype)
+    fill = numpy.array(nodata, dtype=dtype)
+    if not (fill == nodata or (numpy.isnan(nodata) and numpy.isnan(fill))):
+        raise ValueError('nodata value {} can not be represented as {}'.format(nodata, dtype))
+
+    if inplace and not hasattr(data.data, 'dask'):
+        keep = mask.broadcast_like(data).transpose(*data.dims).values
+        numpy.copyto(data.values, fill, where=~keep)
+        return data
+
+    return xarray.apply_ufunc(_fill_masked, data, mask, kwargs=dict(fill=fill),
+                              dask='parallelized', output_dtypes=[dtype], keep_attrs=True)
+
+
+def _fill_masked(array, keep, fill):
+    return numpy.where(keep, array, fill)
+
+
+def dilate_mask(mask, radius):
+    """
+    Dilates a boolean mask with a disk in its last two (``y, x``) dimensions.
+
+    Same as :py:func:`scipy.ndimage.binary_dilation` with a structuring element of all pixels within
+    ``radius + 0.5`` pixels of the centre, but computed on the mask packed into bits: the disk is
+    split into rows, and rows of each width are dilated by shifting the packed rows.
+
+    :param mask: boolean numpy array
+    :param int radius: radius of the disk in pixels
+    :return: boolean numpy array of the same shape
+    """
+    mask = numpy.asarray(mask, dtype=numpy.bool)
+    if radius <= 0:
+        return mask.copy()
+
+    width = mask.shape[-1]
+    dilated = _dilate_packed(numpy.packbits(mask, axis=-1), radius)
+    return numpy.unpackbits(dilated, axis=-1, count=width).view(numpy.bool)
+
+
+def erode_mask(mask, radius):
+    """
+    Erodes a boolean mask with a disk in its last two (``y, x``) dimensions.
+
+    This is the complement of the dilation (see :py:func:`dilate_mask`) of the complement of `mask`,
+    that is, pixels outside the array are taken to be ``True``.
+    Masks of valid pixels are eroded to also exclude pixels near invalid ones.
+
+    :param mask: boolean numpy array
+    :param int radius: radius of the disk in pixels
+    :return: boolean numpy array of the same shape
+    """
+    mask = numpy.asarray(mask, dtype=numpy.bool)
+    if radius <= 0:
+        return mask.copy()
+
+    width = mask.shape[-1]
+    packed = numpy.invert(numpy.packbits(mask, axis=-1))
+    if width % 8:
+        # padding bits past the end of each row are not invalid pixels
+        packed[..., -1] &= numpy.uint8((0xFF << (8 - width % 8)) & 0xFF)
+
+    eroded = numpy.invert(_dilate_packed(packed, radius))
+    return numpy.unpackbits(eroded, axis=-1, count=width).view(numpy.bool)
+
+
+def _dilate_packed(packed, radius):
+    """ Dilation of a mask packed into bits along the last axis by a disk of `radius` """
+    nrows = packed.shape[-2]
+    result = numpy.zeros_like(packed)
+
+    rows = packed
+    reach = 0
+    # half widths of the rows of the disk, widest in the middle
+    for dy in range(radius, -1, -1):
+        half_width = int(numpy.floor(numpy.sqrt((radius + 0.5) ** 2 - dy ** 2)))
+        rows = _dilate_bits(rows, half_width - reach)
+        reach = half_width
+
+        if dy >= nrows:
+            continue
+        for offset in {dy, -dy}:
+            if offset >= 0:
+                result[..., :nrows - offset, :] |= rows[..., offset:, :]
+            else:
+                result[..., -offset:, :] |= rows[..., :nrows + offset, :]
+
+    return result
+
+
+def _dilate_bits(packed, distance):
+    """ Horizontal dilation of packed rows, in logarithmically many shifts """
+    reach = 0
+    while reach < distance:
+        step = min(2 * reach + 1, distance - reach)
+        packed = packed | _shift_bits(packed, step) | _shift_bits(packed, -step)
+        reach += step
+    return packed
+
+
+def _shift_bits(packed, shift):
+    """ Moves pixels of rows packed into bits (most significant first) by `shift` pixels to the right """
+    nbytes, nbits = divmod(abs(shift), 8)
+    result = numpy.zeros_like(packed)
+    size = packed.shape[-1]
+    if nbytes >= size:
+        return result
+
+    if shift > 0:
+        src = packed[..., :size - nbytes]
+        result[..., nbytes:] = src >> nbits
+        if nbits:
+            result[..., nbytes + 1:] |= src[..., :-1] << (8 - nbits)
+    else:
+        src = packed[..., nbytes:]
+        result[..., :size - nbytes] = src << nbits
+        if nbits:
+            result[..., :size - nbytes - 1] |= src[..., 1:] >> (8 - nbits)
+
+    return result
+
+
 def create_mask_value(bits_def, **flags):
     mask = 0
     value = 0
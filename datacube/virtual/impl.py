@@ -5,15 +5,15 @@ products implementing the same interface.
 """
 
 from abc import ABC, abstractmethod
+from collections import Counter
 from collections.abc import Mapping, Sequence
-from functools import reduce
-from typing import Any, Dict, List, cast
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from functools import partial, reduce
+from typing import Any, Callable, Dict, List, Optional, Tuple, cast
+import threading
 
-import uuid
 import numpy
 import xarray
-import dask.array
-from dask.core import flatten
 import yaml
 
 from datacube import Datacube
@@ -22,17 +22,24 @@ from datacube.api.grid_workflow import _fast_slice
 from datacube.api.query import Query, query_group_by
 from datacube.model import Measurement, DatasetType
 from datacube.model.utils import xr_apply, xr_iter, SafeDumper
-from datacube.testutils.io import native_geobox
-from datacube.utils.geometry import GeoBox, rio_reproject, geobox_union_conservative
+from datacube.testutils.io import native_geobox_union
+from datacube.utils.geometry import GeoBox, xr_reproject
 from datacube.utils.geometry import compute_reproject_roi
-from datacube.utils.geometry.gbox import GeoboxTiles
-from datacube.utils.geometry._warp import resampling_s2rio
 from datacube.api.core import per_band_load_data_settings
+from datacube.utils.math import iter_slices
 
 from .utils import qualified_name, merge_dicts
 from .utils import select_unique, select_keys, reject_keys, merge_search_terms
 
 
+# spatial block shape used when evaluating fused transformations on eagerly loaded data
+_FUSED_BLOCK_SHAPE = (1024, 1024)
+
+
+# marks threads fetching a child for a parent combinator, see `fetch_concurrently`
+_FETCH_THREAD = threading.local()
+
+
 class VirtualProductException(Exception):
     """ Raised if the construction of the virtual product cannot be validated. """
 
@@ -225,6 +232,43 @@ class Transformation(ABC):
         having measurements reported by the `measurements` method.
         """
 
+    def is_pointwise(self) -> bool:
+        """
+        Whether every output pixel depends only on the input pixels at the same spatial location.
+        Chains of such transformations may be evaluated block by block (see ``fuse_transforms``).
+        """
+        return False
+
+    # incremental reduction protocol, used by `Aggregate` to process one slice at a time
+
+    def is_incremental(self) -> bool:
+        """
+        Whether the `init`, `update` and `finalize` methods are implemented, so that
+        the statistic of a group can be computed from its slices one at a time.
+        """
+        return False
+
+    def init(self, data):
+        """
+        Start an incremental computation from the first slice of `data`.
+        Returns the state that is passed on to `update` and `finalize`.
+        """
+        raise NotImplementedError
+
+    def update(self, state, data):
+        """
+        Update the `state` of an incremental computation with the next slice of `data`.
+        Returns the new state.
+        """
+        raise NotImplementedError
+
+    def finalize(self, state) -> xarray.Dataset:
+        """
+        The result of an incremental computation, as `compute` would have returned
+        for all of the slices concatenated.
+        """
+        raise NotImplementedError
+
 
 class VirtualProduct(Mapping):
     """
@@ -241,8 +285,9 @@ class VirtualProduct(Mapping):
 
     _GEOBOX_KEYS = {'output_crs', 'resolution', 'align'}
     _GROUPING_KEYS = {'group_by'}
-    _LOAD_KEYS = {'measurements', 'fuse_func', 'resampling', 'dask_chunks', 'like'}
-    _ADDITIONAL_KEYS = {'dataset_predicate'}
+    _LOAD_KEYS = {'measurements', 'fuse_func', 'resampling', 'dask_chunks', 'like', 'fuse_transforms',
+                  'fetch_threads'}
+    _ADDITIONAL_KEYS = {'dataset_predicate', 'load_cache'}
 
     _NON_SPATIAL_KEYS = _GEOBOX_KEYS | _GROUPING_KEYS
     _NON_QUERY_KEYS = _NON_SPATIAL_KEYS | _LOAD_KEYS | _ADDITIONAL_KEYS
@@ -301,6 +346,9 @@ class VirtualProduct(Mapping):
 
     def load(self, dc: Datacube, **query: Dict[str, Any]) -> xarray.Dataset:
         """ Mimic `datacube.Datacube.load`. For illustrative purposes. May be removed in the future. """
+        if 'load_cache' not in query:
+            query = dict(query, load_cache=LoadCache.for_recipe(self))
+
         datasets = self.query(dc, **query)
         grouped = self.group(datasets, **query)
         return self.fetch(grouped, **query)
@@ -330,14 +378,23 @@ class Product(VirtualProduct):
         return product.lookup_measurements(measurements)
 
     def query(self, dc: Datacube, **search_terms: Dict[str, Any]) -> VirtualDatasetBag:
+        originals = reject_keys(self, self._NON_QUERY_KEYS)
+        overrides = reject_keys(search_terms, self._NON_QUERY_KEYS)
+        merged = merge_search_terms(originals, overrides)
+
+        cache = search_terms.get('load_cache')
+        if cache is None:
+            return self._search(dc, merged)
+
+        key = (self._product, self.get('dataset_predicate'), repr(sorted(merged.items())))
+        return cache.query(key, partial(self._search, dc, merged))
+
+    def _search(self, dc: Datacube, search_terms: Dict[str, Any]) -> VirtualDatasetBag:
         product = dc.index.products.get_by_name(self._product)
         if product is None:
             raise VirtualProductException("could not find product {}".format(self._product))
 
-        originals = reject_keys(self, self._NON_QUERY_KEYS)
-        overrides = reject_keys(search_terms, self._NON_QUERY_KEYS)
-
-        query = Query(dc.index, **merge_search_terms(originals, overrides))
+        query = Query(dc.index, **search_terms)
         self._assert(query.product == self._product,
                      "query for {} returned another product {}".format(self._product, query.product))
 
@@ -405,10 +462,9 @@ class Product(VirtualProduct):
 
         if grouped.load_natively:
             canonical_names = [product.canonical_measurement(measurement) for measurement in measurement_dicts]
-            dataset_geobox = geobox_union_conservative([native_geobox(ds,
-                                                                      measurements=canonical_names,
-                                                                      basis=merged.get('like'))
-                                                        for ds in grouped.box.sum().item()])
+            dataset_geobox = native_geobox_union((ds for datasets in grouped.box.values.ravel() for ds in datasets),
+                                                 measurements=canonical_names,
+                                                 basis=merged.get('like'))
 
             if grouped.geopolygon is not None:
                 reproject_roi = compute_reproject_roi(dataset_geobox,
@@ -426,13 +482,20 @@ class Product(VirtualProduct):
         else:
             geobox = grouped.geobox
 
-        result = Datacube.load_data(grouped.box,
-                                    geobox, list(measurement_dicts.values()),
-                                    fuse_func=merged.get('fuse_func'),
-                                    dask_chunks=merged.get('dask_chunks'),
-                                    resampling=merged.get('resampling', 'nearest'))
+        def load_data(measurements):
+            return Datacube.load_data(grouped.box,
+                                      geobox, measurements,
+                                      fuse_func=merged.get('fuse_func'),
+                                      dask_chunks=merged.get('dask_chunks'),
+                                      resampling=merged.get('resampling', 'nearest'))
 
-        return result
+        cache = load_settings.get('load_cache')
+        if cache is None:
+            return load_data(list(measurement_dicts.values()))
+
+        settings = repr(sorted(select_keys(merged, {'fuse_func', 'dask_chunks', 'resampling'}).items()))
+        return cache.read(self._product, grouped.box, geobox, list(measurement_dicts.values()),
+                          settings, load_data)
 
 
 class Transform(VirtualProduct):
@@ -473,9 +536,40 @@ class Transform(VirtualProduct):
     def group(self, datasets: VirtualDatasetBag, **group_settings: Dict[str, Any]) -> VirtualDatasetBox:
         return self._input.group(datasets, **group_settings)
 
+    def _pointwise_chain(self):
+        """
+        The longest chain of pointwise transformations starting from this product,
+        innermost first, together with the input product of the chain.
+        """
+        chain = []
+        product = cast(VirtualProduct, self)
+        while isinstance(product, Transform):
+            transformation = product._transformation  # pylint: disable=protected-access
+            if not transformation.is_pointwise():
+                break
+            chain.insert(0, transformation)
+            product = product._input  # pylint: disable=protected-access
+
+        return chain, product
+
     def fetch(self, grouped: VirtualDatasetBox, **load_settings: Dict[str, Any]) -> xarray.Dataset:
-        input_data = self._input.fetch(grouped, **load_settings)
-        output_data = self._transformation.compute(input_data)
+        fuse_transforms = load_settings.get('fuse_transforms')
+        chain, chain_input = self._pointwise_chain() if fuse_transforms else ([], None)
+
+        if chain:
+            input_data = chain_input.fetch(grouped, **load_settings)
+
+            def compute(data):
+                for transformation in chain:
+                    data = transformation.compute(data)
+                return data
+
+            block_shape = _FUSED_BLOCK_SHAPE if fuse_transforms is True else tuple(fuse_transforms)
+            output_data = fused_compute(compute, input_data, block_shape)
+        else:
+            input_data = self._input.fetch(grouped, **load_settings)
+            output_data = self._transformation.compute(input_data)
+
         output_data.attrs['crs'] = input_data.attrs['crs']
         for data_var in output_data.data_vars:
             output_data[data_var].attrs['crs'] = input_data.attrs['crs']
@@ -538,6 +632,10 @@ class Aggregate(VirtualProduct):
 
     def fetch(self, grouped: VirtualDatasetBox, **load_settings: Dict[str, Any]) -> xarray.Dataset:
         dim = self.get('dim', 'time')
+        stat = self._statistic
+
+        # lazily loaded data is reduced by dask chunk by chunk anyway
+        incremental = stat.is_incremental() and load_settings.get('dask_chunks') is None
 
         def xr_map(array, func):
             # convenient function close to `xr_apply` in spirit
@@ -545,9 +643,19 @@ class Aggregate(VirtualProduct):
             for i in numpy.ndindex(array.shape):
                 yield func({key: value[i] for key, value in coords.items()}, array.values[i])
 
+        def reduce_slices(value):
+            state = None
+            for box_slice in value.split(dim):
+                data = self._input.fetch(box_slice, **load_settings)
+                state = stat.init(data) if state is None else stat.update(state, data)
+            return stat.finalize(state)
+
         def statistic(coords, value):
-            data = self._input.fetch(value, **load_settings)
-            result = self._statistic.compute(data)
+            if incremental:
+                result = reduce_slices(value)
+            else:
+                data = self._input.fetch(value, **load_settings)
+                result = stat.compute(data)
             result.coords[dim] = coords[dim]
             return result
 
@@ -643,18 +751,19 @@ class Collate(VirtualProduct):
                 if name is None:
                     return result
 
-                # implication for dask?
                 measurement = Measurement(name=name, dtype='int8', nodata=-1, units='1')
-                shape = select_unique([result[band].shape for band in result.data_vars])
-                array = numpy.full(shape, source_index, dtype=measurement.dtype)
+                select_unique([result[band].shape for band in result.data_vars])
                 first = result[list(result.data_vars)[0]]
-                result[name] = xarray.DataArray(array, dims=first.dims, coords=first.coords,
-                                                name=name).assign_attrs(units=measurement.units,
-                                                                        nodata=measurement.nodata)
+                # lazy, chunked like the bands, when they are
+                index = xarray.full_like(first, source_index, dtype=measurement.dtype)
+                index.attrs = dict(units=measurement.units, nodata=measurement.nodata)
+                result[name] = index.rename(name)
                 return result
 
-        groups = [fetch_child(child, source_index, grouped.filter(is_from(source_index)).map(strip_source))
-                  for source_index, child in enumerate(self._children)]
+        groups = fetch_concurrently([partial(fetch_child, child, source_index,
+                                             grouped.filter(is_from(source_index)).map(strip_source))
+                                     for source_index, child in enumerate(self._children)],
+                                    load_settings)
 
         non_empty = [g for g in groups if g is not None]
 
@@ -737,8 +846,9 @@ class Juxtapose(VirtualProduct):
                                      grouped.load_natively, grouped.product_definitions,
                                      geopolygon=grouped.geopolygon)
 
-        groups = [child.fetch(fetch_recipe(source_index), **load_settings)
-                  for source_index, child in enumerate(self._children)]
+        groups = fetch_concurrently([partial(child.fetch, fetch_recipe(source_index), **load_settings)
+                                     for source_index, child in enumerate(self._children)],
+                                    load_settings)
 
         return xarray.merge(groups).assign_attrs(**select_unique([g.attrs for g in groups]))
 
@@ -835,62 +945,268 @@ class Reproject(VirtualProduct):
         return result
 
 
-def reproject_band(band, geobox, resampling, dims, dask_chunks=None):
-    """ Reproject a single measurement to the geobox. """
-    if not hasattr(band.data, 'dask') or dask_chunks is None:
-        data = reproject_array(band.data, band.nodata, band.geobox, geobox, resampling)
-        return wrap_in_dataarray(data, band, geobox, dims)
+class _SharedBand:
+    """
+    A band of a `LoadCache`, read once for several references to it. Every reference but the
+    last gets a copy, the last one gets the band itself, once all the copies are made.
+    """
+
+    def __init__(self, uses: int) -> None:
+        """ :param uses: number of references yet to claim the band, besides the one reading it """
+        self.uses = uses
+        self._copying = 0
+        self._cond = threading.Condition()
+        self._done = False
+        self._value = None  # type: Optional[Tuple[xarray.DataArray, Any]]
+        self._error = None  # type: Optional[BaseException]
+
+    def claim(self) -> bool:
+        """ Claim the band for one more reference, returns whether it is the last one. """
+        self.uses -= 1
+        if self.uses <= 0:
+            return True
+
+        with self._cond:
+            self._copying += 1
+        return False
+
+    def set_result(self, band: xarray.DataArray, attrs: Any) -> None:
+        with self._cond:
+            self._value = (band, attrs)
+            self._done = True
+            self._cond.notify_all()
+
+    def set_error(self, error: BaseException) -> None:
+        with self._cond:
+            self._error = error
+            self._done = True
+            self._cond.notify_all()
+
+    def get(self, last: bool) -> Tuple[xarray.DataArray, Any]:
+        """ Wait for the band to be read, and return it, or a copy unless this is the `last` reference. """
+        with self._cond:
+            self._cond.wait_for(lambda: self._done and (not last or self._copying == 0))
+            if self._error is not None:
+                raise self._error
+
+            band, attrs = self._value
+            if last:
+                self._value = None
+                return band, attrs
+
+        try:
+            return band.copy(deep=True), attrs
+        finally:
+            with self._cond:
+                self._copying -= 1
+                self._cond.notify_all()
+
+
+class LoadCache:
+    """
+    Memoises the index searches and band reads of a single `VirtualProduct.load`,
+    so that products referenced more than once in a recipe are searched and read once.
+
+    Searches are keyed by product and search terms, reads by product, datasets, band,
+    geobox and load settings. A band is only kept if it is referenced more than once in
+    the recipe, and only until the last of those references has used it. Every reference
+    gets its own copy of the band, the last one takes the cached band, so that transformations
+    may modify their inputs in place. References arriving while a search or read is in
+    progress in another thread wait for it, rather than repeating it.
+    """
 
-    dask_name = 'warp_{name}-{token}'.format(name=band.name, token=uuid.uuid4().hex)
-    dependencies = [band.data]
+    def __init__(self, references: Dict[Any, int]) -> None:
+        """
+        :param references: number of references to each band of each product, as
+                           ``(product, band)`` keys; a band of `None` stands for all bands
+        """
+        self._references = references
+        self._lock = threading.Lock()
+        self._queries = {}  # type: Dict[Any, Future]
+        self._reads = {}  # type: Dict[Any, _SharedBand]
+
+    @classmethod
+    def for_recipe(cls, recipe: Mapping) -> 'LoadCache':
+        """ Cache for loading `recipe`, a virtual product or its settings. """
+        def references(recipe):
+            if 'product' in recipe:
+                return Counter((recipe['product'], band) for band in recipe.get('measurements') or [None])
+
+            children = list(recipe.get('collate', [])) + list(recipe.get('juxtapose', []))
+            if 'input' in recipe:
+                children.append(recipe['input'])
+            return sum((references(child) for child in children), Counter())
+
+        return cls(references(recipe))
+
+    def query(self, key: Any, search: Callable[[], VirtualDatasetBag]) -> VirtualDatasetBag:
+        """ The result of `search` for the search terms represented by `key`. """
+        with self._lock:
+            result = self._queries.get(key)
+            searching = result is None
+            if searching:
+                result = self._queries[key] = Future()
+
+        if searching:
+            try:
+                result.set_result(search())
+            except BaseException as error:
+                result.set_exception(error)
+                raise
+
+        return result.result()
+
+    def read(self, product: str, box: xarray.DataArray, geobox: GeoBox, measurements: List[Measurement],
+             settings: Any, load_data: Callable[[List[Measurement]], xarray.Dataset]) -> xarray.Dataset:
+        """
+        The `measurements` of the grouped datasets in `box`, reusing earlier reads.
+        Bands not read yet are read with `load_data`.
+        """
+        def reference_count(band):
+            return self._references.get((product, band), 0) + self._references.get((product, None), 0)
+
+        if all(reference_count(measurement.name) < 2 for measurement in measurements):
+            return load_data(measurements)
+
+        box_key = (tuple(tuple(box[dim].values.tolist()) for dim in box.dims),
+                   tuple(tuple(str(dataset.id) for dataset in datasets) for datasets in box.values.ravel()))
+        keys = {measurement.name: (product, box_key, measurement.name, geobox, settings)
+                for measurement in measurements}
+
+        reading = {}  # bands this call reads for later references
+        claimed = {}  # bands read, or being read, for earlier references
+        with self._lock:
+            for name, key in keys.items():
+                if key in self._reads:
+                    shared = self._reads[key]
+                    last = shared.claim()
+                    if last:
+                        del self._reads[key]
+                    claimed[name] = (shared, last)
+                elif reference_count(name) > 1:
+                    reading[name] = self._reads[key] = _SharedBand(reference_count(name) - 1)
+
+        bands = {}
+        attrs = None
+        missing = [measurement for measurement in measurements if measurement.name not in claimed]
+        if missing:
+            try:
+                loaded = load_data(missing)
+            except BaseException as error:
+                with self._lock:
+                    for name, shared in reading.items():
+                        if self._reads.get(keys[name]) is shared:
+                            del self._reads[keys[name]]
+                for shared in reading.values():
+                    shared.set_error(error)
+                raise
+
+            attrs = loaded.attrs
+            for measurement in missing:
+                band = loaded[measurement.name]
+                if measurement.name in reading:
+                    # copied before it is shared, later references may take the band itself
+                    bands[measurement.name] = band.copy(deep=True)
+                    reading[measurement.name].set_result(band, attrs)
+                else:
+                    bands[measurement.name] = band
 
-    spatial_chunks = tuple(dask_chunks.get(k, geobox.shape[i])
-                           for i, k in enumerate(geobox.dims))
+        # bands being read by other threads are waited for only once this call has shared its own reads
+        for name, (shared, last) in claimed.items():
+            bands[name], attrs = shared.get(last)
 
-    gt = GeoboxTiles(geobox, spatial_chunks)
-    new_layer = {}
+        # every caller owns the data it gets and may modify it in place
+        return xarray.Dataset({measurement.name: bands[measurement.name] for measurement in measurements},
+                              attrs=dict(attrs))
 
-    for tile_index in numpy.ndindex(gt.shape):
-        sub_geobox = gt[tile_index]
-        # find the input array slice from the output geobox
-        reproject_roi = compute_reproject_roi(band.geobox, sub_geobox, padding=1)
 
-        # find the chunk from the input array with the slice index
-        subset_band = band[(...,) + reproject_roi.roi_src].chunk(-1)
+def fetch_concurrently(tasks: List[Callable[[], Any]], load_settings: Dict[str, Any]) -> List[Any]:
+    """
+    Run the fetching `tasks` of the children of a combinator and return their results in order.
 
-        if min(subset_band.shape) == 0:
-            # pad the empty chunk
-            new_layer[(dask_name,) + tile_index] = (numpy.full, sub_geobox.shape, band.nodata, band.dtype)
-        else:
-            # next 3 lines to generate the new graph
-            dependencies.append(subset_band.data)
-            # get the input dask array for the function `reproject_array`
-            band_key = list(flatten(subset_band.data.__dask_keys__()))[0]
-            # generate a new layer of dask graph with reroject
-            new_layer[(dask_name,) + tile_index] = (reproject_array,
-                                                    band_key, band.nodata, subset_band.geobox, sub_geobox, resampling)
-
-    # create a new graph with the additional layer and pack the graph into dask.array
-    # since only regular chunking is allowed at the higher level dask.array interface,
-    # to manipulate the graph seems to be the easiest way to obtain a dask.array with irregular chunks after reproject
-    data = dask.array.Array(band.data.dask.from_collections(dask_name, new_layer, dependencies=dependencies),
-                            dask_name,
-                            chunks=spatial_chunks,
-                            dtype=band.dtype,
-                            shape=gt.base.shape)
+    With ``fetch_threads`` in `load_settings`, either a number of threads or a
+    `concurrent.futures.Executor` to share between loads, the tasks run concurrently.
+    Combinators nested inside a task fetch their own children sequentially, so that
+    only one pool is used for a recipe and its workers never wait on each other.
+    """
+    fetch_threads = load_settings.get('fetch_threads')
 
-    return wrap_in_dataarray(data, band, geobox, dims)
+    if not fetch_threads or len(tasks) < 2 or getattr(_FETCH_THREAD, 'active', False):
+        return [task() for task in tasks]
 
+    def run(task):
+        _FETCH_THREAD.active = True
+        try:
+            return task()
+        finally:
+            _FETCH_THREAD.active = False
+
+    if isinstance(fetch_threads, Executor):
+        return [future.result() for future in [fetch_threads.submit(run, task) for task in tasks]]
+
+    with ThreadPoolExecutor(max_workers=min(int(fetch_threads), len(tasks))) as pool:
+        return [future.result() for future in [pool.submit(run, task) for task in tasks]]
+
+
+def fused_compute(compute, data, block_shape=_FUSED_BLOCK_SHAPE):
+    """
+    Evaluate a pointwise `compute` function on `data` one spatial block at a time,
+    so that its intermediate results never exist at full size.
+
+    Dask-backed data is evaluated chunk by chunk instead, and `block_shape` is ignored.
+    """
+    geobox = getattr(data, 'geobox', None)
+    if geobox is None:
+        return compute(data)
+
+    if any(hasattr(value.data, 'dask') for value in data.data_vars.values()):
+        # the unfused lazy result only serves as the template for the output
+        return xarray.map_blocks(compute, data, template=compute(data))
+
+    spatial_dims = geobox.dims
+    spatial_shape = tuple(data.dims[dim] for dim in spatial_dims)
+
+    first = None
+    arrays = {}
 
-def reproject_array(src, nodata, s_geobox, d_geobox, resampling):
-    """ Reproject a numpy array. """
-    dst = numpy.full(d_geobox.shape, fill_value=nodata, dtype=src.dtype)
-    rio_reproject(src=src, dst=dst,
-                  s_gbox=s_geobox, d_gbox=d_geobox,
-                  resampling=resampling_s2rio(resampling),
-                  src_nodata=nodata,
-                  dst_nodata=nodata)
-    return dst
+    for roi in iter_slices(spatial_shape, block_shape):
+        block = compute(data.isel(**dict(zip(spatial_dims, roi))))
+
+        if first is None:
+            first = block
+            for name, value in block.data_vars.items():
+                if not set(spatial_dims) <= set(value.dims):
+                    raise VirtualProductException("transformation of {} is not pointwise".format(name))
+                arrays[name] = numpy.empty(tuple(data.dims[dim] if dim in spatial_dims else size
+                                                 for dim, size in zip(value.dims, value.shape)),
+                                           dtype=value.dtype)
+
+        for name, value in block.data_vars.items():
+            index = tuple(roi[spatial_dims.index(dim)] if dim in spatial_dims else slice(None)
+                          for dim in value.dims)
+            arrays[name][index] = value.values
+
+    def is_spatial(coord):
+        return bool(set(coord.dims) & set(spatial_dims))
+
+    coords = {name: coord for name, coord in first.coords.items() if not is_spatial(coord)}
+    coords.update({name: coord for name, coord in data.coords.items() if is_spatial(coord)})
+
+    return xarray.Dataset(data_vars={name: (value.dims, arrays[name], value.attrs)
+                                     for name, value in first.data_vars.items()},
+                          coords=coords, attrs=first.attrs)
+
+
+def reproject_band(band, geobox, resampling, dims, dask_chunks=None):
+    """ Reproject a single measurement to the geobox. """
+    if dask_chunks is None:
+        spatial_chunks = None
+    else:
+        spatial_chunks = tuple(dask_chunks.get(k, geobox.shape[i])
+                               for i, k in enumerate(geobox.dims))
+
+    data = xr_reproject(band, geobox, resampling=resampling, chunks=spatial_chunks).data
+    return wrap_in_dataarray(data, band, geobox, dims)
 
 
 def wrap_in_dataarray(reprojected_data, src_band, dst_geobox, dims):
@@ -900,7 +1216,8 @@ def wrap_in_dataarray(reprojected_data, src_band, dst_geobox, dims):
 
     result = xarray.DataArray(data=reprojected_data.reshape(non_spatial_shape + dst_geobox.shape),
                               dims=dims, attrs=src_band.attrs)
-    result.coords['time'] = src_band.coords['time']
+    # drop scalar coordinates of the source, such as its `spatial_ref`
+    result.coords['time'] = src_band.coords['time'].reset_coords(drop=True)
 
     for name, coord in dst_geobox.coordinates.items():
         result.coords[name] = (name, coord.values, {'units': coord.units, 'resolution': coord.resolution})
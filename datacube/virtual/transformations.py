@@ -1,14 +1,21 @@
 from typing import Optional, Collection
+import functools
+import operator
 
 import numpy
 import xarray
 import lark
 
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+
 from datacube.utils.masking import make_mask as make_mask_prim
 from datacube.utils.masking import mask_invalid_data as mask_invalid_data_prim
-from datacube.utils.masking import valid_data_mask
+from datacube.utils.masking import mask_with_nodata, erode_mask
 
-from datacube.utils.math import dtype_is_float
+from datacube.utils.math import dtype_is_float, invalid_mask
 
 from .impl import VirtualProductException, Transformation, Measurement
 
@@ -47,7 +54,7 @@ class MakeMask(Transformation):
     Alias in recipe: ``make_mask``.
 
     :param mask_measurement_name: the name of the measurement to create the mask from
-    :param flags: definition of the flags for the mask
+    :param flags: definition of the flags for the mask, a flag can be given a list of values to accept
     """
 
     def __init__(self, mask_measurement_name, flags):
@@ -73,6 +80,9 @@ class MakeMask(Transformation):
 
         return selective_apply(data, apply_to=[self.mask_measurement_name], value_map=worker)
 
+    def is_pointwise(self):
+        return True
+
 
 class ApplyMask(Transformation):
     """
@@ -85,14 +95,19 @@ class ApplyMask(Transformation):
     :param preserve_dtype: whether to cast back to original ``dtype`` after masking
     :param fallback_dtype: default ``dtype`` for masked measurements
     :param dilation: the dilation to apply to mask in pixels
+    :param inplace: whether to overwrite masked pixels of the input instead of copying it
+                    (only when ``preserve_dtype``), the input must not be shared with anything else.
+                    Within a virtual product load this always holds, products referenced more than
+                    once are read into a separate copy for every reference.
     """
     def __init__(self, mask_measurement_name, apply_to: Optional[Collection[str]] = None,
-                 preserve_dtype=True, fallback_dtype='float32', dilation: int = 0):
+                 preserve_dtype=True, fallback_dtype='float32', dilation: int = 0, inplace=False):
         self.mask_measurement_name = mask_measurement_name
         self.apply_to = apply_to
         self.preserve_dtype = preserve_dtype
         self.fallback_dtype = fallback_dtype
         self.dilation = int(dilation)
+        self.inplace = inplace
 
     def measurements(self, input_measurements):
         rest = {key: value
@@ -114,32 +129,28 @@ class ApplyMask(Transformation):
         mask = data[self.mask_measurement_name]
         rest = data.drop(self.mask_measurement_name)
 
-        def dilate(array):
-            """Dilation e.g. for the mask"""
-            # e.g. kernel = [[1] * 7] * 7 # blocky 3-pixel dilation
-            # pylint: disable=invalid-unary-operand-type
-            y, x = numpy.ogrid[-self.dilation:(self.dilation+1), -self.dilation:(self.dilation+1)]
-            kernel = ((x * x) + (y * y) <= (self.dilation + 0.5) ** 2)  # disk-like `self.dilation` radial dilation
-            return ~scipy.ndimage.binary_dilation(~array.astype(numpy.bool),
-                                                  structure=kernel.reshape((1, )+kernel.shape))
-
         if self.dilation > 0:
-            import scipy.ndimage
-            mask = xarray.apply_ufunc(dilate, mask, output_dtypes=[numpy.bool], dask='parallelized',
-                                      keep_attrs=True)
+            # disk-like `self.dilation` radial dilation of the masked out pixels
+            mask = xarray.apply_ufunc(erode_mask, mask, kwargs=dict(radius=self.dilation),
+                                      output_dtypes=[numpy.bool], dask='parallelized', keep_attrs=True)
 
         def worker(key, value):
             if self.preserve_dtype:
                 if 'nodata' not in value.attrs:
                     raise VirtualProductException("measurement {} has no nodata value".format(key))
-                return value.where(mask, value.attrs['nodata'])
+                return mask_with_nodata(value, mask, inplace=self.inplace)
 
-            result = value.where(mask).astype(self.fallback_dtype)
+            # the converted copy is ours to modify
+            result = mask_with_nodata(value.astype(self.fallback_dtype), mask, nodata=float('nan'), inplace=True)
             result.attrs['nodata'] = float('nan')
             return result
 
         return selective_apply(rest, apply_to=self.apply_to, value_map=worker)
 
+    def is_pointwise(self):
+        # dilation needs the neighbourhood of each pixel
+        return self.dilation == 0
+
 
 class ToFloat(Transformation):
     """
@@ -171,6 +182,9 @@ class ToFloat(Transformation):
 
         return selective_apply(data, apply_to=self.apply_to, value_map=worker)
 
+    def is_pointwise(self):
+        return True
+
 
 class Rename(Transformation):
     """
@@ -198,6 +212,9 @@ class Rename(Transformation):
     def compute(self, data):
         return data.rename(self.measurement_names)
 
+    def is_pointwise(self):
+        return True
+
 
 class Select(Transformation):
     """
@@ -220,7 +237,11 @@ class Select(Transformation):
                           for measurement in data.data_vars
                           if measurement not in self.measurement_names])
 
+    def is_pointwise(self):
+        return True
+
 
+@functools.lru_cache(maxsize=None)
 def formula_parser():
     return lark.Lark("""
                 ?expr: num_expr | bool_expr
@@ -282,14 +303,123 @@ def formula_parser():
                 """, start='expr')
 
 
-@lark.v_args(inline=True)
-class EvaluateTree(lark.Transformer):
-    from operator import not_, or_, and_, xor
-    from operator import eq, ne, le, ge, lt, gt
-    from operator import add, sub, mul, truediv, floordiv, neg, pos, inv, mod, pow, lshift, rshift
+def _compile_node(op, children):
+    def kernel(env):
+        return op(*[child(env) for child in children])
+
+    return kernel
+
+
+class CompileTree(lark.Transformer):
+    """ Compile a formula tree into a function of the mapping of input arrays. """
+
+    def __default__(self, data, children, meta):
+        if data == 'not_':
+            # logical rather than truth value negation, so that it applies elementwise
+            return _compile_node(numpy.logical_not, children)
+        return _compile_node(getattr(operator, data), children)
+
+    @lark.v_args(inline=True)
+    def var_name(self, key):
+        name = key.value
+        return lambda env: env[name]
+
+    @lark.v_args(inline=True)
+    def float_literal(self, value):
+        value = float(value)
+        return lambda env: value
+
+    @lark.v_args(inline=True)
+    def int_literal(self, value):
+        value = int(value)
+        return lambda env: value
+
+
+class NumexprTree(lark.Transformer):
+    """
+    Translate a formula tree into a ``numexpr`` expression, or ``None`` if that is not possible.
+    Floor division, modulo and shifts are not translated, since their ``numexpr`` semantics
+    differ from ``numpy``.
+    """
+    BINARY = dict(or_='|', xor='^', and_='&',
+                  eq='==', ne='!=', le='<=', ge='>=', lt='<', gt='>',
+                  add='+', sub='-', mul='*', truediv='/', pow='**')
+    UNARY = dict(not_='~', neg='-', pos='+')
+
+    def __default__(self, data, children, meta):
+        if None in children:
+            return None
+
+        if data in self.BINARY:
+            lhs, rhs = children
+            return '({} {} {})'.format(lhs, self.BINARY[data], rhs)
 
-    float_literal = float
-    int_literal = int
+        if data in self.UNARY:
+            value, = children
+            return '({}{})'.format(self.UNARY[data], value)
+
+        return None
+
+    @lark.v_args(inline=True)
+    def var_name(self, key):
+        return key.value
+
+    @lark.v_args(inline=True)
+    def float_literal(self, value):
+        return repr(float(value))
+
+    @lark.v_args(inline=True)
+    def int_literal(self, value):
+        return str(int(value))
+
+
+class Formula:
+    """
+    An arithmetic formula compiled into a vectorised function of its input arrays.
+
+    The formula is parsed once; evaluation only applies the compiled kernel to
+    `numpy` or `dask` arrays. Optionally, formulas on floating point `numpy` inputs
+    are evaluated with ``numexpr`` instead, when it is installed.
+    """
+
+    def __init__(self, formula):
+        self.formula = formula
+
+        tree = formula_parser().parse(formula)
+        self.variables = sorted({token.value
+                                 for token in tree.scan_values(lambda v: isinstance(v, lark.Token))
+                                 if token.type == 'NAME'})
+        self._kernel = CompileTree().transform(tree)
+        self._numexpr = NumexprTree().transform(tree)
+
+    def dtype(self, input_dtypes):
+        """ The ``dtype`` of the result for the given input ``dtype`` of each variable. """
+        result = self._kernel({name: numpy.array([], dtype=input_dtypes[name])
+                               for name in self.variables})
+        return numpy.asarray(result).dtype
+
+    def __call__(self, env, use_numexpr=False):
+        """ Evaluate the formula on the mapping `env` of variable names to arrays. """
+        if use_numexpr and self._numexpr is not None and numexpr is not None:
+            inputs = [env[name] for name in self.variables]
+            if all(isinstance(value, numpy.ndarray) and dtype_is_float(value.dtype) for value in inputs):
+                try:
+                    result = numexpr.evaluate(self._numexpr,
+                                              local_dict={name: env[name] for name in self.variables})
+                except (TypeError, ValueError, NotImplementedError):
+                    # e.g. bitwise operators on floats
+                    return self._kernel(env)
+
+                # numexpr promotes literals to double precision, numpy does not
+                return result.astype(self.dtype({name: env[name].dtype for name in self.variables}), copy=False)
+
+        return self._kernel(env)
+
+
+@functools.lru_cache(maxsize=256)
+def compile_formula(formula):
+    """ Compiled `Formula` object, cached by the text of the formula. """
+    return Formula(formula)
 
 
 class Expressions(Transformation):
@@ -310,7 +440,7 @@ class Expressions(Transformation):
            measurements: [nir, red]
 
     """
-    def __init__(self, output, masked=True):
+    def __init__(self, output, masked=True, use_numexpr=False):
         """
         Initialize transformation.
 
@@ -324,29 +454,36 @@ class Expressions(Transformation):
 
         :param masked:
             Defaults to ``True``. If set to ``False``, the inputs and outputs are not masked for no data.
+
+        :param use_numexpr:
+            Defaults to ``False``. If set to ``True`` and ``numexpr`` is installed, formulas on
+            floating point data loaded without ``dask`` are evaluated using ``numexpr``,
+            which pays off on machines with many cores.
         """
         self.output = output
         self.masked = masked
+        self.use_numexpr = use_numexpr
 
-    def measurements(self, input_measurements):
-        parser = formula_parser()
+        self._formulas = {output_var: compile_formula(output_desc['formula'])
+                          for output_var, output_desc in output.items()
+                          if not isinstance(output_desc, str)}
 
-        @lark.v_args(inline=True)
-        class EvaluateType(EvaluateTree):
-            def var_name(self, key):
-                return numpy.array([], dtype=input_measurements[key.value].dtype)
-
-        ev = EvaluateType()
+        for output_var, formula in self._formulas.items():
+            if not formula.variables:
+                raise VirtualProductException("formula for {} does not refer to any measurement"
+                                              .format(output_var))
 
+    def measurements(self, input_measurements):
         def deduce_type(output_var, output_desc):
             if 'dtype' in output_desc:
                 return numpy.dtype(output_desc['dtype'])
 
-            formula = output_desc['formula']
-            tree = parser.parse(formula)
+            formula = self._formulas[output_var]
+            for name in formula.variables:
+                if name not in input_measurements:
+                    raise VirtualProductException("required measurement {} not found".format(name))
 
-            result = ev.transform(tree)
-            return result.dtype
+            return formula.dtype({name: input_measurements[name].dtype for name in formula.variables})
 
         def measurement(output_var, output_desc):
             if isinstance(output_desc, str):
@@ -361,46 +498,16 @@ class Expressions(Transformation):
                 for output_var, output_desc in self.output.items()}
 
     def compute(self, data):
-        parser = formula_parser()
-
-        @lark.v_args(inline=True)
-        class EvaluateData(EvaluateTree):
-            def var_name(self, key):
-                return data[key.value]
-
-        @lark.v_args(inline=True)
-        class EvaluateNodataMask(lark.Transformer):
-            # the result of an expression is nodata whenever any of its subexpressions is nodata
-            from operator import or_
-
-            # pylint: disable=invalid-name
-            and_ = _xor = or_
-            eq = ne = le = ge = lt = gt = or_
-            add = sub = mul = truediv = floordiv = mod = pow = lshift = rshift = or_
-
-            def not_(self, value):
-                return value
-
-            neg = pos = inv = not_
-
-            @staticmethod
-            def float_literal(value):
-                return False
-
-            @staticmethod
-            def int_literal(value):
-                return False
+        env = {name: value.data for name, value in data.data_vars.items()}
+        invalid = {}
 
-            def var_name(self, key):
-                # pylint: disable=invalid-unary-operand-type
-                return ~valid_data_mask(data[key.value])
-
-        ev_data = EvaluateData()
-        ev_mask = EvaluateNodataMask()
+        def invalid_data(name):
+            # the result of an expression is nodata whenever any of its inputs is nodata
+            if name not in invalid:
+                invalid[name] = invalid_mask(env[name], data[name].attrs.get('nodata'))
+            return invalid[name]
 
         def result(output_var, output_desc):
-            # pylint: disable=invalid-unary-operand-type
-
             if isinstance(output_desc, str):
                 # copy measurement over
                 return data[output_desc]
@@ -408,53 +515,51 @@ class Expressions(Transformation):
             nodata = output_desc.get('nodata')
             dtype = output_desc.get('dtype')
 
-            formula = output_desc['formula']
-            tree = parser.parse(formula)
-            result = ev_data.transform(tree)
-            result.attrs['crs'] = data.attrs['crs']
-            if nodata is not None:
-                result.attrs['nodata'] = nodata
-            result.attrs['units'] = output_desc.get('units', '1')
+            formula = self._formulas[output_var]
+            value = formula(env, use_numexpr=self.use_numexpr)
+            if dtype is not None:
+                value = value.astype(dtype)
 
             if 'masked' in output_desc:
                 masked = output_desc['masked']
             else:
                 masked = self.masked
 
-            if not masked:
-                if dtype is None:
-                    return result
-                return result.astype(dtype)
+            attrs = dict(crs=data.attrs['crs'], units=output_desc.get('units', '1'))
+            if nodata is not None:
+                attrs['nodata'] = nodata
 
-            # masked output
-            if dtype is not None:
-                result = result.astype(dtype)
+            if masked:
+                mask = functools.reduce(operator.or_, [invalid_data(name) for name in formula.variables])
+                dtype = value.dtype
 
-            dtype = result.dtype
-            mask = ev_mask.transform(tree)
+                if dtype == numpy.bool:
+                    # any operation on nodata should evaluate to False
+                    # omission of attrs['nodata'] is deliberate
+                    fill = False
 
-            if numpy.dtype(dtype) == numpy.bool:
-                # any operation on nodata should evaluate to False
-                # omission of attrs['nodata'] is deliberate
-                result = result.where(~mask, False)
+                elif nodata is None:
+                    if not dtype_is_float(dtype):
+                        raise VirtualProductException("cannot mask without specified nodata")
 
-            elif nodata is None:
-                if not dtype_is_float(dtype):
-                    raise VirtualProductException("cannot mask without specified nodata")
+                    fill = numpy.nan
+                    attrs['nodata'] = numpy.nan
 
-                result = result.where(~mask)
-                result.attrs['nodata'] = numpy.nan
+                else:
+                    fill = nodata
 
-            else:
-                result = result.where(~mask, nodata)
-                result.attrs['nodata'] = nodata
+                value = numpy.where(mask, numpy.array(fill, dtype=dtype), value)
 
-            return result
+            template = data[formula.variables[0]]
+            return xarray.DataArray(value, dims=template.dims, coords=template.coords, attrs=attrs)
 
         return xarray.Dataset(data_vars={output_var: result(output_var, output_desc)
                                          for output_var, output_desc in self.output.items()},
                               coords=data.coords, attrs=data.attrs)
 
+    def is_pointwise(self):
+        return True
+
 
 def year(time):
     return time.astype('datetime64[Y]')
@@ -481,9 +586,21 @@ def earliest_time(time):
 class XarrayReduction(Transformation):
     """
     Apply an `xarray` reduction method to the data.
+
+    Used as an ``aggregate``, the methods ``count``, ``sum``, ``mean``, ``min`` and ``max`` (without
+    further arguments) are computed one slice at a time. If ``sample_size`` is specified, so are
+    ``median`` and ``quantile``, approximately: they are computed from a random sample of at most
+    ``sample_size`` valid observations for each pixel. The results are exact for groups with no more
+    than ``sample_size`` observations.
     """
 
-    def __init__(self, method=None, apply_to=None, dtype=None, dim='time', **kwargs):
+    # methods computed exactly from one slice at a time
+    _INCREMENTAL_METHODS = {'count', 'sum', 'mean', 'min', 'max'}
+
+    # methods approximated from a sample of the observations
+    _SAMPLED_METHODS = {'median', 'quantile'}
+
+    def __init__(self, method=None, apply_to=None, dtype=None, dim='time', sample_size=None, **kwargs):
         if method is None:
             raise VirtualProductException("no method specified in xarray reduction")
 
@@ -492,6 +609,7 @@ class XarrayReduction(Transformation):
         self.apply_to = apply_to
         self.dtype = dtype
         self.dim = dim
+        self.sample_size = sample_size
 
     def measurements(self, input_measurements):
         def worker(_, value):
@@ -512,3 +630,101 @@ class XarrayReduction(Transformation):
             return func(value, dim=self.dim, **self.kwargs)
 
         return selective_apply(data, apply_to=self.apply_to, value_map=worker)
+
+    def is_incremental(self):
+        if self.apply_to is not None:
+            return False
+
+        if self.method in self._INCREMENTAL_METHODS:
+            return not self.kwargs
+
+        if self.method in self._SAMPLED_METHODS:
+            return self.sample_size is not None and set(self.kwargs) <= {'q', 'interpolation'}
+
+        return False
+
+    def init(self, data):
+        state = dict(attrs=data.attrs, partial={})
+        return self.update(state, data)
+
+    def update(self, state, data):
+        partial = state['partial']
+        for name, value in data.data_vars.items():
+            partial[name] = self._accumulate(partial.get(name), value)
+        return state
+
+    def finalize(self, state):
+        return xarray.Dataset(data_vars={name: self._result(partial)
+                                         for name, partial in state['partial'].items()},
+                              attrs=state['attrs'])
+
+    def _accumulate(self, partial, value):
+        dim = self.dim
+
+        if self.method in self._SAMPLED_METHODS:
+            if partial is None:
+                template = value.isel(**{dim: 0}, drop=True)
+                partial = dict(template=template,
+                               sample=numpy.full((self.sample_size,) + template.shape, numpy.nan,
+                                                 dtype=_float_dtype(value.dtype)),
+                               seen=numpy.zeros(template.shape, dtype='int64'),
+                               rng=numpy.random.RandomState(0))
+
+            for index in range(value.sizes[dim]):
+                _update_sample(partial, value.isel(**{dim: index}).values)
+            return partial
+
+        if self.method == 'mean':
+            total = value.astype('float64').sum(dim=dim)
+            count = value.count(dim=dim)
+            if partial is None:
+                return dict(total=total, count=count, dtype=_float_dtype(value.dtype))
+            return dict(partial, total=partial['total'] + total, count=partial['count'] + count)
+
+        result = getattr(xarray.DataArray, self.method)(value, dim=dim)
+        if partial is None:
+            return result
+
+        if self.method in ['count', 'sum']:
+            return partial + result
+
+        # fmin and fmax ignore nodata when there is valid data
+        return getattr(numpy, 'f' + self.method)(partial, result)
+
+    def _result(self, partial):
+        if self.method in self._SAMPLED_METHODS:
+            template = partial['template']
+            sample = xarray.DataArray(partial['sample'], dims=('_sample_',) + template.dims,
+                                      coords=template.coords)
+            return getattr(xarray.DataArray, self.method)(sample, dim='_sample_', **self.kwargs)
+
+        if self.method == 'mean':
+            count = partial['count']
+            return (partial['total'] / count.where(count > 0)).astype(partial['dtype'])
+
+        return partial
+
+
+def _float_dtype(dtype):
+    """ The ``dtype`` of the mean (or median) of data of the given ``dtype``. """
+    return numpy.mean(numpy.zeros(1, dtype=dtype)).dtype
+
+
+def _update_sample(partial, values):
+    """
+    Reservoir sampling of the valid `values` of each pixel: once a pixel has been seen ``n`` times,
+    its sample holds a uniformly random subset of its observations of at most the sample size.
+    """
+    sample, rng = partial['sample'], partial['rng']
+    size = sample.shape[0]
+
+    valid = ~numpy.isnan(values) if dtype_is_float(values.dtype) else numpy.ones(values.shape, dtype='bool')
+    seen = partial['seen'] = partial['seen'] + valid
+
+    # the next free slot while there is one, then a random position that may be outside the sample
+    position = numpy.where(seen <= size, seen - 1, (rng.random_sample(seen.shape) * seen).astype('int64'))
+    replace = valid & (position < size)
+    position = numpy.clip(position, 0, size - 1)[numpy.newaxis]
+
+    current = numpy.take_along_axis(sample, position, axis=0)[0]
+    numpy.put_along_axis(sample, position, numpy.where(replace, values, current)[numpy.newaxis], axis=0)
@@ -53,6 +53,10 @@ def make_ncml_tasks(index, config, cell_index=None, year=None, cell_index_list=N
                        output_filename=output_filename)
 
 
+def ncml_task_id(task):
+    return task['output_filename']
+
+
 def make_ncml_config(index, config, export_path=None, nested_years=None, **query):
     config['product'] = index.products.get_by_name(config['output_type'])
 
@@ -157,6 +161,7 @@ command_options = datacube.ui.click.compose(
     task_app.queue_size_option,
     task_app.load_tasks_option,
     task_app.save_tasks_option,
+    task_app.journal_option,
     datacube.ui.click.executor_cli_options,
     click.option('--export-path', 'export_path',
                  help='Write the stacked files to an external location instead of the location in the app config',
@@ -168,8 +173,8 @@ command_options = datacube.ui.click.compose(
 @ncml_app.command(short_help='Create an ncml file')
 @command_options
 @click.argument('app_config')
-@task_app.task_app(make_config=make_ncml_config, make_tasks=make_ncml_tasks)
-def full(index, config, tasks, executor, queue_size, **kwargs):
+@task_app.task_app(make_config=make_ncml_config, make_tasks=make_ncml_tasks, task_id=ncml_task_id)
+def full(index, config, tasks, executor, queue_size, journal=None, **kwargs):
     """Create ncml files for the full time depth of the product
 
     e.g. datacube-ncml full <app_config_yaml>
@@ -177,15 +182,15 @@ def full(index, config, tasks, executor, queue_size, **kwargs):
     click.echo('Starting datacube ncml utility...')
 
     task_func = partial(do_ncml_task, config)
-    task_app.run_tasks(tasks, executor, task_func, None, queue_size)
+    task_app.run_tasks(tasks, executor, task_func, None, queue_size, journal=journal, task_id=ncml_task_id)
 
 
 @ncml_app.command(short_help='Create a full ncml file with nested ncml files for particular years')
 @command_options
 @click.argument('app_config')
 @click.argument('nested_years', nargs=-1, type=click.INT)
-@task_app.task_app(make_config=make_ncml_config, make_tasks=make_ncml_tasks)
-def nest(index, config, tasks, executor, queue_size, **kwargs):
+@task_app.task_app(make_config=make_ncml_config, make_tasks=make_ncml_tasks, task_id=ncml_task_id)
+def nest(index, config, tasks, executor, queue_size, journal=None, **kwargs):
     """Create ncml files for the full time, with nested ncml files covering the given years
 
     e.g. datacube-ncml nest <app_config_yaml> 2016 2017
@@ -196,15 +201,15 @@ def nest(index, config, tasks, executor, queue_size, **kwargs):
     click.echo('Starting datacube ncml utility...')
 
     task_func = partial(do_ncml_task, config)
-    task_app.run_tasks(tasks, executor, task_func, None, queue_size)
+    task_app.run_tasks(tasks, executor, task_func, None, queue_size, journal=journal, task_id=ncml_task_id)
 
 
 @ncml_app.command(short_help='Update a single year ncml file')
 @command_options
 @click.argument('app_config')
 @click.argument('year', type=click.INT)
-@task_app.task_app(make_config=make_ncml_config, make_tasks=make_ncml_tasks)
-def update(index, config, tasks, executor, queue_size, **kwargs):
+@task_app.task_app(make_config=make_ncml_config, make_tasks=make_ncml_tasks, task_id=ncml_task_id)
+def update(index, config, tasks, executor, queue_size, journal=None, **kwargs):
     """Update a single year ncml file
 
     e.g datacube-ncml <app_config_yaml> 1996
@@ -214,7 +219,7 @@ def update(index, config, tasks, executor, queue_size, **kwargs):
     click.echo('Starting datacube ncml utility...')
 
     task_func = partial(do_ncml_task, config)
-    task_app.run_tasks(tasks, executor, task_func, None, queue_size)
+    task_app.run_tasks(tasks, executor, task_func, None, queue_size, journal=journal, task_id=ncml_task_id)
 
 
 if __name__ == '__main__':
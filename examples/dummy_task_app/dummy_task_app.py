@@ -63,6 +63,12 @@ def make_tasks(db_index, config, **opts):
         yield {'val': i}
 
 
+def task_id(task):
+    """ Stable id of a task, so that runs with ``--journal`` can be resumed
+    """
+    return task['val']
+
+
 def run_task(task, op):
     """ Runs across multiple cpus/nodes
     """
@@ -89,7 +95,7 @@ def run_task(task, op):
 @ui.pass_index(app_name=APP_NAME)
 @task_app_options
 @click.option('--num-tasks', type=int, help='Sample argument: number of tasks to generate')
-@task_app(make_config=make_config, make_tasks=make_tasks)
+@task_app(make_config=make_config, make_tasks=make_tasks, task_id=task_id)
 def app_main(db_index, config, tasks, executor, **opts):
     """
     make_config => config
@@ -106,7 +112,7 @@ def app_main(db_index, config, tasks, executor, **opts):
         len(dumps(task_runner))
     ))
 
-    run_tasks(tasks, executor, task_runner, queue_size=10)
+    run_tasks(tasks, executor, task_runner, queue_size=10, journal=opts.get('journal'), task_id=task_id)
 
     return 0
 
@@ -218,6 +218,21 @@ def test_get_missing_things(index: Index) -> None:
     assert missing_thing is None, "get() should return none when it doesn't exist"
 
 
+def test_bulk_add_datasets(index, default_metadata_type):
+    type_ = index.products.add_document(_pseudo_telemetry_dataset_type)
+
+    parent = Dataset(type_, _telemetry_dataset.copy(), None, sources={})
+    child_doc = _telemetry_dataset.copy()
+    child_doc['lineage'] = {'source_datasets': {'source': _telemetry_dataset}}
+    child_doc['id'] = '051a003f-5bba-43c7-b5f1-7f1da3ae9cfb'
+    child = Dataset(type_, child_doc, sources={'source': parent})
+
+    assert index.datasets.bulk_add([parent, child]) == 2
+    assert index.datasets.bulk_add([parent, child]) == 0
+
+    assert index.datasets.get(child.id, include_sources=True).sources['source'].id == parent.id
+
+
 def test_index_dataset_with_sources(index, default_metadata_type):
     type_ = index.products.add_document(_pseudo_telemetry_dataset_type)
 
@@ -237,6 +252,14 @@ def test_index_dataset_with_sources(index, default_metadata_type):
 
     assert len(index.datasets.bulk_get([parent.id, child.id])) == 2
 
+    with_lineage = index.datasets.bulk_get([child.id, parent.id], include_sources=True)
+    assert [ds.id for ds in with_lineage] == [child.id, parent.id]
+    assert with_lineage[0].sources['source'] is with_lineage[1]
+    assert with_lineage[0].metadata.sources['source']['id'] == str(parent.id)
+
+    not_derived = index.datasets.search_eager(product=type_.name, not_derived_by=type_.name)
+    assert [ds.id for ds in not_derived] == [child.id]
+
     index.datasets.add(child, with_lineage=False)
     index.datasets.add(child, with_lineage=True)
 
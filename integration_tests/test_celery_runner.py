@@ -3,6 +3,7 @@ Tests for datacube._celery_runner
 """
 
 from time import sleep
+import os
 import subprocess
 import pytest
 import sys
@@ -151,3 +152,117 @@ def test_celery_with_worker():
     # Redis shouldn't be running now.
     is_running = cr.check_redis(port=PORT)
     assert is_running is False
+
+
+def test_pack_result(tmpdir):
+    data = list(range(1000))
+
+    packed = cr._pack_result(data)
+    assert packed.path is None
+    assert cr._unpack_result(packed) == data
+
+    packed = cr._pack_result(data, compress=True)
+    assert len(packed.data) < len(cr._pack_result(data).data)
+    assert cr._unpack_result(packed) == data
+
+    # small results stay inline
+    packed = cr._pack_result(1, compress=True, offload_dir=str(tmpdir), offload_threshold=1000)
+    assert packed.path is None
+    assert cr._unpack_result(packed) == 1
+
+    packed = cr._pack_result(data, compress=True, offload_dir=str(tmpdir), offload_threshold=1000)
+    assert packed.data is None
+    assert tmpdir.listdir() == [tmpdir.join(os.path.basename(packed.path))]
+    assert cr._unpack_result(packed) == data
+    assert tmpdir.listdir() == []
+
+    assert cr._unpack_result('not packed') == 'not packed'
+
+
+def test_get_ready_batched(monkeypatch):
+    from celery import Celery, states
+    from celery.result import AsyncResult
+
+    app = Celery('test_get_ready_batched', backend='cache+memory://')
+    app.conf.update(result_serializer='cloudpickle', accept_content=['cloudpickle'])
+    backend = app.backend
+
+    futures = [AsyncResult('task-{}'.format(i), app=app) for i in range(2500)]
+    for i, future in enumerate(futures):
+        if i % 3 == 0:
+            backend.store_result(future.id, cr._pack_result(i), states.SUCCESS)
+        elif i % 3 == 1:
+            backend.mark_as_failure(future.id, IOError('Fake I/O error'))
+
+    requests = []
+    mget = backend.mget
+    monkeypatch.setattr(backend, 'mget', lambda keys: requests.append(keys) or mget(keys))
+
+    completed, failed, pending = cr.CeleryExecutor.get_ready(futures)
+    assert len(requests) == 3
+    assert (len(completed), len(failed), len(pending)) == (834, 833, 833)
+    assert completed[:2] == futures[0:4:3]
+
+    assert cr.CeleryExecutor.results(completed[:2]) == [0, 3]
+    assert cr.CeleryExecutor.result(completed[-1]) == 2499
+    with pytest.raises(IOError):
+        cr.CeleryExecutor.result(failed[0])
+
+
+def _make_array(size, seed):
+    import numpy as np
+    return np.full(size, seed, dtype='int32')
+
+
+@pytest.mark.timeout(300)
+@pytest.mark.skipif(sys.platform == 'win32',
+                    reason="does not run on Windows")
+@skip_if_no_redis
+def test_celery_stress(tmpdir):
+    num_tasks = 2000
+    offload_dir = tmpdir.mkdir('results')
+
+    assert cr.check_redis(port=PORT, password='') is False, "Redis should not be running at the start of the test"
+    redis_stop = cr.launch_redis(PORT, password='')
+    assert redis_stop
+    sleep(REDIS_WAIT)
+
+    try:
+        runner = cr.CeleryExecutor(host='localhost', port=PORT, password='',
+                                   compress_results=True, offload_dir=str(offload_dir), offload_threshold=10000)
+
+        subprocess.check_call(['bash', '-c',
+                               'nohup {} -m datacube.execution.worker --executor celery localhost:{} --nprocs 4 &'.format(
+                                   sys.executable, PORT)])
+
+        # a mix of small results, large results offloaded to files, and failures
+        futures = [runner.submit(_make_array, 100000 if i % 10 == 0 else 10, i) if i % 100 != 99
+                   else runner.submit(_echo, i, please_fail=True)
+                   for i in range(num_tasks)]
+
+        positions = {future.id: i for i, future in enumerate(futures)}
+        results = {}
+        num_failed = 0
+        pending = futures
+        while pending:
+            completed, failed, pending = runner.wait_ready(pending, timeout=60)
+            assert completed or failed, "No progress in 60 seconds"
+
+            for future, result in zip(completed, runner.results(completed)):
+                results[positions[future.id]] = result
+            num_failed += len(failed)
+            for future in completed + failed:
+                runner.release(future)
+
+        assert num_failed == num_tasks // 100
+        assert len(results) == num_tasks - num_failed
+        for i, result in results.items():
+            assert result.shape == (100000 if i % 10 == 0 else 10,)
+            assert (result == i).all()
+
+        # offloaded results are removed once read
+        assert offload_dir.listdir() == []
+    finally:
+        cr.app.control.shutdown()
+        sleep(1)
+        redis_stop()
@@ -93,12 +93,17 @@ def test_process_all_ingest_jobs(clirunner, index, tmpdir, example_ls5_dataset_p
     ensure_datasets_are_indexed(index, valid_uuids)
 
     # Ingest all scenes (Though the queue size is 2, all 3 tiles will be ingested)
+    # in tasks of two tiles, reading ahead of writing
     clirunner([
         'ingest',
         '--config-file',
         str(config_path),
         '--queue-size',
         queue_size,
+        '--tiles-per-task',
+        2,
+        '--read-ahead',
+        2,
         '--allow-product-changes',
     ])
 
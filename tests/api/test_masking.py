@@ -7,10 +7,16 @@ import numpy as np
 from datacube.utils.masking import (
     list_flag_names,
     create_mask_value,
+    create_mask_values,
+    make_mask,
+    flags_lookup_table,
     describe_variable_flags,
     mask_to_dict,
     mask_invalid_data,
     valid_data_mask,
+    mask_with_nodata,
+    dilate_mask,
+    erode_mask,
 )
 
 
@@ -71,6 +77,68 @@ def test_create_multi_mask_value():
         create_mask_value(multi_flags_def, water_confidence='invalid enum value')
 
 
+def test_create_mask_values():
+    multi_flags_def = VariableWithMultiBitFlags().flags_definition
+
+    assert create_mask_values(multi_flags_def, water_confidence='water') == (0b011000, (0b011000,))
+    assert create_mask_values(multi_flags_def, water_confidence=['water', 'no_water'], filled=True) == (
+        0b011001, (0b01001, 0b11001))
+    assert create_mask_values(multi_flags_def,
+                              water_confidence=['water', 'no_water'],
+                              veg_confidence=['maybe_veg', 'not_determined']) == (
+        0b110011000, (0b000001000, 0b000011000, 0b100001000, 0b100011000))
+
+    with pytest.raises(ValueError):
+        create_mask_values(multi_flags_def, water_confidence=[])
+
+    with pytest.raises(ValueError):
+        create_mask_values(multi_flags_def, water_confidence=['water', 'invalid enum value'])
+
+
+@pytest.mark.parametrize('dtype', ['uint8', 'int16', 'uint16', 'int32'])
+@pytest.mark.parametrize('water_confidence', [['water', 'maybe_water'], ['water', 'maybe_water', 'no_water']])
+def test_make_mask_any_of(dtype, water_confidence):
+    import dask.array as da
+
+    multi_var = VariableWithMultiBitFlags()
+
+    info = np.iinfo(dtype)
+    values = np.random.RandomState(0).randint(max(info.min, -2**15), min(info.max, 2**15 - 1),
+                                              size=(3, 50, 40)).astype(dtype)
+    var = DataArray(values, dims=('time', 'y', 'x'), name='pq',
+                    attrs={'flags_definition': multi_var.flags_definition})
+
+    expected = np.zeros(values.shape, dtype='bool')
+    for value in water_confidence:
+        expected |= make_mask(var, water_confidence=value, filled=True).values
+    assert expected.any() and not expected.all()
+
+    result = make_mask(var, water_confidence=water_confidence, filled=True)
+    assert result.dtype == np.bool_
+    assert result.name == 'pq' and result.dims == var.dims
+    np.testing.assert_array_equal(result.values, expected)
+
+    lazy = make_mask(var.copy(data=da.from_array(values, chunks=(1, 20, 20))),
+                     water_confidence=water_confidence, filled=True)
+    assert isinstance(lazy.data, da.Array)
+    np.testing.assert_array_equal(lazy.values, expected)
+
+    dataset = make_mask(var.to_dataset(), water_confidence=water_confidence, filled=True)
+    np.testing.assert_array_equal(dataset.pq.values, expected)
+
+
+def test_flags_lookup_table():
+    lut = flags_lookup_table('int8', 0b1000_0001, (0b1000_0000, 0b1))
+    assert lut[0b1000_0000] and lut[0b1] and not lut[0b1000_0001] and not lut[0]
+    assert flags_lookup_table('uint8', 0b1000_0001, [0b1, 0b1000_0000]) is lut
+    assert flags_lookup_table('uint16', 0b1000_0001, (0b1000_0000, 0b1)).shape == (2**16,)
+
+    assert flags_lookup_table('int32', 0b1, (0b1,)) is None
+    assert flags_lookup_table('float32', 0b1, (0b1,)) is None
+    # mask bits outside the range of the data type
+    assert flags_lookup_table('uint8', 1 << 9, (0,)) is None
+
+
 def test_ga_good_pixel(simple_var):
     bits_def = simple_var.flags_definition
 
@@ -430,6 +498,68 @@ def test_valid_data_mask():
         valid_data_mask(([], []))
 
 
+def disk_dilation(mask, radius):
+    """ Reference dilation, OR of the mask shifted to every offset within the disk """
+    ny, nx = mask.shape[-2:]
+    padded = np.pad(mask, [(0, 0)] * (mask.ndim - 2) + [(radius, radius), (radius, radius)])
+    result = np.zeros_like(mask)
+    for dy in range(-radius, radius + 1):
+        for dx in range(-radius, radius + 1):
+            if dx * dx + dy * dy <= (radius + 0.5) ** 2:
+                result |= padded[..., radius + dy:radius + dy + ny, radius + dx:radius + dx + nx]
+    return result
+
+
+@pytest.mark.parametrize('shape', [(3, 37, 53), (1, 5, 9), (64, 64), (1, 1, 17)])
+@pytest.mark.parametrize('radius', [0, 1, 2, 5, 11])
+def test_dilate_erode_mask(shape, radius):
+    rng = np.random.RandomState(radius)
+
+    mask = rng.rand(*shape) > 0.97
+    result = dilate_mask(mask, radius)
+    assert result.dtype == np.bool_ and result.shape == mask.shape
+    np.testing.assert_array_equal(result, disk_dilation(mask, radius))
+
+    valid = rng.rand(*shape) > 0.03
+    result = erode_mask(valid, radius)
+    assert result.dtype == np.bool_ and result.shape == valid.shape
+    np.testing.assert_array_equal(result, ~disk_dilation(~valid, radius))
+
+
+def test_mask_with_nodata():
+    import dask.array as da
+
+    values = np.arange(12, dtype='uint16').reshape(3, 4)
+    keep = values % 3 != 0
+    data = DataArray(values.copy(), dims=('y', 'x'), attrs={'nodata': 65535, 'units': '1'})
+    mask = DataArray(keep, dims=('y', 'x'))
+    expected = np.where(keep, values, 65535).astype('uint16')
+
+    result = mask_with_nodata(data, mask)
+    assert result.dtype == np.uint16 and result.attrs == data.attrs
+    np.testing.assert_array_equal(result.values, expected)
+    np.testing.assert_array_equal(data.values, values)
+
+    lazy = mask_with_nodata(data.copy(data=da.from_array(values, chunks=2)), mask)
+    assert isinstance(lazy.data, da.Array) and lazy.dtype == np.uint16
+    np.testing.assert_array_equal(lazy.values, expected)
+
+    # mask is broadcast over time
+    stacked = DataArray(np.stack([values, values]), dims=('time', 'y', 'x'), attrs=data.attrs)
+    result = mask_with_nodata(stacked, mask, inplace=True)
+    assert result is stacked
+    np.testing.assert_array_equal(stacked.values, np.stack([expected, expected]))
+
+    result = mask_with_nodata(data.astype('float32'), mask, nodata=np.nan, inplace=True)
+    assert result.dtype == np.float32 and np.isnan(result.values[~keep]).all()
+
+    with pytest.raises(ValueError):
+        mask_with_nodata(data, mask, nodata=-999)
+
+    with pytest.raises(ValueError):
+        mask_with_nodata(data.assign_attrs(nodata=None), mask)
+
+
 def test_deprecation():
     from datacube.storage.masking import make_mask as a
     from datacube.utils.masking import make_mask as b
@@ -79,6 +79,10 @@ def test_query_kwargs():
     query = Query(index=mock_index, time=('2001', '2002'))
     assert 'time' in query.search
 
+    query = Query(index=mock_index, product='ls5_nbar_albers', not_derived_by='ls5_nbar_tiled')
+    assert query.search_terms['not_derived_by'] == 'ls5_nbar_tiled'
+    assert 'not_derived_by' not in query.search
+
     with pytest.raises(ValueError):
         Query(index=mock_index,
               y=-4174726, coordinate_reference_system='WGS84',
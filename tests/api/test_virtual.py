@@ -1,17 +1,21 @@
 from collections import OrderedDict
 from datetime import datetime
 from copy import deepcopy
+import time
 import warnings
 
 import pytest
 import mock
 import numpy
+import xarray
+import dask.array
 
 from datacube.model import DatasetType, MetadataType, Dataset, GridSpec
 from datacube.utils import geometry
 from datacube.virtual import construct_from_yaml, catalog_from_yaml, VirtualProductException
 from datacube.virtual import DEFAULT_RESOLVER, Transformation
 from datacube.virtual.impl import Datacube
+from datacube.virtual.utils import reject_keys
 
 
 ##########################################
@@ -487,3 +491,471 @@ def test_register(dc, query):
         data = bluegreen.load(dc, **query)
 
     assert 'bluegreen' in data
+
+
+def random_load_data(*args, **kwargs):
+    result = load_data(*args, **kwargs)
+    rng = numpy.random.RandomState(0)
+    for name, value in result.data_vars.items():
+        if name == 'pixelquality':
+            value.values[:] = rng.randint(0, 1 << 14, size=value.shape)
+        else:
+            value.values[:] = rng.randint(-999, 10000, size=value.shape)
+
+    dask_chunks = kwargs.get('dask_chunks')
+    if dask_chunks is not None:
+        result = result.chunk(dask_chunks)
+    return result
+
+
+def per_observation_load_data(*args, **kwargs):
+    """
+    Like `random_load_data`, with some nodata, but the same observation gets the same data
+    whether it is loaded on its own or together with others.
+    """
+    result = load_data(*args, **kwargs)
+    for index, time in enumerate(result.time.values):
+        rng = numpy.random.RandomState(time.astype('datetime64[s]').astype('int64') % (1 << 32))
+        for value in result.data_vars.values():
+            values = rng.randint(-999, 10000, size=value.shape[1:])
+            values[rng.random_sample(values.shape) < 0.2] = value.nodata
+            value.values[index] = values
+    return result
+
+
+@pytest.mark.parametrize('load_settings', [{'fuse_transforms': (7, 5)},
+                                           {'fuse_transforms': True, 'dask_chunks': {'x': 8, 'y': 8}}])
+def test_fused_transforms(dc, query, catalog, load_settings):
+    ndvi_like = construct_from_yaml("""
+        transform: expressions
+        output:
+            ratio:
+                formula: (blue - green) / (blue + green)
+                dtype: float32
+            green: green
+        input:
+            transform: to_float
+            input:
+                transform: apply_mask
+                mask_measurement_name: pixelquality
+                input:
+                    transform: make_mask
+                    flags:
+                        contiguous: true
+                    mask_measurement_name: pixelquality
+                    input:
+                        juxtapose:
+                          - product: ls8_nbar_albers
+                            measurements: ['blue', 'green']
+                          - product: ls8_pq_albers
+    """)
+
+    with mock.patch('datacube.virtual.impl.Datacube') as mock_datacube:
+        mock_datacube.load_data = random_load_data
+        mock_datacube.group_datasets = group_datasets
+        expected = ndvi_like.load(dc, **query, **reject_keys(load_settings, ['fuse_transforms']))
+        data = ndvi_like.load(dc, **query, **load_settings)
+
+    assert set(data.data_vars) == {'ratio', 'green'}
+    assert data.ratio.dtype == expected.ratio.dtype
+    assert data.ratio.dims == expected.ratio.dims
+    assert data.attrs['crs'] == expected.attrs['crs']
+    assert numpy.isnan(expected.ratio.values).any() and not numpy.isnan(expected.ratio.values).all()
+    numpy.testing.assert_array_equal(data.ratio.values, expected.ratio.values)
+    numpy.testing.assert_array_equal(data.green.values, expected.green.values)
+
+    # dilation depends on the neighbourhood, so it must not be fused
+    cloud_free = catalog['cloud_free_ls8_nbar']
+    assert [type(t).__name__ for t in cloud_free._pointwise_chain()[0]] == ['MakeMask', 'ApplyMask']
+    dilated = construct_from_yaml("""
+        transform: apply_mask
+        mask_measurement_name: pixelquality
+        dilation: 1
+        input:
+            product: ls8_pq_albers
+    """)
+    assert dilated._pointwise_chain()[0] == []
+
+
+def test_compiled_formula():
+    from datacube.virtual import transformations
+    from datacube.virtual.transformations import compile_formula
+
+    formula = compile_formula('(nir - red) / (nir + red) * 2.5')
+    assert formula is compile_formula('(nir - red) / (nir + red) * 2.5')
+    assert formula.variables == ['nir', 'red']
+    assert formula.dtype({'nir': 'int16', 'red': 'int16'}) == numpy.dtype('float64')
+    assert formula.dtype({'nir': 'float32', 'red': 'float32'}) == numpy.dtype('float32')
+
+    rng = numpy.random.RandomState(1)
+    env = {'nir': rng.uniform(1, 10, (5, 7)).astype('float32'),
+           'red': rng.uniform(1, 10, (5, 7)).astype('float32')}
+    expected = (env['nir'] - env['red']) / (env['nir'] + env['red']) * 2.5
+
+    numpy.testing.assert_array_equal(formula(env), expected)
+
+    if transformations.numexpr is not None:
+        result = formula(env, use_numexpr=True)
+        assert result.dtype == expected.dtype
+        numpy.testing.assert_allclose(result, expected, rtol=1e-6)
+
+    with mock.patch.object(transformations, 'numexpr', None):
+        numpy.testing.assert_array_equal(formula(env, use_numexpr=True), expected)
+
+    dask_env = {name: dask.array.from_array(value, chunks=3) for name, value in env.items()}
+    numpy.testing.assert_array_equal(formula(dask_env).compute(), expected)
+
+    # not translated to numexpr, and `not` applies elementwise
+    numpy.testing.assert_array_equal(compile_formula('not (nir // 2 > red)')(env),
+                                     ~(env['nir'] // 2 > env['red']))
+
+    with pytest.raises(VirtualProductException):
+        construct_from_yaml("""
+            transform: expressions
+            output:
+                constant:
+                    formula: 1 + 2
+            input:
+                product: ls8_nbar_albers
+        """)._transformation
+
+
+@pytest.mark.parametrize('method,options', [('mean', ''), ('sum', ''), ('min', ''), ('max', ''), ('count', ''),
+                                            ('median', 'sample_size: 2'),
+                                            ('quantile', 'sample_size: 5\n        q: [0.1, 0.9]')])
+def test_incremental_aggregate(dc, query, method, options):
+    aggr = construct_from_yaml("""
+        aggregate: xarray_reduction
+        method: {}
+        {}
+        group_by: month
+        input:
+            transform: to_float
+            input:
+                collate:
+                  - product: ls7_nbar_albers
+                    measurements: [blue]
+                  - product: ls8_nbar_albers
+                    measurements: [blue]
+    """.format(method, options))
+
+    assert aggr._statistic.is_incremental()
+
+    with mock.patch('datacube.virtual.impl.Datacube') as mock_datacube, warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        mock_datacube.load_data = per_observation_load_data
+        mock_datacube.group_datasets = group_datasets
+
+        with mock.patch('datacube.virtual.transformations.XarrayReduction.is_incremental',
+                        return_value=False):
+            expected = aggr.load(dc, **query)
+
+        mock_datacube.load_data = mock.Mock(side_effect=per_observation_load_data)
+        data = aggr.load(dc, **query)
+
+    # one load for each of the three observations
+    assert mock_datacube.load_data.call_count == 3
+    assert all(call[0][0].time.shape == (1,) for call in mock_datacube.load_data.call_args_list)
+
+    assert data.blue.dims == expected.blue.dims
+    assert data.blue.dtype == expected.blue.dtype
+    numpy.testing.assert_allclose(data.blue.values, expected.blue.values, rtol=1e-6)
+
+
+def test_reservoir_sample():
+    from datacube.virtual.transformations import _update_sample
+
+    partial = dict(sample=numpy.full((10, 3, 4), numpy.nan),
+                   seen=numpy.zeros((3, 4), dtype='int64'),
+                   rng=numpy.random.RandomState(0))
+
+    for index in range(100):
+        values = numpy.full((3, 4), float(index))
+        values[0, 0] = numpy.nan
+        values[1, :] = numpy.nan if index % 2 else index
+        _update_sample(partial, values)
+
+    sample, seen = partial['sample'], partial['seen']
+    assert seen[0, 0] == 0 and numpy.isnan(sample[:, 0, 0]).all()
+    assert (seen[1] == 50).all() and (sample[:, 1] % 2 == 0).all()
+    assert seen[2, 3] == 100
+
+    for pixel in sample.reshape(10, -1).T[1:]:
+        # distinct observations, not just the first ones
+        assert len(set(pixel)) == 10 and pixel.max() >= 10
+
+
+def test_reproject(dc, query):
+    reproject = construct_from_yaml("""
+        reproject:
+            output_crs: EPSG:3857
+            resolution: [-30, 30]
+        resampling: nearest
+        input:
+            product: ls8_nbar_albers
+            measurements: [blue]
+    """)
+
+    with mock.patch('datacube.virtual.impl.Datacube') as mock_datacube:
+        mock_datacube.load_data = random_load_data
+        mock_datacube.group_datasets = group_datasets
+        data = reproject.load(dc, **query)
+        lazy = reproject.load(dc, dask_chunks={'time': 1, 'x': 20, 'y': 20}, **query)
+
+    assert data.blue.geobox.crs == 'EPSG:3857'
+    assert (data.blue.values != -999).any()
+    assert lazy.blue.data.chunks[1][0] == 20
+    numpy.testing.assert_array_equal(lazy.blue.values, data.blue.values)
+
+
+def test_collate_reproject_lazy(dc, query):
+    collated = construct_from_yaml("""
+        collate:
+          - reproject:
+                output_crs: EPSG:3857
+                resolution: [-30, 30]
+            input:
+                product: ls8_nbar_albers
+                measurements: [blue]
+          - reproject:
+                output_crs: EPSG:3857
+                resolution: [-30, 30]
+            input:
+                product: ls7_nbar_albers
+                measurements: [blue]
+        index_measurement_name: source_index
+    """)
+
+    with mock.patch('datacube.virtual.impl.Datacube') as mock_datacube:
+        mock_datacube.load_data = random_load_data
+        mock_datacube.group_datasets = group_datasets
+        data = collated.load(dc, **query)
+        lazy = collated.load(dc, dask_chunks={'time': 1, 'x': 20, 'y': 20}, **query)
+
+    for name in ['blue', 'source_index']:
+        assert isinstance(lazy[name].data, dask.array.Array)
+        assert lazy[name].data.chunks == lazy.blue.data.chunks
+        numpy.testing.assert_array_equal(lazy[name].values, data[name].values)
+    assert lazy.source_index.attrs == dict(units='1', nodata=-1)
+
+
+@pytest.mark.parametrize('fetch_threads', [4, 'executor'])
+def test_concurrent_fetch(cloud_free_nbar, dc, query, fetch_threads):
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+
+    # each of the two collated children loads two products, one after the other
+    barrier = threading.Barrier(2, timeout=10)
+    threads = set()
+
+    def concurrent_load_data(*args, **kwargs):
+        threads.add(threading.get_ident())
+        barrier.wait()
+        return random_load_data(*args, **kwargs)
+
+    with mock.patch('datacube.virtual.impl.Datacube') as mock_datacube:
+        mock_datacube.group_datasets = group_datasets
+
+        mock_datacube.load_data = random_load_data
+        expected = cloud_free_nbar.load(dc, **query)
+
+        mock_datacube.load_data = concurrent_load_data
+        if fetch_threads == 'executor':
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                data = cloud_free_nbar.load(dc, fetch_threads=pool, **query)
+        else:
+            data = cloud_free_nbar.load(dc, fetch_threads=fetch_threads, **query)
+
+    assert len(threads) == 2 and threading.get_ident() not in threads
+    assert data.equals(expected)
+
+
+def test_load_cache(dc, query):
+    from datacube.virtual.impl import LoadCache
+
+    shared = construct_from_yaml("""
+        juxtapose:
+          - product: ls8_nbar_albers
+            measurements: [blue]
+          - transform: expressions
+            output:
+                bright:
+                    formula: blue > 0
+            input:
+                product: ls8_nbar_albers
+                measurements: [blue]
+    """)
+
+    with mock.patch.object(dc.index.datasets, 'search', side_effect=dc.index.datasets.search) as search, \
+            mock.patch('datacube.virtual.impl.Datacube') as mock_datacube:
+        mock_datacube.group_datasets = group_datasets
+
+        mock_datacube.load_data = mock.Mock(side_effect=random_load_data)
+        expected = shared.load(dc, load_cache=None, **query)
+        assert search.call_count == 2 and mock_datacube.load_data.call_count == 2
+
+        search.reset_mock()
+        mock_datacube.load_data.reset_mock()
+        cache = LoadCache.for_recipe(shared)
+        data = shared.load(dc, load_cache=cache, **query)
+        assert search.call_count == 1 and mock_datacube.load_data.call_count == 1
+
+    assert data.equals(expected)
+    # the band is released once both references have used it
+    assert not cache._reads
+
+
+def test_load_cache_masked_in_place(dc, query):
+    from datacube.virtual.impl import LoadCache
+
+    masked = construct_from_yaml("""
+        juxtapose:
+          - product: ls8_nbar_albers
+            measurements: [blue]
+          - transform: rename
+            measurement_names:
+                blue: masked_blue
+            input:
+                transform: apply_mask
+                mask_measurement_name: bright
+                inplace: true
+                input:
+                    transform: expressions
+                    output:
+                        blue: blue
+                        bright:
+                            formula: blue > 5000
+                    input:
+                        product: ls8_nbar_albers
+                        measurements: [blue]
+    """)
+
+    with mock.patch('datacube.virtual.impl.Datacube') as mock_datacube:
+        mock_datacube.group_datasets = group_datasets
+        mock_datacube.load_data = mock.Mock(side_effect=random_load_data)
+
+        expected = masked.load(dc, load_cache=None, **query)
+        data = masked.load(dc, load_cache=LoadCache.for_recipe(masked), **query)
+        assert mock_datacube.load_data.call_count == 3
+
+    assert (expected.masked_blue != expected.blue).any()
+    assert data.equals(expected)
+
+
+def test_load_cache_concurrent(dc, query):
+    from datacube.virtual.impl import LoadCache
+
+    shared = construct_from_yaml("""
+        juxtapose:
+          - product: ls8_nbar_albers
+            measurements: [blue]
+          - transform: rename
+            measurement_names:
+                blue: masked_blue
+            input:
+                transform: apply_mask
+                mask_measurement_name: bright
+                inplace: true
+                input:
+                    transform: expressions
+                    output:
+                        blue: blue
+                        bright:
+                            formula: blue > 5000
+                    input:
+                        product: ls8_nbar_albers
+                        measurements: [blue]
+          - transform: expressions
+            output:
+                bright:
+                    formula: blue > 0
+            input:
+                product: ls8_nbar_albers
+                measurements: [blue]
+    """)
+
+    def slow(func):
+        def wrapped(*args, **kwargs):
+            # keeps the first caller busy while the others arrive
+            time.sleep(0.2)
+            return func(*args, **kwargs)
+        return wrapped
+
+    with mock.patch('datacube.virtual.impl.Datacube') as mock_datacube:
+        mock_datacube.group_datasets = group_datasets
+        mock_datacube.load_data = mock.Mock(side_effect=random_load_data)
+        expected = shared.load(dc, load_cache=None, **query)
+
+    with mock.patch.object(dc.index.datasets, 'search', side_effect=slow(dc.index.datasets.search)) as search, \
+            mock.patch('datacube.virtual.impl.Datacube') as mock_datacube:
+        mock_datacube.group_datasets = group_datasets
+        mock_datacube.load_data = mock.Mock(side_effect=slow(random_load_data))
+
+        cache = LoadCache.for_recipe(shared)
+        data = shared.load(dc, load_cache=cache, fetch_threads=3, **query)
+        assert search.call_count == 1 and mock_datacube.load_data.call_count == 1
+
+    assert data.equals(expected)
+    assert not cache._reads
+
+
+@pytest.mark.parametrize('options', [dict(), dict(inplace=True), dict(dilation=2),
+                                     dict(preserve_dtype=False, dilation=1)])
+def test_apply_mask(options):
+    from datacube.virtual.transformations import ApplyMask
+
+    rng = numpy.random.RandomState(0)
+    blue = rng.randint(0, 1000, size=(2, 20, 30)).astype('uint16')
+    keep = rng.rand(2, 20, 30) > 0.05
+    data = xarray.Dataset({'blue': (('time', 'y', 'x'), blue.copy(), dict(nodata=65535, units='1')),
+                           'mask': (('time', 'y', 'x'), keep)})
+
+    result = ApplyMask('mask', **options).compute(data)
+
+    radius = options.get('dilation', 0)
+    y, x = numpy.ogrid[-radius:radius + 1, -radius:radius + 1]
+    kept = numpy.ones_like(keep)
+    for dy, dx in zip(*numpy.nonzero(x * x + y * y <= (radius + 0.5) ** 2)):
+        shifted = numpy.pad(~keep, [(0, 0), (radius, radius), (radius, radius)])
+        kept &= ~shifted[:, dy:dy + 20, dx:dx + 30]
+
+    if options.get('preserve_dtype', True):
+        assert result.blue.dtype == numpy.uint16 and result.blue.nodata == 65535
+        numpy.testing.assert_array_equal(result.blue.values, numpy.where(kept, blue, 65535))
+    else:
+        assert result.blue.dtype == numpy.float32 and numpy.isnan(result.blue.nodata)
+        numpy.testing.assert_array_equal(result.blue.values, numpy.where(kept, blue, numpy.nan))
+
+    # input is only modified when asked for
+    assert numpy.array_equal(data.blue.values, blue) != options.get('inplace', False)
+
+
+@pytest.mark.parametrize('load_settings', [{}, {'fuse_transforms': (7, 5)}])
+def test_apply_mask_inplace_shared_product(dc, query, load_settings):
+    recipe = """
+        juxtapose:
+          - transform: apply_mask
+            mask_measurement_name: bright
+            inplace: {}
+            input:
+                transform: expressions
+                output:
+                    masked_blue: blue
+                    bright:
+                        formula: blue > 5000
+                input:
+                    product: ls8_nbar_albers
+                    measurements: [blue]
+          - product: ls8_nbar_albers
+            measurements: [blue]
+    """
+    with mock.patch('datacube.virtual.impl.Datacube') as mock_datacube:
+        mock_datacube.group_datasets = group_datasets
+        mock_datacube.load_data = mock.Mock(side_effect=random_load_data)
+
+        expected = construct_from_yaml(recipe.format('false')).load(dc, **query, **load_settings)
+        data = construct_from_yaml(recipe.format('true')).load(dc, **query, **load_settings)
+
+    # the unmasked reference to the product is not affected by masking the other one in place
+    assert data.equals(expected)
+    assert (data.masked_blue != data.blue).any()
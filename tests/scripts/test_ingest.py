@@ -0,0 +1,266 @@
+import threading
+from datetime import datetime
+from types import SimpleNamespace
+
+import numpy
+import pytest
+import mock
+import xarray
+
+from datacube.executor import SerialExecutor
+from datacube.scripts import ingest
+
+
+@pytest.fixture
+def stages():
+    events = []
+    reading_second = threading.Event()
+
+    def load_tile(config, source_type, tile, tile_index):
+        events.append(('load', tile_index))
+        if tile_index == 1:
+            reading_second.set()
+        if tile_index == 2:
+            raise IOError('unreadable tile')
+        return tile
+
+    def prepare_tile(config, output_type, driver, data, tile, tile_index):
+        events.append(('prepare', tile_index))
+        return (data,)
+
+    def write_tile(config, driver, tile_index, data):
+        events.append(('write', tile_index))
+        if tile_index == 0:
+            # the second tile is read while the first one is written
+            assert reading_second.wait(timeout=10)
+        return 'datasets-{}'.format(data)
+
+    with mock.patch.object(ingest, '_get_driver'), \
+            mock.patch.object(ingest, '_load_tile', load_tile), \
+            mock.patch.object(ingest, '_prepare_tile', prepare_tile), \
+            mock.patch.object(ingest, '_write_tile', write_tile):
+        yield events
+
+
+def test_ingest_tiles(stages):
+    tasks = [dict(tile='tile{}'.format(i), tile_index=i) for i in range(4)]
+
+    outcomes = ingest.ingest_tiles({}, None, None, tasks, read_ahead=1)
+
+    assert [tile_index for tile_index, _ in outcomes] == [0, 1, 2, 3]
+    assert outcomes[0][1] == 'datasets-tile0'
+    assert outcomes[3][1] == 'datasets-tile3'
+
+    # failure of one tile does not stop the others
+    assert isinstance(outcomes[2][1], IOError)
+    assert ('prepare', 2) not in stages and ('write', 2) not in stages
+    assert [event for event in stages if event[0] == 'write'] == [('write', 0), ('write', 1), ('write', 3)]
+
+
+def test_ingest_tiles_in_turn():
+    events = []
+
+    def stage(name):
+        def run(*args, **kwargs):
+            events.append(name)
+            return ()
+        return run
+
+    with mock.patch.object(ingest, '_get_driver'), \
+            mock.patch.object(ingest, '_load_tile', stage('load')), \
+            mock.patch.object(ingest, '_prepare_tile', stage('prepare')), \
+            mock.patch.object(ingest, '_write_tile', stage('write')):
+        outcomes = ingest.ingest_tiles({}, None, None, [dict(tile=None, tile_index=i) for i in range(2)],
+                                       read_ahead=0)
+
+    assert len(outcomes) == 2
+    assert events == ['load', 'prepare', 'write'] * 2
+
+    # a single tile does not start pipeline threads
+    events.clear()
+    with mock.patch.object(ingest, '_get_driver'), \
+            mock.patch.object(ingest, '_load_tile', stage('load')), \
+            mock.patch.object(ingest, '_prepare_tile', stage('prepare')), \
+            mock.patch.object(ingest, '_write_tile', stage('write')), \
+            mock.patch.object(ingest.threading, 'Thread') as thread:
+        outcomes = ingest.ingest_tiles({}, None, None, [dict(tile=None, tile_index=0)], read_ahead=1)
+
+    assert len(outcomes) == 1
+    assert events == ['load', 'prepare', 'write']
+    thread.assert_not_called()
+
+
+def test_ingest_tiles_stage_aborted():
+    class Abort(BaseException):
+        pass
+
+    def load_tile(config, source_type, tile, tile_index):
+        if tile_index == 1:
+            raise Abort()
+        return tile
+
+    with mock.patch.object(ingest, '_get_driver'), \
+            mock.patch.object(ingest, '_load_tile', load_tile), \
+            mock.patch.object(ingest, '_prepare_tile', lambda *args, **kwargs: ()), \
+            mock.patch.object(ingest, '_write_tile', lambda *args: 'datasets'):
+        # not caught per tile like an Exception, the pipeline stops and the error reaches the caller
+        with pytest.raises(Abort):
+            ingest.ingest_tiles({}, None, None, [dict(tile=None, tile_index=i) for i in range(3)], read_ahead=1)
+
+
+def test_with_full_lineage():
+    def source(name):
+        return SimpleNamespace(id=name, lineage=False)
+
+    def tile(*names):
+        sources = numpy.empty((len(names),), dtype=object)
+        for i, name in enumerate(names):
+            sources[i] = (source(name),)
+        return SimpleNamespace(sources=xarray.DataArray(sources, dims=('time',)))
+
+    def bulk_get(ids, include_sources=False):
+        assert include_sources
+        return [SimpleNamespace(id=id_, lineage=True) for id_ in ids]
+
+    index = mock.MagicMock()
+    index.datasets.bulk_get.side_effect = bulk_get
+
+    tasks = [{'tile': tile('a', 'b'), 'tile_index': (0, 0)},
+             {'tile': tile('b', 'c'), 'tile_index': (0, 1)},
+             {'tile': tile('c'), 'tile_index': (1, 0)}]
+    tasks = list(ingest.with_full_lineage(index, tasks, batch_size=2))
+
+    assert [task['tile_index'] for task in tasks] == [(0, 0), (0, 1), (1, 0)]
+    for task in tasks:
+        assert all(dataset.lineage for sources in task['tile'].sources.values for dataset in sources)
+
+    # one query per batch, datasets already fetched are not fetched again
+    assert index.datasets.bulk_get.call_count == 1
+    assert sorted(index.datasets.bulk_get.call_args[0][0]) == ['a', 'b', 'c']
+    assert tasks[0]['tile'].sources.values[1][0] is tasks[1]['tile'].sources.values[0][0]
+
+
+def test_with_full_lineage_bounded():
+    def tile(*names):
+        sources = numpy.empty((len(names),), dtype=object)
+        for i, name in enumerate(names):
+            sources[i] = (SimpleNamespace(id=name, lineage=False),)
+        return SimpleNamespace(sources=xarray.DataArray(sources, dims=('time',)))
+
+    def bulk_get(ids, include_sources=False):
+        # 'gone' was archived and purged since the tasks were made
+        return [SimpleNamespace(id=id_, lineage=True) for id_ in ids if id_ != 'gone']
+
+    index = mock.MagicMock()
+    index.datasets.bulk_get.side_effect = bulk_get
+
+    tasks = [{'tile': tile('a', 'gone')}, {'tile': tile('b')}, {'tile': tile('a')}]
+    tasks = list(ingest.with_full_lineage(index, tasks, batch_size=1))
+
+    assert [[dataset.lineage for sources in task['tile'].sources.values for dataset in sources]
+            for task in tasks] == [[True, False], [True], [True]]
+    assert tasks[0]['tile'].sources.values[1][0].id == 'gone'
+    # 'a' is fetched again, only the datasets of the previous batch are kept
+    assert [sorted(call[0][0]) for call in index.datasets.bulk_get.call_args_list] == [['a', 'gone'], ['b'], ['a']]
+
+
+@pytest.mark.parametrize('incremental', [True, False, None])
+def test_find_diff(incremental):
+    t1, t2, t3 = (numpy.datetime64('2020-01-0{}T10:00:00'.format(day), 'ns') for day in (1, 2, 3))
+    tiles = {'source': {(0, 0, t1): 'in-1', (0, 0, t2): 'in-2', (0, 0, t3): 'in-3'},
+             'output': {(0, 0, t1): 'out-1', (0, 0, t2): 'out-2'}}
+    calls = []
+
+    def list_tiles(product, not_derived_by=None, **query):
+        calls.append((product, not_derived_by, query))
+        if not_derived_by:
+            # the index only returns source datasets not ingested yet
+            return {key: tile for key, tile in tiles[product].items() if key not in tiles['output']}
+        return tiles[product]
+
+    source_type, output_type = SimpleNamespace(name='source'), SimpleNamespace(name='output', grid_spec=None)
+    with mock.patch('datacube.api.grid_workflow.GridWorkflow') as workflow:
+        workflow.return_value.list_tiles.side_effect = list_tiles
+        # compares all tiles by default
+        kwargs = {} if incremental is None else dict(incremental=incremental)
+        tasks = ingest.find_diff(source_type, output_type, mock.sentinel.index, **kwargs)
+
+    assert tasks == [{'tile': 'in-3', 'tile_index': (0, 0, t3)}]
+
+    if incremental:
+        (_, not_derived_by, _), (_, _, output_query) = calls
+        assert not_derived_by == 'output'
+        # output tiles are only listed over the time span of the new source data
+        assert output_query['time'].begin == datetime(2020, 1, 3, 10)
+        assert output_query['time'].end > datetime(2020, 1, 3, 10)
+    else:
+        assert [call[1] for call in calls] == [None, None]
+
+
+def test_process_tasks():
+    def ingest_tiles(config, source_type, output_type, tasks, read_ahead):
+        def outcome(tile_index):
+            if tile_index == 3:
+                return IOError('unreadable tile')
+            datasets = numpy.empty((1,), dtype=object)
+            datasets[0] = SimpleNamespace(id=tile_index, metadata_doc={})
+            return xarray.DataArray(datasets, dims=('time',), attrs={'driver_data': 'driver-{}'.format(tile_index)})
+
+        return [(task['tile_index'], outcome(task['tile_index'])) for task in tasks]
+
+    indexed = []
+
+    def bulk_add(datasets):
+        if any(dataset.id == 4 for dataset in datasets):
+            raise ValueError('cannot index dataset 4')
+        indexed.extend(datasets)
+        return len(datasets)
+
+    def add(dataset, with_lineage=None):
+        assert with_lineage is False
+        if dataset.id == 4:
+            raise ValueError('cannot index dataset 4')
+        indexed.append(dataset)
+
+    index = mock.MagicMock()
+    index.datasets.bulk_add.side_effect = bulk_add
+    index.datasets.add.side_effect = add
+
+    tasks = [{'tile_index': i} for i in range(6)]
+    with mock.patch.object(ingest, 'ingest_tiles', ingest_tiles):
+        successful, failed = ingest.process_tasks(index, {}, None, None, tasks, queue_size=2,
+                                                  executor=SerialExecutor(), tiles_per_task=2)
+
+    assert (successful, failed) == (4, 1)
+    assert sorted(dataset.id for dataset in indexed) == [0, 1, 2, 5]
+    assert all(dataset.metadata_doc['driver_data'] == 'driver-{}'.format(dataset.id) for dataset in indexed)
+
+
+def test_background_indexer_failure():
+    index = mock.MagicMock()
+    indexer = ingest._BackgroundIndexer(index, backlog=1)
+
+    # not a DataArray of datasets, fails outside of indexing
+    indexer.put(object())
+    indexer._thread.join()
+
+    with pytest.raises(AttributeError):
+        indexer.put(object())
+    with pytest.raises(AttributeError):
+        indexer.close()
+    index.datasets.bulk_add.assert_not_called()
+
+
+def test_ingest_read_ahead_needs_several_tiles_per_task(caplog):
+    from click.testing import CliRunner
+    from datacube.ui import click as ui
+
+    runner = CliRunner()
+    with mock.patch.object(ui, 'index_connect'), mock.patch.object(ui.config.LocalConfig, 'find'):
+        runner.invoke(ingest.ingest_cmd, ['--read-ahead', '2'], obj={})
+        assert '--read-ahead has no effect' in caplog.text
+
+        caplog.clear()
+        runner.invoke(ingest.ingest_cmd, ['--read-ahead', '2', '--tiles-per-task', '4'], obj={})
+        runner.invoke(ingest.ingest_cmd, [], obj={})
+        assert '--read-ahead has no effect' not in caplog.text
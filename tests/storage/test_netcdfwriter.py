@@ -1,4 +1,7 @@
 
+from concurrent.futures import ThreadPoolExecutor
+import dask.array
+from unittest import mock
 import netCDF4
 import numpy
 import xarray as xr
@@ -6,10 +9,13 @@ import pytest
 from hypothesis import given
 from hypothesis.strategies import text
 import string
+import zlib
 
 from datacube.drivers.netcdf.writer import create_netcdf, create_coordinate, create_variable, netcdfy_data, \
     create_grid_mapping_variable, flag_mask_meanings, Variable
 from datacube.drivers.netcdf import write_dataset_to_netcdf
+from datacube.drivers.netcdf import _write
+from datacube.drivers.netcdf._write import _block_bounds, _iter_dask_blocks, _chunk_rows_shape
 from datacube.drivers.netcdf.writer import DEFAULT_GRID_MAPPING
 from datacube.utils import geometry, DatacubeException, read_strings_from_netcdf
 
@@ -304,3 +310,139 @@ def test_write_dataset_to_netcdf(tmpnetcdf_filename, odc_style_xr_dataset):
     xx = xr.open_dataset(tmpnetcdf_filename)
     assert crs_var in xx.coords
     assert crs_var not in xx.data_vars
+
+
+@pytest.mark.parametrize('write_behind', [0, 2])
+def test_write_dask_dataset_to_netcdf(tmpnetcdf_filename, odc_style_xr_dataset, write_behind):
+    lazy = odc_style_xr_dataset.chunk(30)
+    assert lazy.B10.chunks is not None
+
+    write_dataset_to_netcdf(lazy, tmpnetcdf_filename, write_behind=write_behind,
+                            variable_params={'B10': {'chunksizes': (20, 20), 'zlib': True}})
+
+    with netCDF4.Dataset(tmpnetcdf_filename) as nco:
+        nco.set_auto_mask(False)
+        var = nco.variables['B10']
+        assert var.chunking() == [20, 20]
+        assert (var[:] == odc_style_xr_dataset['B10'].values).all()
+
+
+@pytest.mark.parametrize('with_h5py', [True, False])
+@pytest.mark.parametrize('chunks', [None, 30, 45])
+def test_write_dataset_to_netcdf_chunks(tmpnetcdf_filename, odc_style_xr_dataset, with_h5py, chunks):
+    if with_h5py:
+        pytest.importorskip('h5py')
+    numpy.random.seed(7)
+    expect = numpy.random.randint(-1000, 1000, size=(100, 100)).astype('int16')
+    dataset = odc_style_xr_dataset.copy()
+    dataset['B10'].values[:] = expect
+    if chunks is not None:
+        dataset = dataset.chunk(chunks)
+
+    with mock.patch.object(_write, 'h5py', _write.h5py if with_h5py else None), \
+            mock.patch.object(_write, '_write_variable', wraps=_write._write_variable) as write_variable:
+        write_dataset_to_netcdf(dataset, tmpnetcdf_filename, write_behind=1,
+                                variable_params={'B10': {'chunksizes': (32, 32), 'zlib': True,
+                                                         'shuffle': True, 'complevel': 3}})
+    assert write_variable.call_count == (0 if with_h5py else 1)
+
+    with netCDF4.Dataset(tmpnetcdf_filename) as nco:
+        nco.set_auto_mask(False)
+        var = nco.variables['B10']
+        assert var.chunking() == [32, 32]
+        assert var.filters()['zlib'] and var.filters()['shuffle']
+        assert (var[:] == expect).all()
+
+
+def test_block_bounds():
+    # whole dask chunks, ending on NetCDF chunk boundaries
+    assert _block_bounds((10,)*10, 20) == [0, 20, 40, 60, 80, 100]
+    assert _block_bounds((30, 30, 30, 10), 20) == [0, 60, 100]
+    assert _block_bounds((100,), 20) == [0, 100]
+    assert _block_bounds((100,), 200) == [0, 100]
+    assert _block_bounds((30,)*3 + (10,), 1) == [0, 30, 60, 90, 100]
+    # no common boundary within reach
+    assert _block_bounds((300,)*3, 256) == [0, 300, 900]
+    assert _block_bounds((100,)*10, 256) == [0, 300, 600, 1000]
+
+
+def test_iter_dask_blocks():
+    computed = []
+
+    def count(block):
+        if block.size:
+            computed.append(block.shape)
+        return block
+
+    expect = numpy.arange(100*100, dtype='int16').reshape(100, 100)
+    data = dask.array.from_array(expect, chunks=30).map_blocks(count, dtype='int16')
+
+    with mock.patch('dask.compute', wraps=dask.compute) as compute:
+        blocks = list(_iter_dask_blocks(data, (20, 20), window_bytes=2*60*60*2))
+    # every dask chunk once, a window of blocks per graph execution
+    assert len(computed) == 16
+    assert compute.call_count == 2
+
+    assert [roi for roi, _ in blocks] == [(slice(y, y + dy), slice(x, x + dx))
+                                          for y, dy in [(0, 60), (60, 40)] for x, dx in [(0, 60), (60, 40)]]
+    for roi, block in blocks:
+        assert (block == expect[roi]).all()
+
+
+def test_chunk_rows_shape():
+    assert _chunk_rows_shape((2, 100, 100), [1, 20, 20]) == (1, 20, 100)
+    assert _chunk_rows_shape((100, 100), [200, 200]) == (100, 100)
+    assert _chunk_rows_shape((100, 100), 'contiguous') == (100, 100)
+
+
+def test_write_dataset_to_netcdf_in_chunk_rows(tmpnetcdf_filename, odc_style_xr_dataset):
+    write_dataset_to_netcdf(odc_style_xr_dataset, tmpnetcdf_filename,
+                            variable_params={'B10': {'chunksizes': (30, 30), 'zlib': True}})
+
+    with netCDF4.Dataset(tmpnetcdf_filename) as nco:
+        nco.set_auto_mask(False)
+        var = nco.variables['B10']
+        assert var.chunking() == [30, 30]
+        assert (var[:] == odc_style_xr_dataset['B10'].values).all()
+
+
+def test_chunk_writer_holds_lock():
+    written = {}
+
+    def write_direct_chunk(offset, data):
+        assert _write.HDF5_LOCK._is_owned()
+        written[offset] = numpy.frombuffer(zlib.decompress(data), dtype='int16').reshape(2, 2)
+
+    dset = mock.Mock(chunks=(2, 2), shape=(3, 4), dtype=numpy.dtype('int16'), fillvalue=-1)
+    dset.id.write_direct_chunk.side_effect = write_direct_chunk
+    data = numpy.arange(12, dtype='int16').reshape(3, 4)
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        writer = _write._ChunkWriter(dset, [zlib.compress], pool)
+        writer.write((slice(0, 2), slice(0, 4)), data[:2])
+        writer.write((slice(2, 3), slice(0, 4)), data[2:])
+
+    assert sorted(written) == [(0, 0), (0, 2), (2, 0), (2, 2)]
+    assert (written[(0, 2)] == data[:2, 2:]).all()
+    # edge chunks are padded with the fill value
+    assert (written[(2, 0)] == [[8, 9], [-1, -1]]).all()
+
+
+def test_write_dataset_to_netcdf_h5py_holds_lock(tmpnetcdf_filename, odc_style_xr_dataset):
+    h5py = pytest.importorskip('h5py')
+    opened = []
+
+    def open_file(*args, **kwargs):
+        opened.append(_write.HDF5_LOCK._is_owned())
+        return h5py.File(*args, **kwargs)
+
+    with mock.patch.object(_write, 'h5py', mock.Mock(wraps=h5py, h5z=h5py.h5z, File=open_file)), \
+            mock.patch.object(_write, '_encode_pool', wraps=_write._encode_pool) as encode_pool:
+        write_dataset_to_netcdf(odc_style_xr_dataset, tmpnetcdf_filename,
+                                variable_params={'B10': {'chunksizes': (32, 32), 'zlib': True}})
+    assert opened == [True]
+    encode_pool.assert_called_once_with()
+
+    with netCDF4.Dataset(tmpnetcdf_filename) as nco:
+        nco.set_auto_mask(False)
+        assert (nco.variables['B10'][:] == odc_style_xr_dataset.B10.values).all()
@@ -2,8 +2,12 @@
 Tests for MultiprocessingExecutor
 """
 
-from datacube.executor import get_executor
-from time import sleep
+from datacube.executor import get_executor, shared_memory, _shm_loads, _SharedMemoryPickler, _SharedArray
+from time import sleep, monotonic
+import io
+import os
+import numpy as np
+import xarray as xr
 import pytest
 
 DATA = [1, 2, 3, 4]
@@ -16,6 +20,11 @@ def _echo(x, please_fail=False):
     return x
 
 
+def _sleepy(x, delay):
+    sleep(delay)
+    return x
+
+
 def run_executor_tests(executor, sleep_time=1):
     # get_ready: mostly pending
     futures = executor.map(_echo, DATA)
@@ -42,6 +51,24 @@ def run_executor_tests(executor, sleep_time=1):
 
     assert len(completed) + len(pending) + len(failed) == len(data)
 
+    # wait_ready: returns as soon as something completes
+    futures = [executor.submit(_echo, 'fast'), executor.submit(_sleepy, 'slow', 5 * sleep_time)]
+    t0 = monotonic()
+    completed, failed, pending = executor.wait_ready(futures)
+    assert monotonic() - t0 < 4 * sleep_time + 1
+    assert len(failed) == 0
+    assert 'fast' in executor.results(completed)
+    assert len(completed) + len(pending) == 2
+
+    # wait_ready: timeout
+    if sleep_time:
+        futures = [executor.submit(_sleepy, 'slow', 2 * sleep_time)]
+        completed, failed, pending = executor.wait_ready(futures, timeout=0.1)
+        assert (completed, failed, pending) == ([], [], futures)
+        executor.results(futures)
+
+    assert executor.wait_ready([]) == ([], [], [])
+
     # test results
     futures = executor.map(_echo, DATA)
     results = executor.results(futures)
@@ -81,8 +108,193 @@ def test_concurrent_executor():
     run_executor_tests(executor)
 
 
+def test_thread_executor():
+    executor = get_executor(None, 2, use_threads=True)
+    assert 'Threads' in str(executor)
+    run_executor_tests(executor)
+
+    # tasks are not pickled, they can share state with the caller
+    seen = []
+    futures = executor.map(seen.append, DATA)
+    executor.results(futures)
+    assert sorted(seen) == DATA
+
+
 def test_fallback_executor():
     executor = get_executor(None, None)
     assert 'Serial' in str(executor)
 
     run_executor_tests(executor, sleep_time=0)
+
+
+def _mk_dataset():
+    big = np.arange(100 * 100, dtype='float64').reshape(100, 100)
+    return xr.Dataset({'big': (('y', 'x'), big),
+                       'alias': (('y', 'x'), big),
+                       'small': (('x',), np.arange(100, dtype='int16'))},
+                      coords={'x': np.arange(100), 'y': np.arange(100)})
+
+
+@pytest.mark.skipif(shared_memory is None, reason='Needs Python 3.8')
+def test_shared_memory_pickling():
+    ds = _mk_dataset()
+
+    buf = io.BytesIO()
+    pickler = _SharedMemoryPickler(buf, 1024)
+    pickler.dump(ds)
+    # arrays referenced twice only take one block
+    assert len(pickler.blocks) == 1
+    assert len(buf.getvalue()) < ds.big.nbytes
+
+    loaded = _shm_loads(buf.getvalue())
+    assert loaded.identical(ds)
+    assert not loaded.big.data.flags.owndata
+    assert loaded.big.data.base is loaded.alias.data.base
+    assert not isinstance(loaded.small.data.base, _SharedArray)
+
+    # blocks are unlinked as soon as they are mapped
+    for name, _, _ in pickler.blocks.values():
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
+
+    # mapped arrays are writable
+    loaded.big.data[0, 0] = -1
+    assert loaded.alias.data[0, 0] == -1
+
+
+@pytest.mark.skipif(shared_memory is None, reason='Needs Python 3.8')
+def test_concurrent_executor_shared_memory():
+    ds = _mk_dataset()
+
+    for use_cloud_pickle in (False, True):
+        executor = get_executor(None, 2, use_cloud_pickle=use_cloud_pickle, shared_memory_threshold=1024)
+
+        result = executor.result(executor.submit(_sleepy, ds, 0))
+        assert result.identical(ds)
+        assert not result.big.data.flags.owndata
+
+        future = executor.submit(_echo, ds, please_fail=True)
+        with pytest.raises(IOError):
+            executor.result(future)
+
+    executor = get_executor(None, 2, shared_memory_threshold=None)
+    assert not isinstance(executor.result(executor.submit(_sleepy, ds, 0)).big.data.base, _SharedArray)
+
+
+def test_celery_packed_result(tmpdir):
+    celery_runner = pytest.importorskip('datacube._celery_runner')
+    from unittest import mock
+
+    value = np.arange(1000)
+    packed = celery_runner._pack_result(value, compress=True, offload_dir=str(tmpdir), offload_threshold=10)
+    assert packed.data is None and tmpdir.listdir() == [tmpdir.join(os.path.basename(packed.path))]
+
+    # reading a result more than once gives the same value and keeps the file
+    unpacked = packed.unpack()
+    assert (unpacked == value).all()
+    assert packed.unpack() is unpacked
+    assert os.path.exists(packed.path)
+
+    # releasing the task removes the file
+    with mock.patch.object(celery_runner, 'check_redis', return_value=True):
+        executor = celery_runner.CeleryExecutor(offload_dir=str(tmpdir))
+        plain_executor = celery_runner.CeleryExecutor(compress_results=True)
+
+    future = mock.Mock(**{'successful.return_value': True, 'result': packed})
+    executor.release(future)
+    assert tmpdir.listdir() == []
+    future.forget.assert_called_once_with()
+
+    # no round trip for the result when no files can exist
+    future = mock.Mock()
+    plain_executor.release(future)
+    future.forget.assert_called_once_with()
+    assert not future.successful.called
+
+    # small results stay inline
+    packed = celery_runner._pack_result(value[:1], offload_dir=str(tmpdir))
+    assert packed.path is None and (packed.unpack() == value[:1]).all()
+
+
+class _FakeRedisBackend(object):
+    """Stores task states and publishes them like the redis result backend of celery."""
+
+    def __init__(self):
+        import queue
+        self.states = {}
+        self.messages = queue.Queue()
+        self.channels = set()
+        self.mget_count = 0
+        self.client = self
+
+    def get_key_for_task(self, task_id):
+        return 'celery-task-meta-' + task_id
+
+    def mget(self, keys):
+        self.mget_count += 1
+        return [self.states.get(key) for key in keys]
+
+    @staticmethod
+    def decode_result(value):
+        return {'status': value}
+
+    def store(self, future, state):
+        key = self.get_key_for_task(future.id)
+        self.states[key] = state
+        if key in self.channels:
+            self.messages.put({'type': 'message', 'channel': key})
+
+    def pubsub(self):
+        return self
+
+    def subscribe(self, *keys):
+        self.channels.update(keys)
+        for key in keys:
+            self.messages.put({'type': 'subscribe', 'channel': key})
+
+    def unsubscribe(self, *keys):
+        self.channels.difference_update(keys)
+        for key in keys:
+            self.messages.put({'type': 'unsubscribe', 'channel': key})
+
+    def close(self):
+        self.channels.clear()
+
+    def get_message(self, timeout=0.0):
+        import queue
+        try:
+            return self.messages.get(timeout=timeout) if timeout != 0 else self.messages.get_nowait()
+        except queue.Empty:
+            return None
+
+
+def test_celery_wait_ready():
+    celery_runner = pytest.importorskip('datacube._celery_runner')
+    from celery import states
+    from unittest import mock
+    import threading
+
+    backend = _FakeRedisBackend()
+    futures = [mock.Mock(id=str(i), backend=backend) for i in range(3)]
+
+    with mock.patch.object(celery_runner, 'check_redis', return_value=True), \
+            mock.patch.object(celery_runner, 'sleep', side_effect=AssertionError('sleep-polling')):
+        executor = celery_runner.CeleryExecutor()
+
+        assert executor.wait_ready(futures, timeout=0.05) == ([], [], futures)
+        assert len(backend.channels) == 3
+
+        # blocks until redis publishes a result, without polling in between
+        threading.Timer(0.2, backend.store, (futures[1], states.SUCCESS)).start()
+        backend.mget_count = 0
+        t0 = monotonic()
+        assert executor.wait_ready(futures) == ([futures[1]], [], [futures[0], futures[2]])
+        assert 0.2 <= monotonic() - t0 < 1
+        assert backend.mget_count <= 2
+        assert len(backend.channels) == 2
+
+        backend.store(futures[0], states.FAILURE)
+        backend.store(futures[2], states.SUCCESS)
+        assert executor.next_completed([futures[0], futures[2]], None) == (futures[2], [futures[0]])
+        assert list(executor.as_completed([futures[0], futures[2]])) == [futures[2], futures[0]]
+        assert backend.channels == set()
@@ -1,3 +1,4 @@
+from unittest import mock
 from affine import Affine
 import numpy as np
 import pytest
@@ -178,3 +179,23 @@ def test_gbox_tiles():
     assert tt.chunk_shape((0, 1)) == (h, 2)
     assert tt.chunk_shape((1, 1)) == (1, 2)
     assert tt.chunk_shape((1, 0)) == (1, w)
+
+
+def test_gbox_tiles_cache():
+    A = Affine.identity()
+    gbox = GeoBox(200, 300, A, epsg3857)
+    tt = gbx.geobox_tiles(gbox, (10, 20))
+    assert isinstance(tt, gbx.GeoboxTiles)
+    assert tt.shape == (30, 10)
+
+    # equal geobox and tile shape share the same instance
+    assert gbx.geobox_tiles(GeoBox(200, 300, A, epsg3857), (10, 20)) is tt
+    assert gbx.geobox_tiles(gbox, (10, 10)) is not tt
+
+    # tile geoboxes kept by a shared instance are bounded
+    with mock.patch.object(gbx, '_TILE_CACHE_SIZE', 4):
+        tt = gbx.GeoboxTiles(gbox, (10, 20))
+    tiles = [tt[idx] for idx in [(0, 0), (0, 1), (0, 2), (0, 3), (0, 4)]]
+    assert len(tt._cache) == 4
+    assert tt[(0, 4)] is tiles[-1]
+    assert tt[(0, 0)] is not tiles[0] and tt[(0, 0)] == tiles[0]
@@ -643,6 +643,29 @@ def test_fixed_point():
     assert (dd < 1.0/0x7FFF).all()
 
 
+def test_geobox_hash_immutable():
+    A = mkA(0, (10, -10), translation=(100, 200))
+    gbox = GeoBox(100, 50, A, epsg3857)
+    gbox2 = GeoBox(100, 50, A, epsg3857)
+
+    assert gbox == gbox2
+    assert hash(gbox) == hash(gbox2)
+    assert {gbox: 1}[gbox2] == 1
+    assert gbox != GeoBox(100, 50, A, epsg4326)
+    assert gbox != GeoBox(100, 51, A, epsg3857)
+    assert len({gbox, gbox2, gbox[:10, :10]}) == 2
+
+    with pytest.raises(AttributeError):
+        gbox.width = 10
+    with pytest.raises(AttributeError):
+        del gbox.affine
+    assert gbox.width == 100
+
+    gbox3 = pickle.loads(pickle.dumps(gbox))
+    assert gbox3 == gbox
+    assert hash(gbox3) == hash(gbox)
+
+
 def test_geobox():
     points_list = [
         [(148.2697, -35.20111), (149.31254, -35.20111), (149.31254, -36.331431), (148.2697, -36.331431)],
@@ -1,6 +1,8 @@
 from datacube import Datacube
 from datacube.api.query import query_group_by
 import numpy as np
+import dask.array as da
+from unittest import mock
 from types import SimpleNamespace
 import pytest
 
@@ -324,3 +326,78 @@ def test_native_load(tmpdir):
     xx = native_load(ds, ['cc'])
     assert xx.geobox == gbox_cc
     np.testing.assert_array_equal(cc, xx.isel(time=0).cc.values)
+
+
+def test_load_data_multiband(tmpdir):
+    from datacube.api.core import _group_by_source_file
+    from datacube.utils.geometry import GeoBox, gbox as gbx
+
+    tmpdir = Path(str(tmpdir))
+    nodata = -999
+    aa = mk_test_image(96, 64, 'int16', nodata=nodata)
+    pix = np.stack([aa, aa + 1, aa + 2])
+    pix[:, :10, :] = nodata
+
+    meta = write_gtiff(tmpdir/'multi.tif', pix, nodata=nodata,
+                       resolution=(15, -15), offset=(11230, 1381110))
+    gbox = meta.gbox
+
+    bands = [dict(name=name, path='multi.tif', band=band, dtype='int16', nodata=nodata)
+             for band, name in enumerate(['aa', 'bb', 'cc'], 1)]
+    ds = mk_sample_dataset(bands,
+                           uri=(tmpdir/'metadata.yaml').absolute().as_uri(),
+                           geobox=gbox)
+    mm = [ds.type.measurements[k] for k in ('aa', 'bb', 'cc')]
+
+    groups = list(_group_by_source_file([ds], mm))
+    assert [[m.name for m in g] for g in groups] == [['aa', 'bb', 'cc']]
+
+    bb = mm[1].copy()
+    bb['resampling_method'] = 'average'
+    groups = list(_group_by_source_file([ds], [mm[0], bb, mm[2]]))
+    assert [[m.name for m in g] for g in groups] == [['aa', 'cc'], ['bb']]
+
+    sources = Datacube.group_datasets([ds], 'time')
+    progress_call_data = []
+
+    def progress_cbk(n, nt):
+        progress_call_data.append((n, nt))
+
+    xx = Datacube.load_data(sources, gbox, mm, progress_cbk=progress_cbk)
+    assert progress_call_data == [(1, 3), (2, 3), (3, 3)]
+    for i, name in enumerate(['aa', 'bb', 'cc']):
+        np.testing.assert_array_equal(pix[i], xx[name].values[0])
+
+    # reprojection path, compare with band by band load
+    gbox = gbx.zoom_out(gbx.pad(gbox, 5), 1.3)
+    xx = Datacube.load_data(sources, gbox, mm, resampling='bilinear')
+    for i, name in enumerate(['aa', 'bb', 'cc']):
+        yy = Datacube.load_data(sources, gbox, [mm[i]], resampling='bilinear')
+        np.testing.assert_array_equal(yy[name].values, xx[name].values)
+        assert (xx[name].values == nodata).any()
+
+    # non-affine reprojection path
+    gbox = GeoBox.from_geopolygon(gbox.extent.to_crs('EPSG:3577'), resolution=(-20, 20))
+    xx = Datacube.load_data(sources, gbox, mm)
+    for i, name in enumerate(['aa', 'bb', 'cc']):
+        yy = Datacube.load_data(sources, gbox, [mm[i]])
+        np.testing.assert_array_equal(yy[name].values, xx[name].values)
+        assert (xx[name].values != nodata).any()
+
+    # lazy load reads and warps the bands of each chunk together
+    from datacube.api import core
+    chunks = {'x': 40, 'y': 30}
+    for resampling in ('nearest', 'bilinear'):
+        with mock.patch.object(core, '_fuse_measurements', wraps=core._fuse_measurements) as fuse_stack, \
+                mock.patch.object(core, '_fuse_measurement', wraps=core._fuse_measurement) as fuse_band:
+            zz = Datacube.load_data(sources, gbox, mm, resampling=resampling, dask_chunks=chunks)
+            assert isinstance(zz.bb.data, da.Array)
+            nchunks = len(zz.aa.data.chunks[1]) * len(zz.aa.data.chunks[2])
+            zz = zz.compute()
+            assert 0 < fuse_stack.call_count <= nchunks
+            assert fuse_band.call_count == 0
+
+        # same as lazy band by band load, which warps each chunk on its own pixel grid
+        for i, name in enumerate(['aa', 'bb', 'cc']):
+            yy = Datacube.load_data(sources, gbox, [mm[i]], resampling=resampling, dask_chunks=chunks)
+            np.testing.assert_array_equal(yy[name].values, zz[name].values)
@@ -29,6 +29,19 @@ def test_gridspec():
     assert (gs == gs)
     assert (gs == {}) is False
 
+    # hashable, tile geoboxes are cached across instances
+    gs2 = GridSpec(crs=geometry.CRS('EPSG:4326'), tile_size=(1, 1), resolution=(-0.1, 0.1), origin=(10, 10))
+    assert hash(gs) == hash(gs2)
+    assert {gs: 1}[gs2] == 1
+    assert gs2.tile_geobox((3, 4)) is gs.tile_geobox((3, 4))
+
+    # immutable, so a cached key can not change
+    with pytest.raises(AttributeError):
+        gs.origin = (0, 0)
+    with pytest.raises(AttributeError):
+        del gs.crs
+    assert gs == gs2
+
 
 def test_gridspec_upperleft():
     """ Test to ensure grid indexes can be counted correctly from bottom left or top left
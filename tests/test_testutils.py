@@ -106,3 +106,55 @@ def test_native_geobox_eo3(eo3_dataset_s2):
 
     with pytest.raises(ValueError):
         native_geobox(ds, ['red_edge_1'])
+
+
+def test_native_geobox_union(eo3_dataset_s2):
+    from copy import deepcopy
+    from uuid import uuid4
+    from unittest import mock
+    from datacube.testutils import io
+
+    def copy_dataset(ds, x_offset=0, crs=None):
+        doc = deepcopy(ds.metadata_doc)
+        doc['id'] = str(uuid4())
+        if crs is not None:
+            doc['crs'] = crs
+            doc['grid_spatial']['projection']['spatial_reference'] = crs
+        for grid in doc['grids'].values():
+            grid['transform'][2] += x_offset
+        return Dataset(ds.type, doc, uris=ds.uris)
+
+    ds = eo3_dataset_s2
+    same_grid = [copy_dataset(ds) for _ in range(5)]
+    shifted = copy_dataset(ds, x_offset=60*100)
+
+    with mock.patch('datacube.testutils.io.native_geobox', wraps=io.native_geobox) as spy:
+        gbox = io.native_geobox_union([ds] + same_grid, ['swir_1', 'swir_2'])
+        assert spy.call_count == 1
+        assert gbox == native_geobox(ds, ['swir_1', 'swir_2'])
+
+        spy.reset_mock()
+        gbox = io.native_geobox_union([ds, shifted] + same_grid, basis='blue')
+        assert spy.call_count == 2
+        assert gbox.width == native_geobox(ds, basis='blue').width + 600
+        assert gbox.height == native_geobox(ds, basis='blue').height
+
+    # every dataset is checked, mixed grids are not merged
+    other_crs = copy_dataset(ds, crs='epsg:32740')
+    with pytest.raises(ValueError):
+        io.native_geobox_union([ds, other_crs], basis='blue')
+
+    other_res = copy_dataset(ds)
+    other_res.metadata_doc['grids']['default']['transform'][0] = 20
+    with pytest.raises(ValueError):
+        io.native_geobox_union([ds, other_res], basis='blue')
+
+    no_grid = copy_dataset(ds)
+    del no_grid.metadata_doc['grids']['default']
+    with pytest.raises(ValueError):
+        io.native_geobox_union([ds, no_grid], basis='blue')
+
+    no_band = copy_dataset(ds)
+    del no_band.metadata_doc['measurements']['blue']
+    with pytest.raises(ValueError):
+        io.native_geobox_union([ds, no_band], basis='blue')
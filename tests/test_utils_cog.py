@@ -206,3 +206,121 @@ def test_cog_rgba(tmpdir):
 
     with pytest.raises(ValueError):
         _write_cog(rgba.values[1:, :, :], rgba.geobox, ':mem:')
+
+
+@pytest.mark.parametrize("with_dask", [True, False])
+def test_cog_streaming(tmpdir, with_dask):
+    import rasterio
+    from datacube.utils.cog import _write_cog_streaming, _decimate
+
+    pp = Path(str(tmpdir))
+    xx, ds = gen_test_data(pp, dask=with_dask)
+
+    ff = write_cog(xx, pp / "cog.tif", streaming=True)
+    assert ff == pp / "cog.tif"
+
+    yy = rio_slurp_xarray(ff)
+    np.testing.assert_array_equal(yy.values, xx.values)
+    assert yy.geobox == xx.geobox
+    assert yy.nodata == xx.nodata
+
+    bb = to_cog(xx, streaming=True, overview_levels=[])
+    assert isinstance(bb, bytes)
+    (pp / "cog-mem.tif").write_bytes(bb)
+    yy = rio_slurp_xarray(pp / "cog-mem.tif")
+    np.testing.assert_array_equal(yy.values, xx.values)
+
+    # many small blocks, averaged overviews
+    ff = _write_cog_streaming(xx.data, xx.geobox, pp / "cog-blocks.tif",
+                              nodata=xx.nodata,
+                              blocksize=16,
+                              overview_levels=[2, 4],
+                              overview_resampling="average",
+                              stream_block=16)
+    with rasterio.open(str(ff)) as f:
+        assert f.overviews(1) == [2, 4]
+        np.testing.assert_array_equal(f.read(1), xx.values)
+        for lvl in (2, 4):
+            expect = _decimate(xx.values[np.newaxis], lvl, "average", xx.nodata)[0]
+            np.testing.assert_array_equal(f.read(1, out_shape=expect.shape), expect)
+
+    with pytest.raises(ValueError):
+        write_cog(xx, pp / "cog-bad.tif", streaming=True, overview_resampling="cubic")
+
+
+def test_cog_window_bounds():
+    from datacube.utils.cog import _window_bounds
+
+    # whole chunks ending on block boundaries
+    assert _window_bounds((30, 30, 30, 10), 20) == [0, 60, 100]
+    assert _window_bounds((16,)*4, 16) == [0, 16, 32, 48, 64]
+    assert _window_bounds((50, 50), 32) == [0, 100]
+    # no common boundary within reach, chunk across a window boundary is computed twice
+    assert _window_bounds((100,)*10, 256) == [0, 256, 512, 1000]
+
+
+def test_cog_iter_blocks():
+    import dask.array as da
+    from datacube.utils.cog import _iter_blocks
+
+    computed = []
+
+    def count(block):
+        if block.size:
+            computed.append(block.shape)
+        return block
+
+    expect = np.arange(2*100*100, dtype='int16').reshape(2, 100, 100)
+    pix = da.from_array(expect, chunks=(2, 30, 30)).map_blocks(count, dtype='int16')
+
+    blocks = list(_iter_blocks(pix, (20, 20)))
+    assert len(computed) == 16
+    assert len(blocks) == 25
+    for (ys, xs), block in blocks:
+        np.testing.assert_array_equal(block, expect[:, ys, xs])
+        assert block.shape[1:] == (20, 20)
+
+    assert [roi for roi, _ in _iter_blocks(expect, (64, 64))] == [np.s_[0:64, 0:64], np.s_[0:64, 64:100],
+                                                                   np.s_[64:100, 0:64], np.s_[64:100, 64:100]]
+
+
+def test_cog_decimate():
+    from datacube.utils.cog import _decimate
+
+    pix = np.asarray([[[1, 3, 5],
+                       [-1, -1, 7]]], dtype='int16')
+    np.testing.assert_array_equal(_decimate(pix, 2, "nearest", -1), [[[1, 5]]])
+    np.testing.assert_array_equal(_decimate(pix, 2, "average", -1), [[[2, 6]]])
+    pix[0, 0, :2] = -1
+    np.testing.assert_array_equal(_decimate(pix, 2, "average", -1), [[[-1, 6]]])
+
+    pix = np.asarray([[[np.nan, 2.0]]], dtype='float32')
+    np.testing.assert_array_equal(_decimate(pix, 2, "average", None), [[[2.0]]])
+
+
+@pytest.mark.parametrize("opts", [
+    dict(compress="zstd", level=3),
+    dict(compress="LERC", max_z_error=0),
+    dict(compress="deflate", num_threads=2),
+    dict(compress="ZSTD", num_threads="all", streaming=True),
+])
+def test_cog_codecs(tmpdir, opts):
+    import rasterio
+    from datacube.utils.cog import _cog_rio_opts
+
+    pp = Path(str(tmpdir))
+    xx, ds = gen_test_data(pp)
+
+    ff = write_cog(xx, pp / "cog.tif", **opts)
+    with rasterio.open(str(ff)) as f:
+        assert f.profile["compress"].upper() == opts["compress"].upper()
+        np.testing.assert_array_equal(f.read(1), xx.values)
+
+    bb = to_cog(xx, **opts)
+    (pp / "cog-mem.tif").write_bytes(bb)
+    yy = rio_slurp_xarray(pp / "cog-mem.tif")
+    np.testing.assert_array_equal(yy.values, xx.values)
+
+    rio_opts = _cog_rio_opts(xx.geobox, 1, xx.dtype, 512, **{k: v for k, v in opts.items() if k != "streaming"})
+    assert ("num_threads" in rio_opts) == ("num_threads" in opts)
+    assert ("predictor" in rio_opts) == (not opts["compress"].startswith("LERC"))
@@ -1,6 +1,8 @@
 import numpy as np
+import pytest
 from affine import Affine
 import rasterio
+from unittest import mock
 from datacube.utils.geometry import warp_affine, rio_reproject, gbox as gbx
 from datacube.utils.geometry._warp import resampling_s2rio, is_resampling_nn
 
@@ -10,8 +12,6 @@ from datacube.testutils.geom import (
 
 
 def test_rio_resampling_conversion():
-    import pytest
-
     R = rasterio.warp.Resampling
     assert resampling_s2rio('nearest') == R.nearest
     assert resampling_s2rio('bilinear') == R.bilinear
@@ -114,3 +114,200 @@ def test_rio_reproject():
     assert (dst[:10, :20] == 33).all()
     assert (dst[10:, :] == -3).all()
     assert (dst[:, 20:] == -3).all()
+
+
+def test_warp_plan():
+    from datacube.utils.geometry import GeoBox
+    from datacube.utils.geometry._warp import WarpPlan, warp_plan, reproject_array
+    from datacube.testutils.geom import epsg3857
+
+    src = np.arange(128*256, dtype='int32').reshape(128, 256)
+    src[:5, :] = -1
+
+    s_gbox = AlbersGS.tile_geobox((15, -40))[:src.shape[0], :src.shape[1]]
+    d_gbox = GeoBox.from_geopolygon(s_gbox.extent.to_crs(epsg3857).buffer(100),
+                                    resolution=(-30, 30))
+
+    plan = WarpPlan(s_gbox, d_gbox)
+    assert plan.xx.shape == d_gbox.shape
+    assert plan.nbytes == 2*4*d_gbox.shape[0]*d_gbox.shape[1]
+    assert warp_plan(s_gbox, d_gbox) is warp_plan(s_gbox, d_gbox)
+
+    assert WarpPlan.supports('nearest')
+    assert WarpPlan.supports('bilinear')
+    assert not WarpPlan.supports('average')
+
+    expect = np.full(d_gbox.shape, -3, dtype=src.dtype)
+    rio_reproject(src, expect, s_gbox, d_gbox, 'nearest', src_nodata=-1, dst_nodata=-3)
+
+    dst = np.full(d_gbox.shape, 7, dtype=src.dtype)
+    dst_ = plan.apply(src, dst, 'nearest', src_nodata=-1, dst_nodata=-3)
+    assert dst_ is dst
+    assert ((dst == -3) == (expect == -3)).mean() > 0.99
+    assert (dst == expect).mean() > 0.98
+
+    dst = np.full(d_gbox.shape, -3, dtype=src.dtype)
+    reproject_array(src, dst, s_gbox, d_gbox, 'bilinear', src_nodata=-1, dst_nodata=-3)
+    expect[:] = -3
+    rio_reproject(src, expect, s_gbox, d_gbox, 'bilinear', src_nodata=-1, dst_nodata=-3)
+    both = (dst != -3) & (expect != -3)
+    assert both.mean() > 0.5
+    # within GDAL's approximate transformer error of 0.125 pixels, one row is 256
+    assert np.abs(dst[both] - expect[both]).max() <= 256*0.125
+
+    # falls back to GDAL for other modes
+    dst[:] = -3
+    reproject_array(src, dst, s_gbox, d_gbox, 'average', src_nodata=-1, dst_nodata=-3)
+    assert (dst != -3).any()
+
+    with pytest.raises(ValueError):
+        plan.apply(src, dst, 'average')
+
+    # a stack is warped in one go, with nodata of each band on its own
+    stack = np.stack([src, src[::-1], src + 1])
+    stack[2, 50:60, :] = -1
+    for resampling in ('nearest', 'bilinear'):
+        out = np.full((3,) + d_gbox.shape, 7, dtype=src.dtype)
+        with mock.patch.object(WarpPlan, 'apply', wraps=plan.apply) as apply:
+            plan.apply(stack, out, resampling, src_nodata=-1, dst_nodata=-3)
+        assert apply.call_count == 1
+        for band, warped in zip(stack, out):
+            expect = plan.apply(band, np.full(d_gbox.shape, 7, dtype=src.dtype), resampling,
+                                src_nodata=-1, dst_nodata=-3)
+            np.testing.assert_array_equal(warped, expect)
+
+
+def test_warp_plan_matches_gdal():
+    from datacube.utils.geometry import GeoBox
+    from datacube.utils.geometry._warp import WarpPlan
+    from datacube.testutils.geom import epsg3857
+
+    src = np.arange(128*256, dtype='int32').reshape(128, 256)
+    s_gbox = AlbersGS.tile_geobox((15, -40))[:src.shape[0], :src.shape[1]]
+    d_gbox = GeoBox.from_geopolygon(s_gbox.extent.to_crs(epsg3857).buffer(100),
+                                    resolution=(-30, 30))
+
+    plan = WarpPlan(s_gbox, d_gbox)
+    expect = np.full(d_gbox.shape, -3, dtype=src.dtype)
+    rio_reproject(src, expect, s_gbox, d_gbox, 'nearest', dst_nodata=-3)
+    dst = plan.apply(src, np.full(d_gbox.shape, -3, dtype=src.dtype), 'nearest', dst_nodata=-3)
+
+    # pixel centres further from a source pixel edge than GDAL's approximation error of 0.125
+    def away_from_edge(coord):
+        frac = np.nan_to_num(coord, nan=0.5) % 1
+        return np.minimum(frac, 1 - frac) > 0.2
+
+    clear = away_from_edge(plan.xx) & away_from_edge(plan.yy)
+    assert clear.mean() > 0.3
+    np.testing.assert_array_equal(dst[clear], expect[clear])
+
+
+def test_reproject_array_large_destination():
+    from datacube.utils.geometry import GeoBox
+    from datacube.utils.geometry import _warp
+    from datacube.testutils.geom import epsg3857
+
+    src = np.arange(128*256, dtype='int32').reshape(128, 256)
+    s_gbox = AlbersGS.tile_geobox((15, -40))[:src.shape[0], :src.shape[1]]
+    d_gbox = GeoBox.from_geopolygon(s_gbox.extent.to_crs(epsg3857).buffer(100),
+                                    resolution=(-30, 30))
+    plan_nbytes = 2*4*d_gbox.shape[0]*d_gbox.shape[1]
+
+    for cache_bytes, uses_gdal in [(plan_nbytes, False), (plan_nbytes - 1, True)]:
+        dst = np.full(d_gbox.shape, -3, dtype=src.dtype)
+        with mock.patch.object(_warp, '_WARP_PLAN_CACHE_BYTES', cache_bytes), \
+                mock.patch.object(_warp, 'rio_reproject', wraps=_warp.rio_reproject) as rio, \
+                mock.patch.object(_warp, 'warp_plan', wraps=_warp.warp_plan) as plan:
+            _warp.reproject_array(src, dst, s_gbox, d_gbox, 'nearest', dst_nodata=-3)
+        assert (rio.call_count, plan.call_count) == ((1, 0) if uses_gdal else (0, 1))
+        assert (dst != -3).any()
+
+
+def test_reproject_array_curved():
+    from datacube.utils.geometry import GeoBox, CRS
+    from datacube.utils.geometry import _warp
+
+    # polar stereographic around the pole onto lon/lat: far from linear over 16 pixels
+    src = np.arange(400*400, dtype='int32').reshape(400, 400)
+    s_gbox = GeoBox(400, 400, Affine(10000, 0, -2000000, 0, -10000, 2000000), CRS('EPSG:3031'))
+    d_gbox = GeoBox(360, 100, Affine(1, 0, -180, 0, -0.25, -65), CRS('EPSG:4326'))
+    assert _warp.warp_plan(s_gbox, d_gbox).max_error > _warp._WARP_PLAN_MAX_ERROR
+
+    # close to the pole, but over a small area, the plan is accurate enough
+    small = GeoBox(200, 200, Affine(0.05, 0, -5, 0, -0.05, -80), CRS('EPSG:4326'))
+    assert _warp.warp_plan(s_gbox, small).max_error < _warp._WARP_PLAN_MAX_ERROR
+
+    for d, uses_gdal in [(d_gbox, True), (small, False)]:
+        dst = np.full(d.shape, -3, dtype=src.dtype)
+        with mock.patch.object(_warp, 'rio_reproject', wraps=_warp.rio_reproject) as rio:
+            _warp.reproject_array(src, dst, s_gbox, d, 'nearest', dst_nodata=-3)
+        assert rio.call_count == (1 if uses_gdal else 0)
+        assert (dst != -3).any()
+
+
+def test_warp_plan_non_finite():
+    from datacube.utils.geometry import GeoBox
+    from datacube.utils.geometry._warp import WarpPlan
+    from datacube.testutils.geom import epsg3857
+
+    src = np.arange(128*256, dtype='int32').reshape(128, 256)
+    s_gbox = AlbersGS.tile_geobox((15, -40))[:src.shape[0], :src.shape[1]]
+    d_gbox = GeoBox.from_geopolygon(s_gbox.extent.to_crs(epsg3857).buffer(100),
+                                    resolution=(-30, 30))
+    plan = WarpPlan(s_gbox, d_gbox)
+
+    # pick destination pixels well inside the source, then break their source coordinates
+    inside = np.argwhere((plan.xx > 10) & (plan.xx < 240) & (plan.yy > 10) & (plan.yy < 110))[:4]
+    for (r, c), value in zip(inside, [np.nan, np.inf, -np.inf, 1e20]):
+        plan.xx[r, c] = value
+
+    for resampling in ('nearest', 'bilinear'):
+        dst = plan.apply(src, np.full(d_gbox.shape, 7, dtype=src.dtype), resampling, dst_nodata=-3)
+        assert all(dst[r, c] == -3 for r, c in inside)
+        assert (dst != -3).any()
+
+
+def test_xr_reproject():
+    import dask.array as da
+    import xarray as xr
+    from datacube.utils.geometry import GeoBox, xr_reproject
+    from datacube.testutils.geom import epsg3857
+
+    src = np.arange(2*128*256, dtype='int32').reshape(2, 128, 256)
+    src[:, :5, :] = -1
+
+    s_gbox = AlbersGS.tile_geobox((15, -40))[:src.shape[1], :src.shape[2]]
+    d_gbox = GeoBox.from_geopolygon(s_gbox.extent.to_crs(epsg3857).buffer(100),
+                                    resolution=(-30, 30))
+
+    xx = xr.DataArray(src, dims=('time', 'y', 'x'),
+                      coords=dict(time=[1, 2], **s_gbox.xr_coords(with_crs=True)),
+                      attrs=dict(nodata=-1, units='1'))
+
+    yy = xr_reproject(xx, d_gbox)
+    assert yy.geobox == d_gbox
+    assert yy.dims == ('time', 'y', 'x')
+    assert list(yy.time.values) == [1, 2]
+    assert yy.attrs['nodata'] == -1 and yy.attrs['units'] == '1'
+    assert (yy.values != -1).any()
+
+    xx_dask = xx.chunk(dict(time=1, y=50, x=60))
+    yy_dask = xr_reproject(xx_dask, d_gbox, chunks=(40, 70))
+    assert yy_dask.data.chunks[0] == (1, 1)
+    assert set(yy_dask.data.chunks[1][:-1]) == {40}
+    assert set(yy_dask.data.chunks[2][:-1]) == {70}
+
+    # only the source array is a dependency, no rechunking
+    layers = yy_dask.data.dask.dependencies
+    assert layers[yy_dask.data.name] == {xx_dask.data.name}
+
+    np.testing.assert_array_equal(yy_dask.values, yy.values)
+    assert yy_dask.geobox == d_gbox
+
+    # chunks given as a list, like xarray chunk sizes often are
+    yy_list = xr_reproject(xx_dask, d_gbox, chunks=[40, 70])
+    assert yy_list.data.chunks == yy_dask.data.chunks
+
+    yy = xr_reproject(xx.astype('float32'), d_gbox, resampling='bilinear', dst_nodata=-3)
+    assert yy.attrs['nodata'] == -3
+    assert (yy.values == -3).any()
@@ -0,0 +1,62 @@
+import click
+import mock
+from click.testing import CliRunner
+
+from datacube.ui import click as ui
+
+
+@click.command()
+@ui.executor_cli_options
+def run_app(executor):
+    ctx = click.get_current_context()
+    click.echo('{} {}'.format(executor, ctx.meta.get(ui._INDEX_POOL_SIZE)))
+
+
+def test_executor_cli_options():
+    runner = CliRunner()
+
+    result = runner.invoke(run_app, [])
+    assert result.exit_code == 0
+    assert result.output.strip() == 'SerialExecutor None'
+
+    result = runner.invoke(run_app, ['--executor', 'threads', '4'])
+    assert result.exit_code == 0
+    assert result.output.strip() == 'Threads (4) 5'
+
+
+def test_pass_index_pool_size():
+    @click.command()
+    @ui.executor_cli_options
+    @ui.pass_index(app_name='test-app')
+    def index_app(index, executor):
+        click.echo(repr(index))
+
+    runner = CliRunner()
+    with mock.patch.object(ui, 'index_connect') as index_connect, \
+            mock.patch.object(ui.config.LocalConfig, 'find'):
+        result = runner.invoke(index_app, ['--executor', 'threads', '8'], obj={})
+        assert result.exit_code == 0, result.output
+        assert index_connect.call_args[1]['pool_size'] == 9
+
+        result = runner.invoke(index_app, [], obj={})
+        assert result.exit_code == 0, result.output
+        assert index_connect.call_args[1]['pool_size'] is None
+
+
+def test_celery_executor_cli_options():
+    runner = CliRunner()
+
+    with mock.patch.object(ui, 'mk_celery_executor') as mk_celery_executor:
+        result = runner.invoke(run_app, ['--executor', 'celery', 'localhost:6379'])
+        assert result.exit_code == 0, result.output
+        mk_celery_executor.assert_called_with('localhost', 6379)
+
+        result = runner.invoke(run_app, ['--executor', 'celery',
+                                         'localhost:6379,compress,offload_dir=/shared,offload_threshold=1000'])
+        assert result.exit_code == 0, result.output
+        mk_celery_executor.assert_called_with('localhost', 6379, compress_results=True,
+                                              offload_dir='/shared', offload_threshold=1000)
+
+        result = runner.invoke(run_app, ['--executor', 'celery', 'localhost:6379,compression'])
+        assert result.exit_code != 0
+        assert "Failed to create 'celery' executor" in result.output
@@ -3,8 +3,10 @@
 Module
 """
 
-from datacube.ui.task_app import task_app, run_tasks, wrap_task
+from datacube.ui.task_app import task_app, run_tasks, wrap_task, TaskJournal
 import datacube.executor
+import click
+import pytest
 
 
 def make_test_config(index, config, **kwargs):
@@ -185,3 +187,115 @@ def test_wrap_task():
 
     assert task_with_args(1, 2, 'a') == (1, 2, 'a')
     assert wrap_task(task_with_args, 'a', 'b')(0) == (0, 'a', 'b')
+
+
+def test_task_journal(tmpdir):
+    journal_file = tmpdir.join('journal.txt')
+
+    with TaskJournal(str(journal_file)) as journal:
+        assert len(journal) == 0
+        journal.record(3)
+        journal.record((15, -40))
+        assert 3 in journal
+        assert '3' in journal
+        assert (15, -40) in journal
+        assert 4 not in journal
+
+        with pytest.raises(ValueError):
+            journal.record('two\nlines')
+
+    # crash while recording a task
+    with open(str(journal_file), 'a') as stream:
+        stream.write('12')
+
+    with TaskJournal(str(journal_file)) as journal:
+        assert journal.completed == {'3', '(15, -40)'}
+        journal.record(1)
+
+    assert journal_file.read() == '3\n(15, -40)\n1\n'
+
+
+def test_run_tasks_resume(tmpdir):
+    executor = datacube.executor.SerialExecutor()
+    journal_file = str(tmpdir.join('journal.txt'))
+    runs = []
+
+    def task_func(task):
+        runs.append(task['val'])
+        if task['val'] in task['fail']:
+            raise IOError('Fake I/O error')
+        return task['val']
+
+    with TaskJournal(journal_file) as journal:
+        tasks = ({'val': i, 'fail': (1, 3)} for i in range(5))
+        run_tasks(tasks, executor, task_func, journal=journal, queue_size=2)
+    assert runs == [0, 1, 2, 3, 4]
+
+    # only failed tasks run again
+    runs.clear()
+    with TaskJournal(journal_file) as journal:
+        assert journal.completed == {'0', '2', '4'}
+        tasks = ({'val': i, 'fail': ()} for i in range(5))
+        run_tasks(tasks, executor, task_func, journal=journal, queue_size=2)
+    assert runs == [1, 3]
+
+    # tasks identified by content
+    runs.clear()
+    with TaskJournal(str(tmpdir.join('journal_by_id.txt'))) as journal:
+        for _ in range(2):
+            tasks = ({'val': i, 'fail': ()} for i in reversed(range(3)))
+            run_tasks(tasks, executor, task_func, journal=journal, task_id=lambda task: task['val'])
+    assert runs == [2, 1, 0]
+
+
+def test_task_app_with_journal(tmpdir):
+    index = 'Fake Index'
+    journal_file = tmpdir.join('journal.txt')
+
+    app_config = tmpdir.join("app_config.yaml")
+    app_config.write('name: Test Config\r\n'
+                     'description: This is my test app config file')
+
+    taskfile = tmpdir.join("tasks.bin")
+    my_test_app(index, app_config=str(app_config), output_tasks_file=str(taskfile), config_arg=True, task_arg=True)
+    assert tmpdir.listdir(lambda path: path.basename.startswith('tasks')) == [taskfile]
+
+    @task_app(make_config=make_test_config, make_tasks=make_test_tasks)
+    def journal_app(index, config, tasks, journal=None):
+        assert isinstance(journal, TaskJournal)
+        tasks = ({'name': task} for task in tasks)
+        run_tasks(tasks, datacube.executor.SerialExecutor(), _upper_task, journal=journal)
+
+    journal_app(index, input_tasks_file=str(taskfile), journal_file=str(journal_file))
+    assert journal_file.read() == '0\n1\n2\n'
+
+
+def test_task_app_journal_needs_task_ids(tmpdir):
+    index = 'Fake Index'
+    journal_file = tmpdir.join('journal.txt')
+
+    app_config = tmpdir.join("app_config.yaml")
+    app_config.write('name: Test Config\r\n'
+                     'description: This is my test app config file')
+
+    # tasks made from the app config have no stable position
+    with click.Context(click.Command('my_test_app')):
+        with pytest.raises(click.exceptions.Exit):
+            my_test_app(index, app_config=str(app_config), journal_file=str(journal_file),
+                        app_arg=True, config_arg=True, task_arg=True)
+    assert not journal_file.check()
+
+    def task_id(task):
+        return task['name'].lower()
+
+    @task_app(make_config=make_test_config, make_tasks=make_test_tasks, task_id=task_id)
+    def journal_app(index, config, tasks, journal=None, **kwargs):
+        tasks = ({'name': task} for task in tasks)
+        run_tasks(tasks, datacube.executor.SerialExecutor(), _upper_task, journal=journal, task_id=task_id)
+
+    journal_app(index, app_config=str(app_config), journal_file=str(journal_file), config_arg=True, task_arg=True)
+    assert journal_file.read() == 'task: 0\ntask: 1\ntask: 2\n'
+
+
+def _upper_task(task):
+    return task['name'].upper()